@@ -67,6 +67,7 @@ gcloud run jobs deploy $JOB_NAME \
     --memory 2Gi \
     --cpu 1 \
     --task-timeout 900 \
+    --tasks ${TASK_COUNT:-1} \
     --max-retries 0 \
     --set-env-vars PHASE=4 \
     --set-secrets TAIPEI_USERNAME=TAIPEI_USERNAME:latest,TAIPEI_PASSWORD=TAIPEI_PASSWORD:latest \
@@ -40,16 +40,24 @@ echo "🎬 啟動主程式..."
 echo "=========================================="
 echo ""
 
-# 先啟動 xvfb 在背景
-Xvfb :99 -screen 0 1366x768x24 >/dev/null 2>&1 &
-XVFB_PID=$!
-export DISPLAY=:99
-
-# 等待 xvfb 啟動
-sleep 2
-echo "✅ Xvfb 已在背景啟動 (DISPLAY=:99, PID=$XVFB_PID)"
+# 虛擬顯示器由 Python 入口管理（virtual_display.py）：
+# 只有有畫面模式才啟動 Xvfb，輪詢到可以連線為止，結束時關閉
+echo "🖥️  虛擬顯示器: VIRTUAL_DISPLAY=${VIRTUAL_DISPLAY:-auto}"
 echo ""
 
+# 常駐服務模式：保留瀏覽器與登入狀態，由 HTTP 請求觸發申請
+if [ "${SERVICE_MODE:-0}" = "1" ]; then
+    # 沒有 SERVICE_TOKEN 時只監聽本機（/apply 與 /jobs 不能在沒有驗證的情況下對外開放）
+    if [ -n "${SERVICE_TOKEN:-}" ]; then
+        export SERVICE_HOST="${SERVICE_HOST:-0.0.0.0}"
+    else
+        export SERVICE_HOST="${SERVICE_HOST:-127.0.0.1}"
+        echo "⚠️  未設定 SERVICE_TOKEN，服務只監聽 ${SERVICE_HOST}"
+    fi
+    echo "🌐 常駐服務模式 (PORT=${PORT:-8080})"
+    exec python -u service.py
+fi
+
 # 直接執行 Python，不透過 xvfb-run
 exec python -u main.py
 
@@ -11,6 +11,7 @@
 import sys
 print("📦 anti_detection 模組：載入基本模組...", flush=True)
 
+import copy
 import asyncio
 import random
 import tempfile
@@ -18,12 +19,12 @@ import shutil
 import os
 import logging
 from pathlib import Path
-from datetime import datetime
+from urllib.parse import urlparse
 
 print("📦 anti_detection 模組：載入 playwright...", flush=True)
 sys.stdout.flush()
 try:
-    from playwright.async_api import async_playwright, Browser, BrowserContext, Page
+    from playwright.async_api import Browser, BrowserContext, Page
     print("✅ playwright 模組載入成功", flush=True)
 except Exception as e:
     print(f"❌ playwright 模組載入失敗: {e}", flush=True)
@@ -32,7 +33,20 @@ except Exception as e:
     raise
 
 print("📦 anti_detection 模組：載入 config...", flush=True)
-from config import BROWSER_CONFIG, HEADLESS_STEALTH_ARGS, HUMAN_BEHAVIOR_SIMULATION, TRAJECTORY_SITES, CURRENT_PHASE, GCS_CONFIG
+from config import BROWSER_CONFIG, HEADLESS_STEALTH_ARGS, HUMAN_BEHAVIOR_SIMULATION, TRAJECTORY_SITES, TAIPEI_ARTIST_WEBSITE_URL
+from driver_manager import get_driver_manager
+from clock import RealClock
+from network_replay import attach_network_mode, finish_network_mode
+from screenshot_policy import create_screenshot_policy, ERROR
+from dom_snapshot import DomSnapshotter
+from artifact_registry import get_artifact_registry, ArtifactTags
+from object_storage import get_storage_backend
+from network_timing import NetworkTimingRecorder
+from browser_profiler import BrowserProfiler, TraceSampler, create_trace_sampler
+from rate_limiter import get_rate_limiter
+from site_structure import get_site_structure
+from config import NETWORK_REPLAY_CONFIG, ACCOUNTS, SCREENSHOT_POLICY, DOM_SNAPSHOT_CONFIG, STORAGE_CONFIG
+from config import NETWORK_TIMING_CONFIG, TPBUSKER_BASE_URL, PROFILING_CONFIG, DRIVER_CONFIG
 
 logger = logging.getLogger(__name__)
 print("✅ anti_detection 模組初始化完成", flush=True)
@@ -42,20 +56,59 @@ sys.stdout.flush()
 class AntiDetectionManager:
     """反檢測管理器"""
     
-    def __init__(self, headless=True, screenshot_dir="screenshots"):
+    def __init__(self, headless=True, screenshot_dir="screenshots", clock=None, screenshot_policy=None,
+                 browser_mode=None, trace_sampler=None):
         self.headless = headless
+        # persistent：各自啟動一組 Chromium；shared / cdp：共用一個瀏覽器，各自一個隔離的 context
+        self.browser_mode = browser_mode or DRIVER_CONFIG["browser_mode"]
         self.screenshot_dir = Path(screenshot_dir)
         self.profile_dir = None
         self.browser = None
         self.context = None
         self.page = None
         
-        # Phase 4: 初始化 GCS 客戶端用於即時上傳
-        self.gcs_client = None
-        self.gcs_bucket = None
-        self.gcs_timestamp = None
-        if CURRENT_PHASE == 4:
-            self._init_gcs_for_realtime_upload()
+        # 同帳號其他場地的頁面共用這個 context（open_sibling），關閉時只關自己的頁面
+        self.parent = None
+        self.siblings = []
+        
+        # 卡住偵測（由主程式設定，刻意等待時通知它不要誤判）
+        self.watchdog = None
+        
+        # 所有刻意等待都透過時鐘（測試時可換成虛擬時鐘快轉）
+        self.clock = clock or RealClock()
+        
+        # 網路錄製/重播（NETWORK_MODE=record/replay）
+        self.network_mode = None
+        
+        # 網路請求計時（NETWORK_TIMING=1）
+        self.network_timing = None
+        
+        # 瀏覽器端效能指標（PROFILE_METRICS=1）與 Playwright tracing（TRACE_MODE）
+        self.profiler = BrowserProfiler(PROFILING_CONFIG["max_samples"]) if PROFILING_CONFIG["metrics_enabled"] else None
+        # tracing 抽樣由呼叫端傳入時沿用（重建瀏覽器不重新抽樣）
+        self.trace_sampler = trace_sampler or create_trace_sampler(PROFILING_CONFIG)
+        
+        # 產出檔名前綴（同時執行的工作單元共用截圖目錄與登記表，以 unit_id 區分）
+        self.artifact_prefix = ""
+        
+        # 目前的步驟與時段（由主程式設定，每個工作單元一份），產生檔案時一起登記
+        self.artifact_tags = ArtifactTags()
+        
+        # 截圖策略（決定存檔、放入記憶體緩衝區或略過）
+        self.screenshot_policy = screenshot_policy or create_screenshot_policy(SCREENSHOT_POLICY)
+        
+        # DOM 快照（壓縮 HTML/MHTML，診斷用，比全頁 PNG 小）
+        self.dom_snapshotter = DomSnapshotter(
+            self.screenshot_dir,
+            DOM_SNAPSHOT_CONFIG["format"],
+            DOM_SNAPSHOT_CONFIG["compression"],
+            DOM_SNAPSHOT_CONFIG["level"]
+        ) if DOM_SNAPSHOT_CONFIG["enabled"] else None
+        
+        # 即時上傳（預設 Phase 4）：截圖產生後在背景上傳，不阻塞瀏覽器流程
+        self.storage = None
+        if STORAGE_CONFIG["realtime_upload"]:
+            self._init_realtime_upload()
         
         # 確保截圖目錄存在
         self.screenshot_dir.mkdir(exist_ok=True)
@@ -83,10 +136,9 @@ class AntiDetectionManager:
         """啟動具有反檢測功能的瀏覽器"""
         print("🚀 啟動反檢測瀏覽器...")
         
-        # 建立 Profile
-        await self.create_browser_profile()
-        
-        playwright = await async_playwright().start()
+        # 共用同一個 Playwright driver，重試時不會再多開 Node process
+        driver_manager = get_driver_manager()
+        playwright = await driver_manager.get_playwright()
         
         # 使用配置檔案中的增強反檢測參數
         args = HEADLESS_STEALTH_ARGS + [
@@ -98,28 +150,99 @@ class AntiDetectionManager:
         if self.headless:
             args.append("--headless=new")
         
-        # 使用持久化上下文
-        self.context = await playwright.chromium.launch_persistent_context(
-            user_data_dir=str(self.profile_dir),
-            headless=self.headless,
-            # Phase 4: 使用 Playwright 安裝的 Chromium，不指定 channel
-            args=args,
-            viewport=BROWSER_CONFIG["viewport"],
-            user_agent=BROWSER_CONFIG["user_agent"]
-        )
+        if self.browser_mode == "persistent":
+            # 使用持久化上下文（建立 Profile）
+            await self.create_browser_profile()
+            self.context = await playwright.chromium.launch_persistent_context(
+                user_data_dir=str(self.profile_dir),
+                headless=self.headless,
+                # Phase 4: 使用 Playwright 安裝的 Chromium，不指定 channel
+                args=args,
+                viewport=BROWSER_CONFIG["viewport"],
+                user_agent=BROWSER_CONFIG["user_agent"]
+            )
+        else:
+            # 共用瀏覽器：每個帳號一個隔離的 context（cookie 與 storage 各自獨立），
+            # 多一個帳號只多一個 renderer，不必多一整組 Chromium
+            self.browser = await driver_manager.get_shared_browser(self.browser_mode, args, self.headless)
+            self.context = await self.browser.new_context(
+                viewport=BROWSER_CONFIG["viewport"],
+                user_agent=BROWSER_CONFIG["user_agent"]
+            )
+            print(f"🌐 使用共用瀏覽器的獨立 context ({self.browser_mode})")
+        driver_manager.register_context(self.context)
+        driver_manager.log_memory("（瀏覽器啟動後）")
+        
+        # 錄製時遮蔽所有帳號密碼
+        account_secrets = [value for account in ACCOUNTS for value in account.values() if value]
+        self.network_mode = await attach_network_mode(self.context, NETWORK_REPLAY_CONFIG, account_secrets)
+        
+        if NETWORK_TIMING_CONFIG["enabled"]:
+            self.network_timing = NetworkTimingRecorder(
+                urlparse(TPBUSKER_BASE_URL).netloc,
+                NETWORK_TIMING_CONFIG["sso_markers"],
+                self._step_for_request,
+                NETWORK_TIMING_CONFIG["top_n"],
+                NETWORK_TIMING_CONFIG["waterfall_limit"]
+            )
+            self.network_timing.attach(self.context)
+        
+        await self.trace_sampler.start(self.context)
         
         # 建立新頁面
-        self.page = await self.context.new_page()
+        self.page = await self._new_page()
+        
+        print("✅ 反檢測瀏覽器啟動完成")
+        return self.page
+    
+    async def _new_page(self):
+        page = await self.context.new_page()
         
         # 移除 webdriver 屬性
-        await self.page.add_init_script("""
+        await page.add_init_script("""
             Object.defineProperty(navigator, 'webdriver', {
                 get: () => undefined,
             });
         """)
+        return page
+    
+    async def open_sibling(self):
+        """
+        在同一個已登入的 context 開新頁面（同帳號同時處理多個場地時共用登入狀態）
         
-        print("✅ 反檢測瀏覽器啟動完成")
-        return self.page
+        網路錄製、請求計時與 tracing 屬於 context，只由原本的管理器寫出；
+        截圖緩衝區與 DOM 快照屬於頁面，各自一份
+        """
+        sibling = copy.copy(self)
+        sibling.parent = self
+        sibling.siblings = []
+        sibling.artifact_tags = ArtifactTags()
+        sibling.profile_dir = None
+        sibling.network_mode = None
+        sibling.network_timing = None
+        sibling.profiler = BrowserProfiler(PROFILING_CONFIG["max_samples"]) if self.profiler else None
+        sibling.trace_sampler = TraceSampler("off")
+        sibling.screenshot_policy = self.screenshot_policy.fork()
+        sibling.dom_snapshotter = DomSnapshotter(
+            self.screenshot_dir,
+            self.dom_snapshotter.snapshot_format,
+            self.dom_snapshotter.compression,
+            self.dom_snapshotter.level
+        ) if self.dom_snapshotter else None
+        sibling.page = await self._new_page()
+        self.siblings.append(sibling)
+        return sibling
+    
+    def _step_for_request(self, request):
+        """請求所屬頁面的工作單元步驟（同帳號的分頁共用 context，請求計時由本管理器記錄）"""
+        try:
+            page = request.frame.page
+        except Exception:
+            page = None
+        for manager in [self] + self.siblings:
+            if page is not None and manager.page is page:
+                return manager.artifact_tags.step
+        return self.artifact_tags.step
     
     async def perform_trajectory_building(self):
         """執行養軌跡流程"""
@@ -137,20 +260,15 @@ class AntiDetectionManager:
             
             try:
                 # 前往網站
+                await self.throttle("trajectory", site['url'])
                 await self.page.goto(site['url'], wait_until='networkidle')
+                await self.profile_page(f"goto_trajectory_{i+1}")
                 
                 # 等待頁面載入
-                await self.page.wait_for_timeout(random.randint(2000, 4000))
+                await self.pause(random.randint(2000, 4000), "page_load")
                 
                 # 截圖記錄
-                screenshot_name = f"trajectory_{i+1}_{site['name'].replace(' ', '_')}.png"
-                screenshot_path = self.screenshot_dir / screenshot_name
-                await self.page.screenshot(path=str(screenshot_path))
-                print(f"📸 已截圖: {screenshot_path}")
-                
-                # Phase 4: 立即上傳到 GCS
-                if CURRENT_PHASE == 4:
-                    self._upload_to_gcs_sync(str(screenshot_path), screenshot_name)
+                await self.take_screenshot(f"trajectory_{i+1}_{site['name'].replace(' ', '_')}")
                 
                 # 執行隨機動作
                 if "scroll" in site['actions']:
@@ -162,13 +280,13 @@ class AntiDetectionManager:
                 # 停留時間
                 stay_time = random.randint(site['stay_time'][0], site['stay_time'][1])
                 print(f"⏱️  停留 {stay_time} 秒...")
-                await self.page.wait_for_timeout(stay_time * 1000)
+                await self.pause(stay_time * 1000, "trajectory_stay")
                 
                 # 頁面間隔
                 if i < len(trajectory_sites) - 1:
                     interval = random.randint(5, 10)
                     print(f"🔄 等待 {interval} 秒後前往下一個網站...")
-                    await self.page.wait_for_timeout(interval * 1000)
+                    await self.pause(interval * 1000, "trajectory_interval")
                 
             except Exception as e:
                 print(f"⚠️  瀏覽 {site['name']} 時發生錯誤: {e}")
@@ -187,7 +305,7 @@ class AntiDetectionManager:
             await self.page.evaluate(f"window.scrollBy(0, {scroll_distance})")
             
             # 滾動間隔
-            await self.page.wait_for_timeout(random.randint(1000, 2500))
+            await self.pause(random.randint(1000, 2500), "scroll")
     
     async def simulate_link_hovering(self):
         """模擬滑鼠懸停連結"""
@@ -202,8 +320,8 @@ class AntiDetectionManager:
                 for link in selected_links:
                     try:
                         await link.hover()
-                        await self.page.wait_for_timeout(random.randint(500, 1500))
-                    except:
+                        await self.pause(random.randint(500, 1500), "hover")
+                    except Exception:
                         continue
         except Exception as e:
             # 懸停失敗不影響主流程
@@ -228,7 +346,7 @@ class AntiDetectionManager:
                     # 模擬滑鼠移動軌跡（使用配置參數）
                     await self.page.mouse.move(target_x, target_y)
                     click_delay_range = HUMAN_BEHAVIOR_SIMULATION["click_delay_range"]
-                    await self.page.wait_for_timeout(random.randint(click_delay_range[0], click_delay_range[1]))
+                    await self.pause(random.randint(click_delay_range[0], click_delay_range[1]), "click")
                     
                     # 點擊
                     await element.click()
@@ -248,7 +366,7 @@ class AntiDetectionManager:
                 # 先點擊欄位（使用配置參數）
                 await field.click()
                 click_delay_range = HUMAN_BEHAVIOR_SIMULATION["click_delay_range"]
-                await self.page.wait_for_timeout(random.randint(click_delay_range[0], click_delay_range[1]))
+                await self.pause(random.randint(click_delay_range[0], click_delay_range[1]), "click")
                 
                 # 清空欄位
                 await field.fill("")
@@ -258,7 +376,7 @@ class AntiDetectionManager:
                 for char in text:
                     await self.page.keyboard.type(char)
                     # 隨機打字速度
-                    await self.page.wait_for_timeout(random.randint(typing_delay_range[0], typing_delay_range[1]))
+                    await self.pause(random.randint(typing_delay_range[0], typing_delay_range[1]), "typing")
                 
                 print(f"✅ 已填入{description}: {text}")
                 return True
@@ -268,85 +386,211 @@ class AntiDetectionManager:
         
         return False
     
-    def _init_gcs_for_realtime_upload(self):
-        """初始化 GCS 客戶端（僅 Phase 4）"""
-        print("🔧 開始初始化 GCS 客戶端...")
-        import sys
-        sys.stdout.flush()
+    @property
+    def artifacts(self):
+        """產出檔案登記表（每次都取目前的登記表，常駐服務每個工作會換一份）"""
+        return get_artifact_registry()
+    
+    def _init_realtime_upload(self):
+        """初始化即時上傳用的儲存（失敗時只存本機）"""
+        try:
+            self.storage = get_storage_backend()
+            logger.info(f"✅ 即時上傳已啟用 ({self.storage.name}，執行編號: {self.artifacts.run_id})")
+        except Exception as e:
+            logger.error(f"❌ 儲存初始化失敗: {e}")
+            logger.warning("⚠️  將只儲存到本地，不即時上傳")
+    
+    def _upload_artifact(self, local_path):
+        """在背景上傳產出檔案，完成後把網址記錄到登記表"""
+        if not self.storage:
+            return
+        
+        filename = Path(local_path).name
+        
+        def _on_done(url):
+            if url:
+                self.artifacts.set_remote(filename, url)
+                logger.info(f"☁️  已上傳: {filename}")
         
+        self.storage.upload_in_background(local_path, self.artifacts.remote_key(filename), _on_done)
+    
+    async def take_screenshot(self, name, full_page=False, image_type="png", quality=None):
+        """拍攝截圖（image_type: png 或 jpeg，quality 僅 jpeg 使用；依截圖策略決定是否存檔）"""
+        policy = self.screenshot_policy
+        if not policy.should_capture():
+            return None
+        
+        kind = policy.classify(name)
         try:
-            from google.cloud import storage
-            print("✅ google.cloud.storage 模組載入成功")
-            sys.stdout.flush()
+            extension = "jpg" if image_type == "jpeg" else "png"
+            options = {
+                "full_page": full_page,
+                "type": image_type,
+                "quality": quality if image_type == "jpeg" else None
+            }
             
-            self.gcs_client = storage.Client(project=GCS_CONFIG["project_id"])
-            print(f"✅ GCS Client 建立成功 (project: {GCS_CONFIG['project_id']})")
-            sys.stdout.flush()
+            # 截圖策略依原本的畫面名稱分類，檔名才加上前綴
+            filename = f"{self.artifact_prefix}{name}"
             
-            self.gcs_bucket = self.gcs_client.bucket(GCS_CONFIG["bucket_name"])
-            self.gcs_timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            # 不需存檔的畫面只放進記憶體緩衝區，沒有磁碟與上傳 I/O
+            if not policy.should_persist(kind):
+                data = await self.page.screenshot(**options)
+                policy.buffer_frame(filename, data, extension)
+                self._note_png_size(extension, len(data))
+                return None
             
-            print(f"✅ GCS 即時上傳已啟用")
-            print(f"   Bucket: {GCS_CONFIG['bucket_name']}")
-            print(f"   時間戳記: {self.gcs_timestamp}")
-            sys.stdout.flush()
+            # 錯誤截圖：先把失敗前的畫面一起寫出
+            if kind == ERROR:
+                self.flush_screenshot_buffer(name)
             
-            logger.info(f"✅ GCS 即時上傳已啟用")
-            logger.info(f"   Bucket: {GCS_CONFIG['bucket_name']}")
-            logger.info(f"   時間戳記: {self.gcs_timestamp}")
+            screenshot_path = self.screenshot_dir / f"{filename}.{extension}"
+            data = await self.page.screenshot(path=str(screenshot_path), **options)
+            self.artifacts.add(screenshot_path, "screenshot", data, tags=self.artifact_tags)
+            policy.persisted_count += 1
+            self._note_png_size(extension, screenshot_path.stat().st_size)
+            print(f"📸 已截圖: {screenshot_path}")
             
-        except Exception as e:
-            print(f"❌ GCS 初始化失敗: {e}")
-            import traceback
-            traceback.print_exc()
-            sys.stdout.flush()
+            # 即時上傳（預設 Phase 4）
+            self._upload_artifact(screenshot_path)
             
-            logger.error(f"❌ GCS 初始化失敗: {e}")
-            logger.warning("⚠️  將只儲存到本地，不上傳 GCS")
+            return str(screenshot_path)
+        except Exception as e:
+            print(f"⚠️  截圖失敗: {e}")
+            return None
     
-    def _upload_to_gcs_sync(self, local_path, filename):
-        """同步上傳檔案到 GCS（僅 Phase 4）"""
-        if not self.gcs_bucket or not self.gcs_timestamp:
+    def _note_png_size(self, extension, size):
+        """記錄 PNG 大小，DOM 快照用來計算節省的空間"""
+        if self.dom_snapshotter and extension == "png":
+            self.dom_snapshotter.note_png_size(size)
+    
+    async def take_dom_snapshot(self, name):
+        """保存壓縮的 DOM 快照（內容與上一份相同時不重複存檔）"""
+        if not self.dom_snapshotter or self.page is None:
             return None
         
         try:
-            blob_name = f"screenshots/{self.gcs_timestamp}/{filename}"
-            blob = self.gcs_bucket.blob(blob_name)
-            blob.upload_from_filename(local_path)
-            
-            gcs_url = f"gs://{GCS_CONFIG['bucket_name']}/{blob_name}"
-            logger.info(f"☁️  已上傳到 GCS: {filename}")
-            return gcs_url
-            
+            info = self.dom_snapshotter.save(f"{self.artifact_prefix}{name}",
+                                             await self.dom_snapshotter.capture_raw(self.page))
+            if info["path"]:
+                self.artifacts.add(info["path"], "dom_snapshot", tags=self.artifact_tags)
+                self._upload_artifact(info["path"])
+            return info["path"]
         except Exception as e:
-            logger.error(f"❌ GCS 上傳失敗 ({filename}): {e}")
+            print(f"⚠️  DOM 快照失敗: {e}")
             return None
     
-    async def take_screenshot(self, name, full_page=False):
-        """拍攝截圖"""
+    def flush_screenshot_buffer(self, reason):
+        """步驟失敗時，把緩衝區中最後 K 張畫面寫出（Phase 4 同時上傳）"""
+        frames = self.screenshot_policy.drain()
+        if not frames:
+            return []
+        
+        paths = []
+        for frame in frames:
+            screenshot_path = self.screenshot_dir / f"{frame['name']}.{frame['extension']}"
+            screenshot_path.write_bytes(frame["data"])
+            self.artifacts.add(screenshot_path, "screenshot", frame["data"], tags=self.artifact_tags)
+            self.screenshot_policy.persisted_count += 1
+            paths.append(str(screenshot_path))
+            self._upload_artifact(screenshot_path)
+        
+        print(f"📸 失敗 ({reason})：已寫出緩衝區中的 {len(paths)} 張畫面")
+        return paths
+    
+    async def _write_network_timing(self):
+        """寫出網路請求計時報告（每個瀏覽器 context 一份）"""
+        if not self.network_timing:
+            return
+        
         try:
-            screenshot_path = self.screenshot_dir / f"{name}.png"
-            await self.page.screenshot(path=str(screenshot_path), full_page=full_page)
-            print(f"📸 已截圖: {screenshot_path}")
-            
-            # Phase 4: 立即上傳到 GCS
-            if CURRENT_PHASE == 4:
-                self._upload_to_gcs_sync(str(screenshot_path), f"{name}.png")
-            
-            return str(screenshot_path)
+            await self.network_timing.flush()
+            self.network_timing.log_summary()
+            index = len(self.artifacts.records(["report"]))
+            path = self.network_timing.write(
+                self.screenshot_dir / f"{self.artifact_prefix}{NETWORK_TIMING_CONFIG['report_name']}_{index}.json"
+            )
+            self.artifacts.add(path, "report", tags=self.artifact_tags)
+            self._upload_artifact(path)
+            logger.info(f"⏱️  網路請求計時報告: {path}")
         except Exception as e:
-            print(f"⚠️  截圖失敗: {e}")
-            return None
+            logger.warning(f"⚠️  網路請求計時報告寫出失敗: {e}")
+        self.network_timing = None
+    
+    async def throttle(self, label, url=None):
+        """送往 tpbusker 的導航或點擊前先取得限流額度（所有頁面共用）"""
+        return await get_rate_limiter().acquire(label, url, clock=self.clock)
+    
+    async def profile_page(self, label):
+        """page.goto 或時段送出後取樣瀏覽器端效能指標"""
+        if self.profiler:
+            await self.profiler.sample(self.page, label, self.artifact_tags.step)
     
-    async def wait_with_random_delay(self, min_ms=1000, max_ms=3000):
+    async def trace_step_start(self, step):
+        await self.trace_sampler.begin_step(step)
+    
+    async def trace_step_end(self, step, failed):
+        """步驟結束：失敗步驟的 trace 保存為產出檔"""
+        index = len(self.artifacts.records(["trace"]))
+        path = await self.trace_sampler.end_step(step, failed, self.screenshot_dir / f"{self.artifact_prefix}trace_{step}_{index}.zip")
+        if path:
+            self.artifacts.add(path, "trace", tags=self.artifact_tags)
+            self._upload_artifact(path)
+    
+    async def _write_profiling_artifacts(self):
+        """寫出效能指標報告並結束 tracing（每個瀏覽器 context 一份）"""
+        index = len(self.artifacts.records(["report"]))
+        trace_path = await self.trace_sampler.stop(self.screenshot_dir / f"{self.artifact_prefix}trace_{index}.zip")
+        if trace_path:
+            self.artifacts.add(trace_path, "trace", tags=self.artifact_tags)
+            self._upload_artifact(trace_path)
+        
+        if not self.profiler:
+            return
+        await self.profiler.detach()
+        if not self.profiler.samples:
+            return
+        try:
+            summary = self.profiler.summary()
+            path = self.profiler.write(
+                self.screenshot_dir / f"{self.artifact_prefix}{PROFILING_CONFIG['report_name']}_{index}.json")
+            self.artifacts.add(path, "report", tags=self.artifact_tags)
+            self._upload_artifact(path)
+            logger.info(f"📈 瀏覽器效能指標: {summary['sample_count']} 次取樣，"
+                        f"script 共 {summary['script_ms_total']:.0f} ms（單次最多 {summary['script_ms_max']:.0f} ms），"
+                        f"JS heap 高峰 {summary['peak_js_heap_mb']} MB → {path}")
+        except Exception as e:
+            logger.warning(f"⚠️  效能指標報告寫出失敗: {e}")
+        self.profiler = BrowserProfiler(PROFILING_CONFIG["max_samples"])
+    
+    async def pause(self, ms, label="delay"):
+        """刻意等待（人類行為延遲、停留時間），label 用於虛擬時鐘報告分類"""
+        if self.watchdog:
+            self.watchdog.expect_quiet(ms)
+        await self.clock.sleep(ms, self.page, label)
+    
+    async def wait_with_random_delay(self, min_ms=1000, max_ms=3000, label="delay"):
         """隨機延遲等待"""
         delay = random.randint(min_ms, max_ms)
-        await self.page.wait_for_timeout(delay)
+        await self.pause(delay, label)
     
     async def close_browser(self):
         """關閉瀏覽器並清理"""
+        if self.parent is not None:
+            # 共用 context 的頁面：只關閉自己的頁面
+            if self.page and not self.page.is_closed():
+                await self.page.close()
+            self.page = None
+            self.context = None
+            return
+        
         if self.context:
-            await self.context.close()
+            await finish_network_mode(self.network_mode)
+            self.network_mode = None
+            await self._write_network_timing()
+            await self._write_profiling_artifacts()
+            await get_driver_manager().close_context(self.context)
+            self.context = None
+            self.page = None
             print("✅ 瀏覽器已關閉")
         
         await self.cleanup_profile()
@@ -358,6 +602,23 @@ class LoginAntiDetection:
     def __init__(self, anti_detection_manager: AntiDetectionManager):
         self.adm = anti_detection_manager
         self.page = anti_detection_manager.page
+        self.structure = get_site_structure()
+    
+    async def click_role(self, role, description):
+        """依網站結構計畫點擊（記錄的選擇器優先，成功時寫回計畫）"""
+        for selector in self.structure.selectors(role):
+            if await self.adm.human_like_click(selector, description):
+                self.structure.learn(role, selector)
+                return True
+        return False
+    
+    async def type_role(self, role, text, description):
+        """依網站結構計畫輸入（記錄的選擇器優先，成功時寫回計畫）"""
+        for selector in self.structure.selectors(role):
+            if await self.adm.human_like_type(selector, text, description):
+                self.structure.learn(role, selector)
+                return True
+        return False
     
     async def perform_enhanced_login(self, username, password):
         """執行增強版登入流程"""
@@ -365,66 +626,44 @@ class LoginAntiDetection:
         
         try:
             # 第一步：前往街頭藝人網站
-            initial_url = "https://tpbusker.gov.taipei/signin.aspx"
+            initial_url = TAIPEI_ARTIST_WEBSITE_URL
             print(f"📍 前往登入頁面: {initial_url}")
+            await self.adm.throttle("navigate", initial_url)
             await self.page.goto(initial_url, wait_until='networkidle')
+            await self.adm.profile_page("goto_signin")
+            await self.structure.verify(self.page, "signin")
             await self.adm.wait_with_random_delay(2000, 4000)
             await self.adm.take_screenshot("step1_initial_page")
             
             # 第二步：點擊確定登入
-            confirm_selectors = [
-                'input[value="確定登入"]',
-                '#ct100_ContentPlaceHolder1_Button1',
-                'input[class="button9"]'
-            ]
-            
-            confirm_success = False
-            for selector in confirm_selectors:
-                if await self.adm.human_like_click(selector, "確定登入按鈕"):
-                    confirm_success = True
-                    break
+            await self.adm.throttle("login_postback")
+            confirm_success = await self.click_role("login_confirm", "確定登入按鈕")
             
             if not confirm_success:
                 print("❌ 無法找到確定登入按鈕")
                 return False
             
             await self.page.wait_for_load_state('networkidle')
+            await self.structure.verify(self.page, "signin_choice")
             await self.adm.wait_with_random_delay(2000, 4000)
             await self.adm.take_screenshot("step2_after_confirm")
             
             # 第三步：選擇台北通
-            taipei_selectors = [
-                'text="點我登入"',
-                'a:has-text("點我登入")'
-            ]
-            
-            taipei_success = False
-            for selector in taipei_selectors:
-                if await self.adm.human_like_click(selector, "台北通登入"):
-                    taipei_success = True
-                    break
+            await self.adm.throttle("login_postback")
+            taipei_success = await self.click_role("login_taipeipass", "台北通登入")
             
             if not taipei_success:
                 print("❌ 無法找到台北通登入按鈕")
                 return False
             
             await self.page.wait_for_load_state('networkidle')
+            await self.structure.verify(self.page, "taipeipass")
             await self.adm.wait_with_random_delay(3000, 5000)
             await self.adm.take_screenshot("step3_taipei_login_page")
             
             # 第四步：填入帳號密碼
             # 填入帳號
-            username_selectors = [
-                'input[placeholder*="帳號"]',
-                'input[type="text"]',
-                'input[name*="user"]'
-            ]
-            
-            username_success = False
-            for selector in username_selectors:
-                if await self.adm.human_like_type(selector, username, "帳號"):
-                    username_success = True
-                    break
+            username_success = await self.type_role("username", username, "帳號")
             
             if not username_success:
                 print("❌ 無法填入帳號")
@@ -433,7 +672,7 @@ class LoginAntiDetection:
             await self.adm.wait_with_random_delay(500, 1000)
             
             # 填入密碼
-            password_success = await self.adm.human_like_type('input[type="password"]', password, "密碼")
+            password_success = await self.type_role("password", password, "密碼")
             if not password_success:
                 print("❌ 無法填入密碼")
                 return False
@@ -442,17 +681,7 @@ class LoginAntiDetection:
             await self.adm.take_screenshot("step4_credentials_filled")
             
             # 第五步：點擊登入
-            login_selectors = [
-                'a.green_btn.login_btn',
-                '.green_btn.login_btn',
-                'a[class="green_btn login_btn"]'
-            ]
-            
-            login_success = False
-            for selector in login_selectors:
-                if await self.adm.human_like_click(selector, "登入按鈕"):
-                    login_success = True
-                    break
+            login_success = await self.click_role("login_submit", "登入按鈕")
             
             if not login_success:
                 print("❌ 無法點擊登入按鈕")
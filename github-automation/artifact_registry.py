@@ -0,0 +1,152 @@
+"""
+台北街頭藝人申請系統 - 產出檔案登記模組
+
+截圖、DOM 快照與診斷檔在產生當下就登記（步驟、時段、時間、大小、hash、遠端網址），
+不再掃描截圖目錄；每次執行輸出一份 manifest.json，
+後續使用者（例如 LINE 通知）只要讀一個物件，不必列出整個 bucket。
+"""
+
+import json
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+
+
+class ArtifactTags:
+    """
+    一個工作單元目前的步驟與時段
+
+    同時執行的工作單元共用一份登記表，步驟與時段則各自記錄，產生檔案時一起傳給 add()
+    """
+
+    def __init__(self):
+        self.step = None
+        self.slot = None
+
+    def set_step(self, step: Optional[str]):
+        self.step = step
+        self.slot = None
+
+    def set_slot(self, slot: Optional[str]):
+        self.slot = slot
+
+
+class ArtifactRegistry:
+    """單次執行的產出檔案登記表（以檔名為 key）"""
+
+    def __init__(self, run_id: str = None):
+        self.run_id = run_id or datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.created_at = datetime.now().isoformat()
+        self.artifacts = {}
+        self.lock = threading.Lock()
+
+    def add(self, path, kind: str, data: bytes = None, tags: ArtifactTags = None) -> dict:
+        """
+        登記產出檔案（有 data 時直接用它計算 hash，不重讀檔案）
+
+        Args:
+            path: 本機檔案路徑
+            kind: screenshot / dom_snapshot / diagnostic / report / contact_sheet / thumbnail
+            data: 檔案內容
+            tags: 產生這個檔案的工作單元目前的步驟與時段
+        """
+        path = Path(path)
+        if data is None:
+            data = path.read_bytes()
+        record = {
+            "name": path.name,
+            "path": str(path),
+            "kind": kind,
+            "step": tags.step if tags else None,
+            "slot": tags.slot if tags else None,
+            "timestamp": datetime.now().isoformat(),
+            "size": len(data),
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "remote_url": None,
+            "local": True,
+        }
+        with self.lock:
+            self.artifacts[record["name"]] = record
+        return record
+
+    def remote_key(self, name: str) -> str:
+        """遠端物件路徑：同一次執行的檔案與 manifest 放在同一個資料夾"""
+        return f"screenshots/{self.run_id}/{name}"
+
+    def get(self, name: str) -> Optional[dict]:
+        return self.artifacts.get(name)
+
+    def set_remote(self, name: str, url: str):
+        record = self.artifacts.get(name)
+        if record and url:
+            record["remote_url"] = url
+
+    def mark_deleted(self, name: str):
+        """本機檔案已刪除（上傳後清理），紀錄仍保留在 manifest"""
+        record = self.artifacts.get(name)
+        if record:
+            record["local"] = False
+
+    def records(self, kinds: List[str] = None) -> List[dict]:
+        """依產生順序列出紀錄"""
+        with self.lock:
+            records = list(self.artifacts.values())
+        return [r for r in records if kinds is None or r["kind"] in kinds]
+
+    def local_files(self, kinds: List[str] = None) -> List[Path]:
+        return [Path(r["path"]) for r in self.records(kinds) if r["local"]]
+
+    def summary_record(self) -> Optional[dict]:
+        """結果摘要圖（contact_sheet.py）的紀錄"""
+        records = self.records(["contact_sheet"])
+        return records[-1] if records else None
+
+    def manifest(self) -> dict:
+        records = self.records()
+        sheet = self.summary_record()
+        return {
+            "run_id": self.run_id,
+            "created_at": self.created_at,
+            "written_at": datetime.now().isoformat(),
+            "count": len(records),
+            "total_bytes": sum(r["size"] for r in records),
+            # 通知只需讀這一張（沒有 Pillow / numpy 時為 None）
+            "contact_sheet": {"name": sheet["name"], "remote_url": sheet["remote_url"]} if sheet else None,
+            "artifacts": [{k: v for k, v in r.items() if k not in ("path", "local")} for r in records],
+        }
+
+    def manifest_json(self) -> str:
+        return json.dumps(self.manifest(), ensure_ascii=False, indent=2)
+
+    def write_manifest(self, directory: Path) -> Path:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / MANIFEST_NAME
+        path.write_text(self.manifest_json(), encoding="utf-8")
+        logger.info(f"🗂️  已寫出 manifest: {path} ({len(self.artifacts)} 個檔案)")
+        return path
+
+
+_registry = None
+
+
+def get_artifact_registry() -> ArtifactRegistry:
+    """取得本 process 共用的登記表"""
+    global _registry
+    if _registry is None:
+        _registry = ArtifactRegistry()
+    return _registry
+
+
+def reset_artifact_registry(run_id: str = None) -> ArtifactRegistry:
+    """重新開始一份登記表（效能測試每輪使用）"""
+    global _registry
+    _registry = ArtifactRegistry(run_id)
+    return _registry
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+台北街頭藝人申請系統 - 效能測試
+
+針對自動化流程的熱點量測（全部在本機執行，不需要連網）：
+- 日曆解析與時段搜尋時間
+- apply_time_slots 每個時段的送出延遲
+- human_like_click / human_like_type 本身的開銷（不含設定的人類行為延遲）
+- take_screenshot 依格式與尺寸的成本
+- ScreenshotStorageHandler.upload_to_gcs 對本機物件儲存替身的吞吐量、並行數與失敗重試
+- 多帳號時每個帳號的記憶體：persistent（各自一組 Chromium）vs shared（共用瀏覽器、各一個 context）
+
+使用方式：
+    python benchmark.py                                  # 全部項目，結果寫入 benchmark_results.json
+    python benchmark.py --cases upload                   # 只跑上傳（不需要 Playwright）
+    python benchmark.py --cases memory --accounts 4      # 只比較兩種瀏覽器模式的記憶體
+    python benchmark.py --baseline baseline.json         # 與基準比較，退步超過門檻時 exit 1
+"""
+
+import os
+import sys
+
+# 必須在載入 config 之前設定：指向本機假網站、使用無畫面模式
+os.environ.setdefault("PHASE", "2")
+os.environ["TPBUSKER_BASE_URL"] = f"http://127.0.0.1:{os.getenv('BENCHMARK_PORT', '8765')}"
+
+import json
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+import importlib.util
+from pathlib import Path
+from datetime import datetime
+
+from config import BENCHMARK_CONFIG, VENUE_URLS, PERFORMANCE_ITEMS, SCREENSHOT_POLICY, STORAGE_CONFIG
+from fake_site import FakeSite
+from storage_handler import ScreenshotStorageHandler
+from artifact_registry import ArtifactRegistry
+from object_storage import LocalStorageBackend, MemoryStorageBackend
+
+logger = logging.getLogger(__name__)
+
+ALL_CASES = ["upload", "calendar", "human", "screenshot", "apply", "memory"]
+
+
+class BenchmarkResults:
+    """效能測試結果"""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def add(self, name: str, value: float, unit: str, better: str = "lower"):
+        self.metrics[name] = {"value": round(value, 3), "unit": unit, "better": better}
+        print(f"   {name:<45} {value:>12.3f} {unit}")
+
+    def add_timings(self, name: str, samples_ms: list):
+        """記錄中位數與 p95"""
+        if not samples_ms:
+            return
+        ordered = sorted(samples_ms)
+        self.add(f"{name}_p50", statistics.median(ordered), "ms")
+        self.add(f"{name}_p95", ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], "ms")
+
+    def to_dict(self) -> dict:
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "environment": {"python": platform.python_version(), "platform": platform.platform()},
+            "metrics": self.metrics,
+        }
+
+
+def compare_with_baseline(current: dict, baseline: dict, threshold: float) -> list:
+    """
+    與基準結果比較
+
+    Returns:
+        退步的指標列表
+    """
+    regressions = []
+    for name, base in baseline.get("metrics", {}).items():
+        now = current["metrics"].get(name)
+        if not now or not base["value"] or base["better"] == "info":
+            continue
+        change = (now["value"] - base["value"]) / base["value"]
+        regressed = change > threshold if base["better"] == "lower" else change < -threshold
+        marker = "❌" if regressed else "✅"
+        print(f"   {marker} {name:<45} {base['value']:>10.3f} → {now['value']:>10.3f} ({change:+.1%})")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def _upload_round(shots: Path, sizes: list, storage) -> float:
+    """寫出一組截圖並上傳，回傳上傳耗時（秒）"""
+    shots.mkdir(exist_ok=True)
+    registry = ArtifactRegistry()
+    for i, size in enumerate(sizes):
+        data = os.urandom(size)
+        (shots / f"shot_{i:03d}.png").write_bytes(data)
+        registry.add(shots / f"shot_{i:03d}.png", "screenshot", data)
+    handler = ScreenshotStorageHandler(
+        4, {"bucket_name": "benchmark-local", "project_id": "local"},
+        storage=storage, screenshots_dir=str(shots), registry=registry
+    )
+    started = time.perf_counter()
+    urls = handler.upload_to_gcs()
+    elapsed = time.perf_counter() - started
+    assert urls and len(urls) == len(sizes)
+    shutil.rmtree(shots)
+    return elapsed
+
+
+def bench_upload(results: BenchmarkResults, iterations: int):
+    """上傳吞吐量與失敗處理（本機物件儲存替身）"""
+    print("☁️  上傳吞吐量...")
+    work_dir = Path(tempfile.mkdtemp(prefix="street-artist-bench-upload-"))
+    sizes = [150 * 1024] * 30 + [1536 * 1024] * 2  # 一般截圖 + 全頁截圖
+    total_bytes = sum(sizes)
+    rounds = max(1, iterations // 4)
+    common = {"max_retries": STORAGE_CONFIG["max_retries"], "retry_base_seconds": 0}
+    try:
+        # 本機資料夾（磁碟複製的上限）
+        storage = LocalStorageBackend(work_dir / "bucket", concurrency=STORAGE_CONFIG["concurrency"], **common)
+        best = min(_upload_round(work_dir / "screenshots", sizes, storage) for _ in range(rounds))
+        storage.close()
+        results.add("upload_throughput", total_bytes / best / 1024 / 1024, "MB/s", better="higher")
+        results.add("upload_files_per_second", len(sizes) / best, "files/s", better="higher")
+
+        # 模擬網路延遲：比較循序與並行上傳
+        for concurrency in sorted({1, STORAGE_CONFIG["concurrency"]}):
+            storage = MemoryStorageBackend(latency_ms=20, bandwidth_mbps=50, concurrency=concurrency, **common)
+            elapsed = min(_upload_round(work_dir / "screenshots", sizes, storage) for _ in range(rounds))
+            storage.close()
+            results.add(f"upload_simulated_network_c{concurrency}_seconds", elapsed, "s")
+
+        # 10% 上傳失敗：確認重試後全部完成
+        storage = MemoryStorageBackend(failure_rate=0.1, seed=42,
+                                       concurrency=STORAGE_CONFIG["concurrency"], **common)
+        _upload_round(work_dir / "screenshots", sizes, storage)
+        storage.close()
+        results.add("upload_retries_at_10pct_failure", storage.stats["retries"], "count", better="info")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+class BrowserBench:
+    """需要瀏覽器的效能測試項目（共用同一個瀏覽器與假網站登入狀態）"""
+
+    def __init__(self, results: BenchmarkResults, iterations: int):
+        self.results = results
+        self.iterations = iterations
+        self.work_dir = Path(tempfile.mkdtemp(prefix="street-artist-bench-"))
+
+    async def setup(self):
+        from anti_detection import AntiDetectionManager, LoginAntiDetection
+        from main import StreetArtistApplication
+        from clock import VirtualClock
+        from screenshot_policy import create_screenshot_policy
+
+        # 虛擬時鐘：略過設定的人類行為延遲，只量測程式本身的開銷
+        self.clock = VirtualClock()
+        self.site = FakeSite(BENCHMARK_CONFIG["port"], days=14).start()
+        self.manager = AntiDetectionManager(
+            headless=True, screenshot_dir=str(self.work_dir), clock=self.clock,
+            screenshot_policy=create_screenshot_policy(SCREENSHOT_POLICY, mode="all")
+        )
+        self.page = await self.manager.start_browser()
+        await LoginAntiDetection(self.manager).perform_enhanced_login("benchmark", "benchmark")
+
+        self.app = StreetArtistApplication(venue_url=VENUE_URLS["北投公園_1號點"], clock=self.clock)
+        self.app.anti_detection = self.manager
+        self.app.page = self.page
+        self.app.screenshot_dir = self.work_dir
+
+    async def teardown(self):
+        from driver_manager import shutdown_driver
+        await self.manager.close_browser()
+        await shutdown_driver()
+        self.site.stop()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    async def bench_calendar(self):
+        from calendar_parser import parse_calendar
+        print("📅 日曆解析與時段搜尋...")
+        await self.page.goto(self.app.venue_url, wait_until="networkidle")
+
+        parse_ms, discovery_ms = [], []
+        for _ in range(self.iterations):
+            started = time.perf_counter()
+            slots = await parse_calendar(self.page, self.app.venue_url)
+            parse_ms.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            buttons = await self.app.find_register_buttons()
+            discovery_ms.append((time.perf_counter() - started) * 1000)
+        assert slots and len(slots) == len(buttons)
+        self.results.add_timings("calendar_parse", parse_ms)
+        self.results.add_timings("slot_discovery", discovery_ms)
+
+    async def bench_human(self):
+        print("🖱️  human_like_click / human_like_type 開銷...")
+        await self.page.set_content('<button id="probe">probe</button><textarea id="field"></textarea>')
+
+        delay_before = self.clock.simulated_ms
+        click_ms = []
+        for _ in range(self.iterations):
+            started = time.perf_counter()
+            assert await self.manager.human_like_click("#probe", "測試按鈕")
+            click_ms.append((time.perf_counter() - started) * 1000)
+        click_delay = (self.clock.simulated_ms - delay_before) / self.iterations
+
+        delay_before = self.clock.simulated_ms
+        type_ms = []
+        for _ in range(self.iterations):
+            started = time.perf_counter()
+            assert await self.manager.human_like_type("#field", PERFORMANCE_ITEMS, "測試欄位")
+            type_ms.append((time.perf_counter() - started) * 1000)
+        type_delay = (self.clock.simulated_ms - delay_before) / self.iterations
+
+        self.results.add_timings("human_like_click", click_ms)
+        self.results.add_timings("human_like_type", type_ms)
+        # 設定的人類延遲（未計入上面的時間，僅供參考）
+        self.results.add("human_like_click_configured_delay", click_delay, "ms", better="info")
+        self.results.add("human_like_type_configured_delay", type_delay, "ms", better="info")
+
+    async def bench_screenshot(self):
+        print("📸 截圖成本...")
+        await self.page.goto(self.app.venue_url, wait_until="networkidle")
+        for width, height in [(1366, 768), (1920, 1080)]:
+            await self.page.set_viewport_size({"width": width, "height": height})
+            for image_type in ["png", "jpeg"]:
+                for full_page in [False, True]:
+                    label = f"screenshot_{image_type}_{width}x{height}{'_full' if full_page else ''}"
+                    samples, size = [], 0
+                    for i in range(max(3, self.iterations // 4)):
+                        started = time.perf_counter()
+                        path = await self.manager.take_screenshot(
+                            f"bench_{i}", full_page=full_page, image_type=image_type,
+                            quality=80 if image_type == "jpeg" else None
+                        )
+                        samples.append((time.perf_counter() - started) * 1000)
+                        size = Path(path).stat().st_size
+                    self.results.add(f"{label}_ms", statistics.median(samples), "ms")
+                    self.results.add(f"{label}_bytes", size, "bytes")
+
+        # DOM 快照（同一頁面重複拍攝時只有第一份會存檔）
+        snapshotter = self.manager.dom_snapshotter
+        if snapshotter:
+            samples = []
+            for i in range(max(3, self.iterations // 4)):
+                started = time.perf_counter()
+                await self.manager.take_dom_snapshot(f"bench_dom_{i}")
+                samples.append((time.perf_counter() - started) * 1000)
+            summary = snapshotter.summary()
+            self.results.add("dom_snapshot_ms", statistics.median(samples), "ms")
+            self.results.add("dom_snapshot_bytes", summary["compressed_bytes"], "bytes")
+            self.results.add("dom_snapshot_duplicates", summary["duplicates"], "count", better="info")
+
+    async def bench_apply(self):
+        print("📝 每個時段的送出延遲...")
+        # 使用另一個場地，時段都還沒被申請過
+        self.app.venue_url = VENUE_URLS["大安森林公園_2號門"]
+        await self.page.goto(self.app.venue_url, wait_until="networkidle")
+
+        marks = []
+        delay_before = self.clock.simulated_ms
+        original_take_screenshot = self.manager.take_screenshot
+
+        async def marking_screenshot(name, *args, **kwargs):
+            if name.startswith("before_slot_"):
+                marks.append(time.perf_counter())
+            return await original_take_screenshot(name, *args, **kwargs)
+
+        self.manager.take_screenshot = marking_screenshot
+        try:
+            started = time.perf_counter()
+            await self.app.apply_time_slots()
+            marks.append(time.perf_counter())
+        finally:
+            self.manager.take_screenshot = original_take_screenshot
+
+        per_slot = [(b - a) * 1000 for a, b in zip(marks, marks[1:])]
+        self.results.add_timings("slot_submit", per_slot)
+        self.results.add("apply_slots_total", (time.perf_counter() - started) * 1000, "ms")
+        # 實際流程中會等待的時間（虛擬時鐘記錄的模擬時間）
+        self.results.add("apply_slots_simulated_wall", (time.perf_counter() - started) * 1000
+                         + self.clock.simulated_ms - delay_before, "ms", better="info")
+        self.results.add("applied_slot_count", len(self.app.applied_slots), "slots", better="higher")
+
+
+async def bench_browser_memory(results: BenchmarkResults, accounts: int):
+    """每個帳號的記憶體用量：persistent 與 shared 兩種瀏覽器模式各開 accounts 個帳號的頁面"""
+    from anti_detection import AntiDetectionManager
+    from driver_manager import get_driver_manager, shutdown_driver
+
+    site = FakeSite(BENCHMARK_CONFIG["port"], days=14).start()
+    work_dir = Path(tempfile.mkdtemp(prefix="street-artist-memory-"))
+    try:
+        for mode in ("persistent", "shared"):
+            driver_manager = get_driver_manager()
+            await driver_manager.get_playwright()
+            baseline = driver_manager.memory_report()["total_rss_mb"]
+            managers, first = [], None
+            try:
+                for _ in range(accounts):
+                    manager = AntiDetectionManager(headless=True, screenshot_dir=str(work_dir), browser_mode=mode)
+                    page = await manager.start_browser()
+                    managers.append(manager)
+                    await page.goto(f"{site.base_url}/signin.aspx", wait_until="networkidle")
+                    if first is None:
+                        await asyncio.sleep(1)
+                        first = driver_manager.memory_report()["total_rss_mb"]
+                # 等 renderer 記憶體穩定後再取樣
+                await asyncio.sleep(1)
+                report = driver_manager.memory_report()
+                results.add(f"memory_per_account_{mode}", (report["total_rss_mb"] - baseline) / accounts, "MB")
+                if accounts > 1:
+                    results.add(f"memory_marginal_account_{mode}",
+                                (report["total_rss_mb"] - first) / (accounts - 1), "MB")
+                results.add(f"chromium_processes_{mode}", len(report["browsers"]), "processes")
+            finally:
+                for manager in managers:
+                    await manager.close_browser()
+                await shutdown_driver()
+    finally:
+        site.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+async def run_browser_cases(results: BenchmarkResults, cases: list, iterations: int):
+    if importlib.util.find_spec("playwright") is None:
+        print("⚠️  未安裝 Playwright，略過瀏覽器相關項目")
+        return
+
+    bench = BrowserBench(results, iterations)
+    await bench.setup()
+    try:
+        for case in cases:
+            await getattr(bench, f"bench_{case}")()
+    finally:
+        await bench.teardown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="自動化流程效能測試")
+    parser.add_argument("--cases", default=",".join(ALL_CASES), help=f"逗號分隔，可選: {', '.join(ALL_CASES)}")
+    parser.add_argument("--iterations", type=int, default=BENCHMARK_CONFIG["iterations"])
+    parser.add_argument("--output", default=BENCHMARK_CONFIG["results_file"])
+    parser.add_argument("--baseline", default=None, help="基準結果 JSON，用於退步比較")
+    parser.add_argument("--threshold", type=float, default=BENCHMARK_CONFIG["regression_threshold"])
+    parser.add_argument("--accounts", type=int, default=3, help="memory 項目同時開啟的帳號數")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    unknown = set(cases) - set(ALL_CASES)
+    if unknown:
+        parser.error(f"未知的項目: {', '.join(sorted(unknown))}")
+
+    results = BenchmarkResults()
+    print("🏁 開始效能測試")
+    if "upload" in cases:
+        bench_upload(results, args.iterations)
+    browser_cases = [c for c in cases if c not in ("upload", "memory")]
+    if browser_cases:
+        asyncio.run(run_browser_cases(results, browser_cases, args.iterations))
+    if "memory" in cases:
+        if importlib.util.find_spec("playwright") is None:
+            print("⚠️  未安裝 Playwright，略過記憶體比較")
+        else:
+            asyncio.run(bench_browser_memory(results, args.accounts))
+
+    current = results.to_dict()
+    Path(args.output).write_text(json.dumps(current, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"💾 結果已寫入 {args.output}")
+
+    if args.baseline:
+        print(f"📊 與基準比較 (門檻 {args.threshold:.0%}):")
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare_with_baseline(current, baseline, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} 個指標退步: {', '.join(regressions)}")
+            sys.exit(1)
+        print("✅ 沒有指標退步")
+
+
+if __name__ == "__main__":
+    main()
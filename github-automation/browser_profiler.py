@@ -0,0 +1,224 @@
+"""
+台北街頭藝人申請系統 - 瀏覽器端效能分析模組
+
+- 每次 page.goto 與每個時段送出後，透過 CDP Performance.getMetrics 取得 JS heap、
+  layout 次數、script 執行時間，並讀取 navigation timing；
+  用來判斷每個時段的延遲是日曆頁面自己的 script 造成，還是 Python 端
+- Playwright tracing：依比例抽樣整段錄製，或只保留失敗步驟（每個步驟一個 chunk）
+
+兩者都以執行產出檔保存，並限制大小。
+"""
+
+import json
+import random
+import logging
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# 要保留的 CDP 指標（其餘忽略）
+CDP_METRICS = [
+    "JSHeapUsedSize", "JSHeapTotalSize", "Nodes", "Documents", "JSEventListeners",
+    "LayoutCount", "RecalcStyleCount", "LayoutDuration", "RecalcStyleDuration",
+    "ScriptDuration", "TaskDuration",
+]
+
+# 累計型指標：另外記錄與上一次取樣的差值
+CUMULATIVE_METRICS = ["LayoutCount", "RecalcStyleCount", "LayoutDuration",
+                      "RecalcStyleDuration", "ScriptDuration", "TaskDuration"]
+
+_NAVIGATION_TIMING_JS = """
+() => {
+    const nav = performance.getEntriesByType('navigation')[0];
+    if (!nav) return null;
+    return {
+        type: nav.type,
+        ttfb_ms: nav.responseStart - nav.requestStart,
+        response_end_ms: nav.responseEnd,
+        dom_interactive_ms: nav.domInteractive,
+        dom_content_loaded_ms: nav.domContentLoadedEventEnd,
+        load_event_ms: nav.loadEventEnd,
+        duration_ms: nav.duration,
+        transfer_size: nav.transferSize,
+        resource_count: performance.getEntriesByType('resource').length
+    };
+}
+"""
+
+TRACE_MODES = ["off", "sample", "on_failure"]
+
+
+class BrowserProfiler:
+    """CDP 效能指標與 navigation timing 取樣"""
+
+    def __init__(self, max_samples: int = 500):
+        self.max_samples = max_samples
+        self.samples = []
+        self.dropped = 0
+        self._cdp = None
+        self._cdp_page = None
+        self._previous = {}
+
+    async def _session(self, page):
+        # 頁面換了（例如重建瀏覽器）就重新建立 CDP session
+        if self._cdp is None or self._cdp_page is not page:
+            self._cdp = await page.context.new_cdp_session(page)
+            await self._cdp.send("Performance.enable")
+            self._cdp_page = page
+            self._previous = {}
+        return self._cdp
+
+    async def sample(self, page, label: str, step: str = None) -> Optional[dict]:
+        """取樣一次（失敗不影響主流程）"""
+        if page is None or page.is_closed():
+            return None
+        try:
+            cdp = await self._session(page)
+            raw = await cdp.send("Performance.getMetrics")
+            metrics = {m["name"]: m["value"] for m in raw.get("metrics", []) if m["name"] in CDP_METRICS}
+            delta = {name: round(metrics[name] - self._previous.get(name, 0), 4)
+                     for name in CUMULATIVE_METRICS if name in metrics}
+            self._previous = metrics
+            navigation = await page.evaluate(_NAVIGATION_TIMING_JS)
+        except Exception as e:
+            logger.debug(f"效能指標取樣失敗 ({label}): {e}")
+            return None
+
+        sample = {"label": label, "step": step, "url": page.url,
+                  "metrics": metrics, "delta": delta, "navigation": navigation}
+        if len(self.samples) < self.max_samples:
+            self.samples.append(sample)
+        else:
+            self.dropped += 1
+        logger.debug(f"📈 {label}: script {delta.get('ScriptDuration', 0) * 1000:.0f} ms, "
+                     f"layout {delta.get('LayoutCount', 0):.0f} 次, "
+                     f"heap {metrics.get('JSHeapUsedSize', 0) / 1024 / 1024:.1f} MB")
+        return sample
+
+    def summary(self) -> dict:
+        script_ms = [s["delta"].get("ScriptDuration", 0) * 1000 for s in self.samples]
+        return {
+            "sample_count": len(self.samples),
+            "dropped": self.dropped,
+            "script_ms_total": round(sum(script_ms), 1),
+            "script_ms_max": round(max(script_ms), 1) if script_ms else 0,
+            "peak_js_heap_mb": round(max((s["metrics"].get("JSHeapUsedSize", 0) for s in self.samples),
+                                         default=0) / 1024 / 1024, 1),
+            "samples": self.samples,
+        }
+
+    def write(self, path: Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.summary(), ensure_ascii=False, indent=2), encoding="utf-8")
+        return path
+
+    async def detach(self):
+        if self._cdp:
+            try:
+                await self._cdp.detach()
+            except Exception:
+                pass
+        self._cdp = None
+        self._cdp_page = None
+
+
+class TraceSampler:
+    """
+    Playwright tracing 抽樣
+
+    sample：依 sample_rate 決定本次是否錄製整段，結束時保存
+    on_failure：每個步驟一個 chunk，只保存失敗步驟的 chunk
+    """
+
+    def __init__(self, mode: str = "off", sample_rate: float = 0.1, max_mb: float = 50):
+        if mode not in TRACE_MODES:
+            raise ValueError(f"未知的 tracing 模式: {mode}（可選: {', '.join(TRACE_MODES)}）")
+        self.mode = mode
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.context = None
+        self.active = False
+        self.chunk_open = False
+        # 建立時就決定是否抽中；主程式每次執行只建立一個並傳給每個瀏覽器，重建瀏覽器時沿用同一個決定
+        self.sampled = mode == "sample" and random.random() < sample_rate
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode == "on_failure" or self.sampled
+
+    async def start(self, context):
+        if not self.enabled:
+            return
+        try:
+            await context.tracing.start(screenshots=True, snapshots=True, sources=False)
+            self.context = context
+            self.active = True
+            logger.info(f"🎞️  Playwright tracing 已啟用 ({self.mode})")
+        except Exception as e:
+            logger.warning(f"⚠️  無法啟用 tracing: {e}")
+
+    async def begin_step(self, step: str):
+        if not self.active or self.mode != "on_failure":
+            return
+        await self._close_chunk(None)
+        try:
+            await self.context.tracing.start_chunk(title=step)
+            self.chunk_open = True
+        except Exception as e:
+            logger.debug(f"tracing chunk 開始失敗: {e}")
+
+    async def end_step(self, step: str, failed: bool, path: Path) -> Optional[Path]:
+        """結束步驟 chunk：失敗時保存，成功時丟棄"""
+        if not self.active or self.mode != "on_failure":
+            return None
+        return await self._close_chunk(path if failed else None)
+
+    async def _close_chunk(self, path: Optional[Path]) -> Optional[Path]:
+        if not self.chunk_open:
+            return None
+        self.chunk_open = False
+        try:
+            if path is None:
+                await self.context.tracing.stop_chunk()
+                return None
+            await self.context.tracing.stop_chunk(path=str(path))
+            return self._enforce_size(Path(path))
+        except Exception as e:
+            logger.debug(f"tracing chunk 結束失敗: {e}")
+            return None
+
+    async def stop(self, path: Path) -> Optional[Path]:
+        """結束 tracing（sample 模式保存整段）"""
+        if not self.active:
+            return None
+        self.active = False
+        await self._close_chunk(None)
+        try:
+            if self.mode == "sample":
+                await self.context.tracing.stop(path=str(path))
+                return self._enforce_size(Path(path))
+            await self.context.tracing.stop()
+        except Exception as e:
+            logger.warning(f"⚠️  tracing 結束失敗: {e}")
+        return None
+
+    def _enforce_size(self, path: Path) -> Optional[Path]:
+        """超過大小上限的 trace 不保留"""
+        if not path.exists():
+            return None
+        size = path.stat().st_size
+        if size > self.max_bytes:
+            path.unlink()
+            logger.warning(f"⚠️  trace {path.name} 大小 {size / 1024 / 1024:.1f} MB 超過上限，已刪除")
+            return None
+        logger.info(f"🎞️  已保存 trace: {path} ({size / 1024 / 1024:.1f} MB)")
+        return path
+
+
+def create_trace_sampler(profiling_config: dict) -> TraceSampler:
+    return TraceSampler(
+        profiling_config["trace_mode"],
+        profiling_config["trace_sample_rate"],
+        profiling_config["trace_max_mb"],
+    )
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+台北街頭藝人申請系統 - 共用瀏覽器服務
+
+啟動一個 Chromium 並開放 CDP 連線埠，多個 worker process 以 BROWSER_MODE=cdp 連線，
+每個帳號各自建立隔離的 context，整台機器只有一組 Chromium process。
+
+使用方式：
+    python browser_server.py                     # 預設 BROWSER_CDP_PORT=9222
+    BROWSER_MODE=cdp python main.py              # worker 連線到 BROWSER_CDP_URL
+"""
+
+import signal
+import asyncio
+import logging
+
+from config import BROWSER_CONFIG, HEADLESS_STEALTH_ARGS, DRIVER_CONFIG
+from driver_manager import get_driver_manager, shutdown_driver
+
+logger = logging.getLogger(__name__)
+
+
+async def serve():
+    driver_manager = get_driver_manager()
+    playwright = await driver_manager.get_playwright()
+    args = HEADLESS_STEALTH_ARGS + [
+        "--no-sandbox",
+        "--disable-setuid-sandbox",
+        # 只開放本機連線
+        "--remote-debugging-address=127.0.0.1",
+        f"--remote-debugging-port={DRIVER_CONFIG['cdp_port']}",
+    ]
+    if BROWSER_CONFIG["headless"]:
+        args.append("--headless=new")
+    driver_manager.browser = await playwright.chromium.launch(headless=BROWSER_CONFIG["headless"], args=args)
+    driver_manager.refresh_browser_pids()
+    print(f"🌐 共用瀏覽器已啟動: http://127.0.0.1:{DRIVER_CONFIG['cdp_port']}", flush=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        while not stop.is_set():
+            driver_manager.log_memory("（共用瀏覽器）")
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=60)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        print("🛑 關閉共用瀏覽器...", flush=True)
+        await shutdown_driver()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(serve())
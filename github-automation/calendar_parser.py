@@ -0,0 +1,189 @@
+"""
+台北街頭藝人申請系統 - 場地日曆解析模組
+
+在瀏覽器內一次取出所有「個人登記」按鈕與所在日曆格的文字，
+解析成時段資料（日期、時段名稱、識別 key）
+"""
+
+import re
+from datetime import date
+from typing import List, Optional
+
+# 「個人登記」按鈕選擇器（依優先順序嘗試）
+PERSONAL_REGISTER_SELECTORS = [
+    '.button_apply[title="個人登記"]',
+    'text="個人登記"',
+    'button:has-text("個人登記")',
+    '[title="個人登記"]'
+]
+
+PERIOD_NAMES = ["早上", "下午", "晚上"]
+
+_DATE_PATTERN = re.compile(r"(\d{4})[/-](\d{1,2})[/-](\d{1,2})")
+
+# 單一按鈕的日曆格資訊（在瀏覽器內執行）
+_DESCRIBE_BUTTON_JS = """
+el => {
+    const cell = el.closest('td') || el.parentElement;
+    const block = el.closest('[data-period], li, tr') || el.parentElement;
+    return {
+        cell_text: cell ? cell.innerText : '',
+        block_text: block && block !== cell ? block.innerText : '',
+        cell_date: cell && cell.dataset ? (cell.dataset.date || '') : '',
+        period_attr: block && block.dataset ? (block.dataset.period || '') : '',
+        href: el.getAttribute('href') || '',
+    };
+}
+"""
+
+# 所有按鈕一次解析（避免每個按鈕各做一次往返）
+_PARSE_CALENDAR_JS = f"""
+selector => Array.from(document.querySelectorAll(selector)).map({_DESCRIBE_BUTTON_JS})
+"""
+
+
+def _normalize(text: str) -> str:
+    return " ".join((text or "").split())
+
+
+def parse_slot(raw: dict, venue_url: str = "") -> dict:
+    """把瀏覽器取出的原始資料轉成時段資料"""
+    cell_text = _normalize(raw.get("cell_text"))
+    block_text = _normalize(raw.get("block_text"))
+
+    slot_date: Optional[date] = None
+    match = _DATE_PATTERN.search(raw.get("cell_date") or "") or _DATE_PATTERN.search(cell_text)
+    if match:
+        slot_date = date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+
+    period = raw.get("period_attr") or next(
+        (name for name in PERIOD_NAMES if name in block_text), None
+    )
+
+    if slot_date and period:
+        identity = f"{slot_date.isoformat()}|{period}"
+    else:
+        identity = f"{cell_text}|{block_text}"
+
+    return {
+        "key": f"{venue_url}|{identity}",
+        "date": slot_date,
+        "period": period,
+        "text": block_text or cell_text,
+        "href": raw.get("href", ""),
+    }
+
+
+async def describe_button(button, venue_url: str = "") -> dict:
+    """解析單一「個人登記」按鈕所在的時段"""
+    raw = await button.evaluate(_DESCRIBE_BUTTON_JS)
+    return parse_slot(raw, venue_url)
+
+
+async def parse_calendar(page, venue_url: str = "",
+                         selector: str = PERSONAL_REGISTER_SELECTORS[0]) -> List[dict]:
+    """
+    解析目前日曆頁面上所有可申請時段
+
+    Returns:
+        時段列表，順序與頁面上的「個人登記」按鈕相同（index 欄位可對應按鈕）
+    """
+    raws = await page.evaluate(_PARSE_CALENDAR_JS, selector)
+    slots = []
+    for index, raw in enumerate(raws):
+        slot = parse_slot(raw, venue_url)
+        slot["index"] = index
+        slots.append(slot)
+    return slots
+
+
+# 只取有變動的日曆格：以日曆格文字為簽章，已知簽章的格子不回傳原始資料
+_PARSE_CHANGED_CELLS_JS = f"""
+([selector, known]) => {{
+    const knownSet = new Set(known);
+    const describe = {_DESCRIBE_BUTTON_JS};
+    return Array.from(document.querySelectorAll(selector)).map(el => {{
+        const cell = el.closest('td') || el.parentElement;
+        const signature = cell ? ((cell.dataset && cell.dataset.date) || '') + '|' + cell.innerText : '';
+        return {{signature, raw: signature && knownSet.has(signature) ? null : describe(el)}};
+    }});
+}}
+"""
+
+# 日曆容器存在且內容在 stable_ms 內沒有變化（取代固定等待與 networkidle）
+_CALENDAR_STABLE_JS = """
+([selectors, stableMs]) => {
+    const container = selectors.map(s => document.querySelector(s)).find(Boolean);
+    if (!container || document.readyState === 'loading') {
+        return false;
+    }
+    const signature = container.innerText.length + '|' + container.getElementsByTagName('*').length;
+    const now = performance.now();
+    const state = window.__calendarStable;
+    if (!state || state.signature !== signature) {
+        window.__calendarStable = {signature, since: now};
+        return false;
+    }
+    return now - state.since >= stableMs;
+}
+"""
+
+
+async def wait_calendar_ready(page, container_selectors: List[str], stable_ms: int = 300,
+                              timeout_ms: int = 8000, poll_ms: int = 100) -> bool:
+    """
+    等待日曆容器出現且內容穩定
+
+    Returns:
+        是否在時間內就緒
+    """
+    try:
+        await page.wait_for_function(_CALENDAR_STABLE_JS, arg=[container_selectors, stable_ms],
+                                     polling=poll_ms, timeout=timeout_ms)
+        return True
+    except Exception:
+        return False
+
+
+class CalendarTracker:
+    """
+    日曆時段的增量解析
+
+    每次申請後日曆只會變動少數幾格（剛申請的時段變成「已登記」）。
+    以日曆格文字為簽章，只有簽章改變的格子才重新取出原始資料並解析，其餘沿用上一次的結果
+    """
+
+    def __init__(self, venue_url: str = ""):
+        self.venue_url = venue_url
+        self._cells = {}  # 簽章 → 該格內各按鈕的時段（依頁面順序）
+        self.stats = {"refreshes": 0, "cells_parsed": 0, "cells_reused": 0}
+
+    async def refresh(self, page, selector: str) -> List[dict]:
+        """
+        解析目前所有可申請時段（只處理有變動的日曆格）
+
+        Returns:
+            時段列表，順序與 page.query_selector_all(selector) 相同（index 欄位可對應按鈕）
+        """
+        entries = await page.evaluate(_PARSE_CHANGED_CELLS_JS, [selector, list(self._cells)])
+        cells, positions, slots = {}, {}, []
+        parsed, reused = set(), set()
+        for index, entry in enumerate(entries):
+            signature = entry["signature"]
+            position = positions.get(signature, 0)
+            positions[signature] = position + 1
+            if entry["raw"] is None:
+                slot = dict(self._cells[signature][position])
+                reused.add(signature)
+            else:
+                slot = parse_slot(entry["raw"], self.venue_url)
+                parsed.add(signature)
+            slot["index"] = index
+            cells.setdefault(signature, []).append(slot)
+            slots.append(slot)
+        # 只保留目前頁面上的格子
+        self._cells = cells
+        self.stats["refreshes"] += 1
+        self.stats["cells_parsed"] += len(parsed)
+        self.stats["cells_reused"] += len(reused)
+        return slots
@@ -0,0 +1,191 @@
+"""
+台北街頭藝人申請系統 - 流程檢查點模組
+
+把申請流程拆成可續跑的步驟，並負責：
+- 檢查點儲存（已完成步驟、已申請時段、失敗紀錄）
+- 失敗分類（網路暫時性、登入逾期、網站維護、選擇器失效…）
+- 決定重試時從哪個步驟重新進入
+- 指數退避 + 隨機抖動的等待時間
+"""
+
+import json
+import random
+import logging
+from pathlib import Path
+from datetime import datetime
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 流程步驟（依執行順序）
+FLOW_STEPS = ["browser", "trajectory", "login", "navigate", "apply", "finalize"]
+
+# 失敗類型
+TRANSIENT_NETWORK = "transient_network"
+SESSION_EXPIRED = "session_expired"
+SITE_MAINTENANCE = "site_maintenance"
+SELECTOR_DRIFT = "selector_drift"
+BOT_DETECTED = "bot_detected"
+BROWSER_CRASHED = "browser_crashed"
+UNKNOWN = "unknown"
+
+# 各失敗類型最早需要重做的步驟（None 表示重做失敗的那一步）
+RESUME_STEP = {
+    TRANSIENT_NETWORK: None,
+    SESSION_EXPIRED: "login",
+    SITE_MAINTENANCE: "navigate",
+    SELECTOR_DRIFT: "navigate",
+    BOT_DETECTED: "browser",  # 被 reCAPTCHA 擋下時沿用原本策略：重建 Profile 與軌跡
+    BROWSER_CRASHED: "browser",
+    UNKNOWN: "browser",
+}
+
+# 依賴頁面位置的步驟，重做前需先回到日曆頁面
+STEP_REENTRY = {
+    "apply": "navigate",
+}
+
+_NETWORK_MARKERS = ["net::err_", "timeout", "econnreset", "connection", "dns"]
+_BROWSER_MARKERS = ["target closed", "browser has been closed", "context has been closed", "page has been closed"]
+_SELECTOR_MARKERS = ["waiting for selector", "無法找到", "無法點擊", "無法填入", "selector"]
+_MAINTENANCE_MARKERS = ["系統維護", "維護中", "maintenance", "service unavailable"]
+
+
+class StepFailed(Exception):
+    """步驟失敗（帶有失敗類型）"""
+
+    def __init__(self, step: str, kind: str, message: str = ""):
+        super().__init__(f"[{step}] {kind}: {message}")
+        self.step = step
+        self.kind = kind
+        self.message = message
+
+
+async def classify_failure(step: str, error: Optional[BaseException], page=None) -> str:
+    """
+    依例外訊息與目前頁面狀態判斷失敗類型
+
+    Args:
+        step: 失敗的步驟名稱
+        error: 例外（步驟回傳 False 時為 None）
+        page: 目前的 Playwright 頁面（可為 None）
+    """
+    if isinstance(error, StepFailed):
+        return error.kind
+
+    message = str(error or "").lower()
+    if any(marker in message for marker in _BROWSER_MARKERS):
+        return BROWSER_CRASHED
+
+    page_url, page_text = "", ""
+    if page is not None:
+        try:
+            page_url = page.url or ""
+            page_text = (await page.inner_text("body", timeout=2000))[:5000].lower()
+        except Exception:
+            if page.is_closed():
+                return BROWSER_CRASHED
+
+    if any(marker in page_text for marker in _MAINTENANCE_MARKERS):
+        return SITE_MAINTENANCE
+    if step == "login" and "signin.aspx" in page_url and error is None:
+        return BOT_DETECTED
+    if step in ("navigate", "apply", "finalize") and "signin.aspx" in page_url:
+        return SESSION_EXPIRED
+    if any(marker in message for marker in _NETWORK_MARKERS):
+        return TRANSIENT_NETWORK
+    if error is None or any(marker in message for marker in _SELECTOR_MARKERS):
+        return SELECTOR_DRIFT
+    return UNKNOWN
+
+
+def resume_step_for(step: str, kind: str) -> str:
+    """失敗後要重新進入的步驟（取失敗步驟與失敗類型要求中較早的一個）"""
+    target = RESUME_STEP.get(kind) or STEP_REENTRY.get(step, step)
+    return min(target, step, key=FLOW_STEPS.index)
+
+
+def compute_backoff(retry: int, kind: str, backoff_config: dict) -> float:
+    """
+    指數退避 + 隨機抖動
+
+    Args:
+        retry: 第幾次重試（從 1 開始）
+        kind: 失敗類型，網站維護使用較長的基準時間
+        backoff_config: config.RETRY_BACKOFF
+    """
+    base = backoff_config["maintenance_base_seconds"] if kind == SITE_MAINTENANCE else backoff_config["base_seconds"]
+    delay = min(backoff_config["max_seconds"], base * (2 ** (retry - 1)))
+    jitter = backoff_config["jitter"]
+    return random.uniform(delay * (1 - jitter), delay)
+
+
+class FlowCheckpoint:
+    """流程檢查點（每次狀態變化都寫入 JSON 檔）"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.completed: List[str] = []
+        self.applied_slots: List[str] = []
+        self.failures: List[dict] = []
+
+    @classmethod
+    def load(cls, path: Path) -> "FlowCheckpoint":
+        """
+        載入既有檢查點
+
+        瀏覽器與登入狀態無法跨 process 保留，只還原已申請時段與失敗紀錄
+        """
+        checkpoint = cls(path)
+        if checkpoint.path.exists():
+            try:
+                data = json.loads(checkpoint.path.read_text(encoding="utf-8"))
+                checkpoint.applied_slots = data.get("applied_slots", [])
+                checkpoint.failures = data.get("failures", [])
+                logger.info(f"📂 載入檢查點: 已申請 {len(checkpoint.applied_slots)} 個時段")
+            except Exception as e:
+                logger.warning(f"⚠️  檢查點檔案無法讀取，重新開始: {e}")
+        return checkpoint
+
+    def next_step(self) -> Optional[str]:
+        for step in FLOW_STEPS:
+            if step not in self.completed:
+                return step
+        return None
+
+    def mark_done(self, step: str, applied_slots: List[str] = None):
+        if step not in self.completed:
+            self.completed.append(step)
+        if applied_slots is not None:
+            self.applied_slots = list(applied_slots)
+        self.save()
+
+    def invalidate_from(self, step: str):
+        """讓指定步驟（含）之後的所有步驟失效"""
+        index = FLOW_STEPS.index(step)
+        self.completed = [s for s in self.completed if FLOW_STEPS.index(s) < index]
+        self.save()
+
+    def record_failure(self, step: str, kind: str, message: str, resume_at: str, delay: float):
+        self.failures.append({
+            "time": datetime.now().isoformat(),
+            "step": step,
+            "kind": kind,
+            "message": message[:500],
+            "resume_at": resume_at,
+            "backoff_seconds": round(delay, 2),
+        })
+        self.save()
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps({
+            "completed": self.completed,
+            "applied_slots": self.applied_slots,
+            "failures": self.failures,
+            "updated_at": datetime.now().isoformat(),
+        }, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    def clear(self):
+        if self.path.exists():
+            self.path.unlink()
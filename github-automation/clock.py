@@ -0,0 +1,119 @@
+"""
+台北街頭藝人申請系統 - 時鐘模組
+
+所有刻意等待（人類行為延遲、停留時間、重試退避）都透過時鐘執行：
+- RealClock：實際等待（預設）
+- VirtualClock：只記錄要求的等待時間並立即繼續，
+  讓測試與效能測試能在幾秒內跑完整個流程，同時保留模擬的時間軸
+
+同時執行的工作單元各自使用 fork() 出來的時鐘：平行的等待不能加總在同一條時間軸上
+"""
+
+import time
+import asyncio
+import logging
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+
+class RealClock:
+    """實際時鐘"""
+
+    virtual = False
+
+    def now(self) -> float:
+        return time.monotonic()
+
+    async def sleep(self, ms: float, page=None, label: str = "delay"):
+        """等待指定毫秒（有頁面時使用 page.wait_for_timeout，與原本行為一致）"""
+        if page is not None:
+            await page.wait_for_timeout(ms)
+        else:
+            await asyncio.sleep(ms / 1000)
+
+    def fork(self) -> "RealClock":
+        """實際時間本來就是共用的"""
+        return self
+
+
+class VirtualClock:
+    """虛擬時鐘：記錄等待時間並立即前進"""
+
+    virtual = True
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.simulated_ms = 0.0
+        self.waits = defaultdict(lambda: {"count": 0, "total_ms": 0.0})
+        self.forked_at_ms = 0.0
+        self.children = []
+
+    def fork(self) -> "VirtualClock":
+        """
+        給同時執行的工作單元一條自己的時間軸（從本時鐘自己的模擬時間接續，不含其他平行單元）
+
+        子時鐘的等待只前進子時鐘；報告中平行的等待取最長的一條，不再加總
+        """
+        child = VirtualClock()
+        child.started_at = self.started_at
+        child.simulated_ms = child.forked_at_ms = self.simulated_ms
+        self.children.append(child)
+        return child
+
+    def _timeline_ms(self) -> float:
+        """這條時間軸跳過的等待（含平行子時鐘中最長的一條）"""
+        return self.simulated_ms + max((c._timeline_ms() - c.forked_at_ms for c in self.children), default=0.0)
+
+    def _all_waits(self) -> dict:
+        waits = defaultdict(lambda: {"count": 0, "total_ms": 0.0})
+        for clock in [self] + self.children:
+            for label, wait in (clock.waits if clock is self else clock._all_waits()).items():
+                waits[label]["count"] += wait["count"]
+                waits[label]["total_ms"] += wait["total_ms"]
+        return waits
+
+    def now(self) -> float:
+        """模擬時間 = 實際經過時間 + 被略過的等待時間"""
+        return self.started_at + (time.perf_counter() - self.started_at) + self._timeline_ms() / 1000
+
+    async def sleep(self, ms: float, page=None, label: str = "delay"):
+        self.simulated_ms += ms
+        self.waits[label]["count"] += 1
+        self.waits[label]["total_ms"] += ms
+        # 仍讓出執行權，維持原本的協程交錯順序
+        await asyncio.sleep(0)
+
+    def report(self) -> dict:
+        """模擬牆鐘時間與實際運算時間比較"""
+        compute_seconds = time.perf_counter() - self.started_at
+        simulated_wait_seconds = self._timeline_ms() / 1000
+        return {
+            "compute_seconds": round(compute_seconds, 3),
+            "simulated_wait_seconds": round(simulated_wait_seconds, 3),
+            "simulated_wall_seconds": round(compute_seconds + simulated_wait_seconds, 3),
+            "speedup": round((compute_seconds + simulated_wait_seconds) / compute_seconds, 1) if compute_seconds else None,
+            # 各時間軸的等待加總（平行的工作單元各自計入）
+            "waits": {label: {"count": w["count"], "total_ms": round(w["total_ms"], 1)}
+                      for label, w in sorted(self._all_waits().items())},
+        }
+
+    def log_report(self):
+        report = self.report()
+        logger.info("⏱️  虛擬時鐘報告:")
+        logger.info(f"   模擬牆鐘時間: {report['simulated_wall_seconds']} 秒 "
+                    f"(等待 {report['simulated_wait_seconds']} 秒 + 運算 {report['compute_seconds']} 秒)")
+        logger.info(f"   實際執行時間: {report['compute_seconds']} 秒 (加速 {report['speedup']} 倍)")
+        for label, wait in report["waits"].items():
+            logger.info(f"   - {label}: {wait['count']} 次，共 {wait['total_ms'] / 1000:.1f} 秒")
+        return report
+
+
+def create_clock(mode: str = "real"):
+    """依設定建立時鐘（real 或 virtual）"""
+    if mode == "virtual":
+        logger.info("⏩ 使用虛擬時鐘：所有刻意等待都會立即前進")
+        return VirtualClock()
+    if mode != "real":
+        raise ValueError(f"未知的時鐘模式: {mode}")
+    return RealClock()
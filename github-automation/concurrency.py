@@ -0,0 +1,324 @@
+"""
+台北街頭藝人申請系統 - 自適應並行控制模組
+
+Cloud Run 容器的記憶體與 CPU 是固定的，Xvfb 下每多開一個 Chromium 頁面就多幾百 MB。
+控制器定期取樣：
+- 容器 RSS（Python + driver + Chromium，driver_manager.memory_report）
+- cgroup 記憶體用量、上限與 PSI 記憶體壓力（v2 / v1 都支援）
+- cgroup CPU 使用率（相對於配額）
+- 各頁面導航耗時
+依結果增減同時執行的頁面數，永遠保持在 OOM 安全上限之下，並記錄每一次調整原因。
+"""
+
+import os
+import time
+import asyncio
+import logging
+from pathlib import Path
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+
+from driver_manager import get_driver_manager
+
+logger = logging.getLogger(__name__)
+
+_CGROUP = Path("/sys/fs/cgroup")
+# cgroup v1 沒有上限時會回報接近 2^63 的數字
+_UNLIMITED = 1 << 60
+
+
+def _read_int(path: Path) -> Optional[int]:
+    try:
+        value = path.read_text().strip()
+    except OSError:
+        return None
+    if value == "max":
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        return None
+    return None if number >= _UNLIMITED else number
+
+
+def read_cgroup_memory() -> dict:
+    """cgroup 記憶體用量與上限（MB，無法取得時為 None）"""
+    if (_CGROUP / "memory.current").exists():
+        usage, limit = _read_int(_CGROUP / "memory.current"), _read_int(_CGROUP / "memory.max")
+    else:
+        usage = _read_int(_CGROUP / "memory" / "memory.usage_in_bytes")
+        limit = _read_int(_CGROUP / "memory" / "memory.limit_in_bytes")
+    to_mb = lambda value: round(value / 1024 / 1024, 1) if value is not None else None
+    return {"usage_mb": to_mb(usage), "limit_mb": to_mb(limit)}
+
+
+def read_memory_pressure() -> Optional[float]:
+    """PSI 記憶體壓力（some avg10，百分比）"""
+    for path in (_CGROUP / "memory.pressure", Path("/proc/pressure/memory")):
+        try:
+            for line in path.read_text().splitlines():
+                if line.startswith("some"):
+                    fields = dict(part.split("=") for part in line.split()[1:])
+                    return float(fields["avg10"])
+        except (OSError, KeyError, ValueError):
+            continue
+    return None
+
+
+class CpuSampler:
+    """以兩次取樣之間的 cgroup CPU 時間計算使用率（1.0 = 用滿配額）"""
+
+    def __init__(self):
+        self.cores = self._quota_cores()
+        self._previous = None
+
+    @staticmethod
+    def _quota_cores() -> float:
+        try:
+            quota, period = (_CGROUP / "cpu.max").read_text().split()
+            if quota != "max":
+                return int(quota) / int(period)
+        except (OSError, ValueError):
+            pass
+        quota = _read_int(_CGROUP / "cpu" / "cpu.cfs_quota_us")
+        period = _read_int(_CGROUP / "cpu" / "cpu.cfs_period_us")
+        if quota and quota > 0 and period:
+            return quota / period
+        return float(os.cpu_count() or 1)
+
+    @staticmethod
+    def _usage_seconds() -> Optional[float]:
+        try:
+            for line in (_CGROUP / "cpu.stat").read_text().splitlines():
+                if line.startswith("usage_usec"):
+                    return int(line.split()[1]) / 1e6
+        except (OSError, ValueError):
+            pass
+        usage = _read_int(_CGROUP / "cpuacct" / "cpuacct.usage")
+        return usage / 1e9 if usage is not None else None
+
+    def sample(self) -> Optional[float]:
+        usage = self._usage_seconds()
+        now = time.monotonic()
+        if usage is None:
+            return None
+        previous, self._previous = self._previous, (usage, now)
+        if previous is None or now <= previous[1]:
+            return None
+        return round((usage - previous[0]) / (now - previous[1]) / self.cores, 3)
+
+
+class ConcurrencyController:
+    """
+    自適應並行數控制
+
+    以 slot() 取得執行名額；limit 由 adjust() 依取樣結果增減（每次 ±1，調整後冷卻一段時間）
+    """
+
+    def __init__(self, concurrency_config: dict, rss_reader: Callable[[], float] = None,
+                 now: Callable[[], float] = time.monotonic):
+        self.config = concurrency_config
+        self.min_pages = concurrency_config["min_pages"]
+        self.max_pages = concurrency_config["max_pages"]
+        self.limit = self.min_pages
+        self.active = 0
+        self.rss_reader = rss_reader
+        self.now = now
+        self.cpu = CpuSampler()
+        self.latencies = deque(maxlen=concurrency_config["latency_window"])
+        self.decisions = []
+        self.last_change = None
+        self.baseline_mb = None
+        self._condition = asyncio.Condition()
+        self._monitor = None
+
+    # ---- 執行名額 ----
+    @asynccontextmanager
+    async def slot(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.active -= 1
+                self._condition.notify_all()
+
+    def record_latency(self, seconds: float):
+        """頁面導航耗時（navigate、日曆重新載入）"""
+        self.latencies.append(seconds)
+
+    # ---- 取樣與調整 ----
+    def sample(self) -> dict:
+        cgroup = read_cgroup_memory()
+        rss = self.rss_reader() if self.rss_reader else None
+        used = max(v for v in (cgroup["usage_mb"], rss, 0) if v is not None)
+        limit = cgroup["limit_mb"] or self.config["fallback_memory_mb"]
+        latencies = sorted(self.latencies)
+        return {
+            "used_mb": round(used, 1),
+            "limit_mb": limit,
+            "ceiling_mb": round(limit * self.config["memory_safety_ratio"], 1),
+            "pressure": read_memory_pressure(),
+            "cpu": self.cpu.sample(),
+            "latency_p90": latencies[int(len(latencies) * 0.9)] if latencies else None,
+            "active": self.active,
+        }
+
+    def page_cost_mb(self, used_mb: float) -> float:
+        """每個頁面的記憶體估計（以開始前的用量為基準實測，不低於設定值）"""
+        measured = (used_mb - self.baseline_mb) / self.active if self.active and self.baseline_mb else 0
+        return max(self.config["page_memory_mb"], measured)
+
+    def decide(self, sample: dict):
+        """
+        決定下一個並行數
+
+        Returns:
+            (新的並行數, 原因)
+        """
+        cfg = self.config
+        cost = self.page_cost_mb(sample["used_mb"])
+        pressure, cpu, latency = sample["pressure"], sample["cpu"], sample["latency_p90"]
+
+        # 縮減不受冷卻限制：接近 OOM 時要立刻反應
+        if sample["used_mb"] > sample["ceiling_mb"]:
+            return self.limit - 1, f"記憶體 {sample['used_mb']:.0f} MB 超過安全上限 {sample['ceiling_mb']:.0f} MB"
+        if pressure is not None and pressure > cfg["pressure_high"]:
+            return self.limit - 1, f"記憶體壓力 {pressure:.1f}% 過高"
+        if self.last_change is not None and self.now() - self.last_change < cfg["cooldown_seconds"]:
+            return self.limit, "冷卻中"
+        if cpu is not None and cpu > cfg["cpu_high"]:
+            return self.limit - 1, f"CPU {cpu:.0%} 過高"
+        if latency is not None and latency > cfg["latency_high_seconds"]:
+            return self.limit - 1, f"頁面延遲 p90 {latency:.1f} 秒過高"
+
+        # 只有名額用滿時才增加，否則多開也沒有用
+        if self.active < self.limit:
+            return self.limit, "名額未用滿"
+        if sample["used_mb"] + cost > sample["ceiling_mb"]:
+            return self.limit, f"再開一個頁面（約 {cost:.0f} MB）會超過安全上限"
+        if cpu is not None and cpu > cfg["cpu_low"]:
+            return self.limit, f"CPU {cpu:.0%} 沒有餘裕"
+        return self.limit + 1, f"記憶體 {sample['used_mb']:.0f}/{sample['ceiling_mb']:.0f} MB、CPU 有餘裕"
+
+    async def adjust(self) -> int:
+        sample = self.sample()
+        target, reason = self.decide(sample)
+        target = max(self.min_pages, min(self.max_pages, target))
+        if target != self.limit:
+            arrow = "📈" if target > self.limit else "📉"
+            logger.info(f"{arrow} 並行頁面數 {self.limit} → {target}：{reason}")
+            self.decisions.append({"at": round(self.now(), 1), "from": self.limit, "to": target,
+                                   "reason": reason, "sample": sample})
+            self.last_change = self.now()
+            async with self._condition:
+                self.limit = target
+                self._condition.notify_all()
+        return self.limit
+
+    async def _monitor_loop(self):
+        while True:
+            await asyncio.sleep(self.config["interval_seconds"])
+            try:
+                await self.adjust()
+            except Exception as e:
+                logger.debug(f"並行控制取樣失敗: {e}")
+
+    def start(self):
+        if self.baseline_mb is None:
+            self.baseline_mb = self.sample()["used_mb"]
+        if self._monitor is None and self.max_pages > self.min_pages:
+            self._monitor = asyncio.ensure_future(self._monitor_loop())
+
+    async def stop(self):
+        if self._monitor:
+            self._monitor.cancel()
+            await asyncio.gather(self._monitor, return_exceptions=True)
+            self._monitor = None
+
+    def summary(self) -> dict:
+        return {"limit": self.limit, "min_pages": self.min_pages, "max_pages": self.max_pages,
+                "decisions": self.decisions}
+
+
+def create_concurrency_controller(concurrency_config: dict) -> ConcurrencyController:
+    """依設定建立控制器（RSS 由 driver 管理器提供）"""
+    return ConcurrencyController(
+        concurrency_config,
+        rss_reader=lambda: get_driver_manager().memory_report()["total_rss_mb"]
+    )
+
+
+class SiblingPages:
+    """
+    同一個帳號的多個工作單元（場地）：第一個頁面登入後，其他頁面在同一個 context 開新分頁，
+    不必每個場地各自開瀏覽器與登入
+
+    第一個頁面重建瀏覽器時，還有分頁在用的舊 context 保留到最後（close_retired）才關閉，
+    重新登入後的新 context 則提供給之後才開分頁的工作單元
+    """
+
+    def __init__(self):
+        self.leader = None
+        self.pages = []
+        self.retired = []
+        self._ready = asyncio.Event()
+
+    def session_ready(self, manager):
+        """第一個頁面登入完成（重建瀏覽器後再次登入時改用新的登入狀態）"""
+        self.leader = manager
+        self._ready.set()
+
+    def leader_finished(self):
+        """第一個頁面結束（沒有登入成功時，其他頁面改為各自登入）"""
+        self._ready.set()
+
+    async def open_page(self):
+        """
+        等待登入完成後開新分頁
+
+        Returns:
+            共用登入狀態的 AntiDetectionManager，無法共用時為 None
+        """
+        await self._ready.wait()
+        if self.leader is None or self.leader.context is None:
+            return None
+        try:
+            manager = await self.leader.open_sibling()
+        except Exception as e:
+            logger.warning(f"⚠️  無法在共用的瀏覽器開新分頁，改為獨立登入: {e}")
+            return None
+        self.pages.append(manager)
+        return manager
+
+    def in_use(self, manager) -> bool:
+        """還有分頁開在這個管理器的 context"""
+        return any(page.parent is manager and page.page is not None for page in self.pages)
+
+    async def release(self, manager):
+        """
+        第一個頁面要重建瀏覽器：沒有分頁在用時直接關閉，否則保留到 close_retired
+
+        Returns:
+            是否已關閉
+        """
+        if manager is None:
+            return True
+        if self.leader is manager:
+            # 之後才開分頁的工作單元等待重新登入
+            self.leader = None
+            self._ready.clear()
+        if self.in_use(manager):
+            logger.info("🗂️  其他場地的分頁仍在使用登入狀態，保留原本的瀏覽器到最後才關閉")
+            self.retired.append(manager)
+            return False
+        await manager.close_browser()
+        return True
+
+    async def close_retired(self):
+        """所有分頁都關閉後，關閉保留下來的瀏覽器"""
+        while self.retired:
+            await self.retired.pop().close_browser()
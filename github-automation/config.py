@@ -1,13 +1,17 @@
 # 台北街頭藝人申請系統 - 設定檔
 
 import os
+import json
+import tempfile
+import time
 
 # Phase 控制 (可透過環境變數 PHASE=1 或 PHASE=2 控制)
 CURRENT_PHASE = int(os.getenv('PHASE', '1'))  # 預設為 Phase 1
 
-# 網站設定
-TAIPEI_ARTIST_WEBSITE_URL = "https://tpbusker.gov.taipei/signin.aspx"
-APPLY_PAGE_URL = "https://tpbusker.gov.taipei/apply.aspx"
+# 網站設定（TPBUSKER_BASE_URL 可指向本機假網站 fake_site.py 做離線測試）
+TPBUSKER_BASE_URL = os.getenv('TPBUSKER_BASE_URL', 'https://tpbusker.gov.taipei').rstrip('/')
+TAIPEI_ARTIST_WEBSITE_URL = f"{TPBUSKER_BASE_URL}/signin.aspx"
+APPLY_PAGE_URL = f"{TPBUSKER_BASE_URL}/apply.aspx"
 
 # 登入設定 (從 Repository Secrets 讀取)
 TAIPEI_ARTIST_USERNAME = os.getenv('TAIPEI_USERNAME')
@@ -20,12 +24,19 @@ if not TAIPEI_ARTIST_USERNAME or not TAIPEI_ARTIST_PASSWORD:
 
 # 場地申請網址配置 (直接進入各場地的日曆頁面)
 VENUE_URLS = {
-    "大安森林公園_2號門": "https://tpbusker.gov.taipei/apply.aspx?pl=9&loc=67",
-    "北投公園_1號點": "https://tpbusker.gov.taipei/applys3.aspx?pl=4&loc=287"
+    "大安森林公園_2號門": f"{TPBUSKER_BASE_URL}/apply.aspx?pl=9&loc=67",
+    "北投公園_1號點": f"{TPBUSKER_BASE_URL}/applys3.aspx?pl=4&loc=287"
 }
 
 # 當前使用的場地 (可在此切換不同場地進行測試)
-CURRENT_VENUE_URL = VENUE_URLS["北投公園_1號點"]  # 目前使用北投公園測試
+CURRENT_VENUE_NAME = "北投公園_1號點"  # 目前使用北投公園測試
+CURRENT_VENUE_URL = VENUE_URLS[CURRENT_VENUE_NAME]
+
+# 多帳號設定（選用）：TAIPEI_ACCOUNTS='[{"username": "...", "password": "..."}]'
+# 未設定時只使用 TAIPEI_USERNAME / TAIPEI_PASSWORD 單一帳號
+ACCOUNTS = json.loads(os.getenv('TAIPEI_ACCOUNTS', '[]')) or [
+    {"username": TAIPEI_ARTIST_USERNAME, "password": TAIPEI_ARTIST_PASSWORD}
+]
 
 # 表演項目設定 (填入「本次展演項目」欄位)
 PERFORMANCE_ITEMS = "唱歌、跳舞、助盲"
@@ -34,11 +45,92 @@ PERFORMANCE_ITEMS = "唱歌、跳舞、助盲"
 MAX_RETRIES = 3
 RETRY_DELAY_SECONDS = 30
 
+# 重試退避設定（指數退避 + 隨機抖動，網站維護時使用較長的基準時間）
+RETRY_BACKOFF = {
+    "base_seconds": 2,
+    "max_seconds": RETRY_DELAY_SECONDS,
+    "maintenance_base_seconds": 20,
+    "jitter": 0.5  # 實際等待時間為 [delay*(1-jitter), delay] 之間的隨機值
+}
+
+# 時鐘模式：real（實際等待）或 virtual（記錄等待時間並立即前進，用於測試與效能測試）
+CLOCK_MODE = os.getenv('CLOCK_MODE', 'real')
+
+# 流程檢查點存放位置（失敗後從最早失效的步驟續跑）
+CHECKPOINT_DIR = "checkpoints"
+# 檢查點所屬的執行：同一個 Cloud Run 執行的 task 重試 / 同一個 GitHub Actions run 的重新執行才會沿用，
+# 兩者都沒有時每個 process 各自一份（不會被之後無關的執行讀到）
+CHECKPOINT_RUN_ID = (os.getenv('CLOUD_RUN_EXECUTION') or os.getenv('GITHUB_RUN_ID')
+                     or f"local-{os.getpid()}-{int(time.time())}")
+CHECKPOINT_RESUMABLE = not CHECKPOINT_RUN_ID.startswith("local-")
+
+# Cloud Run Jobs 分片設定
+# CLOUD_RUN_TASK_INDEX / CLOUD_RUN_TASK_COUNT / CLOUD_RUN_EXECUTION 由 Cloud Run 自動注入
+SHARD_CONFIG = {
+    "task_index": int(os.getenv('CLOUD_RUN_TASK_INDEX', '0')),
+    "task_count": int(os.getenv('CLOUD_RUN_TASK_COUNT', '1')),
+    "run_id": os.getenv('CLOUD_RUN_EXECUTION', 'local'),
+    # 要分配的場地（逗號分隔的 VENUE_URLS 名稱），預設只有當前場地
+    "venues": [v for v in os.getenv('SHARD_VENUES', '').split(',') if v] or [CURRENT_VENUE_NAME],
+    # 日期區間（逗號分隔，格式 YYYY-MM-DD~YYYY-MM-DD），空字串代表整個日曆
+    "date_ranges": [d for d in os.getenv('SHARD_DATE_RANGES', '').split(',') if d] or [""],
+    # 搶位鎖定檔存放位置：local（本機資料夾）或 gcs
+    "claim_backend": os.getenv('SHARD_CLAIM_BACKEND', 'gcs' if CURRENT_PHASE == 4 else 'local'),
+    "local_storage_dir": os.getenv('SHARD_STORAGE_DIR', 'shard_storage'),
+}
+
 # GitHub Actions 執行時間限制 (建議 10 分鐘)
 EXECUTION_TIMEOUT_MINUTES = 10
 
-# 網站結構分析輸出檔案
-WEBSITE_STRUCTURE_FILE = "website_structure.json"
+# tpbusker 請求限流設定（rate_limiter.py）
+# 導航、表單送出與日曆重新載入都要先取得 token；burst 為可連續送出的次數
+RATE_LIMIT_CONFIG = {
+    "enabled": os.getenv('RATE_LIMIT', '1') != '0',
+    "rate_per_second": float(os.getenv('RATE_LIMIT_RPS', '1')),
+    "burst": int(os.getenv('RATE_LIMIT_BURST', '3')),
+    # local：同一個 process 共用；file：同一台機器的多個 process 透過狀態檔共用
+    "coordinator": os.getenv('RATE_LIMIT_COORDINATOR', 'local'),
+    "state_file": os.getenv('RATE_LIMIT_STATE_FILE', os.path.join(tempfile.gettempdir(), 'tpbusker_rate_limit.json')),
+}
+
+# 申請觸發合併設定（single_flight.py）
+# 同一個 (帳號, 場地組合, 申請梯次) 同時只執行一次，重複觸發共用結果
+SINGLE_FLIGHT_CONFIG = {
+    "enabled": os.getenv('SINGLE_FLIGHT', '1') != '0',
+    "backend": os.getenv('SINGLE_FLIGHT_BACKEND', 'gcs' if CURRENT_PHASE == 4 else 'local'),
+    "local_storage_dir": os.getenv('SINGLE_FLIGHT_STORAGE_DIR', 'flight_storage'),
+    "lease_seconds": EXECUTION_TIMEOUT_MINUTES * 60,  # 執行者中途消失時，鎖定多久後失效
+    "reuse_seconds": 300,  # 剛完成的結果在此時間內直接回傳
+    "poll_seconds": 5,  # 等待其他 process 執行結果的輪詢間隔
+    "period": os.getenv('APPLICATION_PERIOD', ''),  # 申請梯次，空字串代表依日期推算
+}
+
+# 執行期限設定（整體期限為 EXECUTION_TIMEOUT_MINUTES）
+DEADLINE_CONFIG = {
+    "reporting_reserve_seconds": 60,  # 保留給截圖上傳與結果回報
+    "stall_seconds": 45,  # 頁面多久沒有任何進度事件視為卡住
+    "watchdog_interval_seconds": 1,
+    "cancel_grace_seconds": 5,  # 取消步驟後最多等它結束多久（步驟吞掉取消時不會卡住）
+    "diagnostics_timeout_seconds": 10,
+    # 各步驟分配剩餘時間的權重
+    "step_weights": {
+        "browser": 0.05,
+        "trajectory": 0.3,
+        "login": 0.15,
+        "navigate": 0.05,
+        "apply": 0.4,
+        "finalize": 0.05
+    }
+}
+
+# 網站結構分析輸出檔案（site_structure.py --analyze 產生，一般執行也會寫回實際可用的選擇器）
+WEBSITE_STRUCTURE_FILE = os.getenv('WEBSITE_STRUCTURE_FILE', "website_structure.json")
+
+# 網站結構計畫設定（site_structure.py）
+SITE_STRUCTURE_CONFIG = {
+    "enabled": os.getenv('SITE_STRUCTURE', '1') != '0',
+    "file": WEBSITE_STRUCTURE_FILE,
+}
 
 # 反檢測設定
 ANTI_DETECTION_ENABLED = True
@@ -46,8 +138,79 @@ ANTI_DETECTION_ENABLED = True
 # 截圖設定
 SCREENSHOT_DIR = "screenshots"
 
-# 養軌跡設定
-TRAJECTORY_BUILDING_ENABLED = True
+# 截圖策略：none / errors（只留錯誤，失敗時寫出緩衝區）/ milestones（關鍵畫面）/ all（全部）
+SCREENSHOT_POLICY = {
+    "mode": os.getenv('SCREENSHOT_POLICY', 'all'),
+    "ring_buffer_size": 8,  # 未存檔畫面在記憶體中保留的張數
+    "milestones": ["venue_page", "step5_login_result", "success_slot_*", "final_result"],
+    "errors": ["*_error", "timeout_*", "failure_*"]
+}
+
+# 結果摘要圖設定（contact_sheet.py，需要 Pillow 與 numpy）
+# 關鍵畫面拼成一張 JPEG 並輸出小縮圖，與截圖、manifest 一起上傳，通知只需讀一個物件
+RUN_SUMMARY_CONFIG = {
+    "enabled": os.getenv('RUN_SUMMARY', '1') != '0',
+    "key_frames": SCREENSHOT_POLICY["milestones"],
+    "max_frames": 12,
+    "columns": 3,
+    "tile_width": 400,
+    "thumbnail_width": 240,
+    "quality": 70,
+}
+
+# 網路請求計時設定（network_timing.py），預設關閉
+NETWORK_TIMING_CONFIG = {
+    "enabled": os.getenv('NETWORK_TIMING', '0') == '1',
+    "sso_markers": ["id.taipei", "taipeipass"],  # 台北通登入的網域或路徑
+    "top_n": 10,  # 報告中列出的最慢資源數
+    "waterfall_limit": 100,  # 每個步驟的瀑布圖最多列出的請求數
+    "report_name": "network_timing"
+}
+
+# 瀏覽器端效能分析設定（browser_profiler.py）
+PROFILING_CONFIG = {
+    # 每次 page.goto 與時段送出後取樣 CDP Performance.getMetrics 與 navigation timing
+    "metrics_enabled": os.getenv('PROFILE_METRICS', '0') == '1',
+    "max_samples": 500,
+    # Playwright tracing：off / sample（依比例錄製整段）/ on_failure（只保留失敗步驟）
+    "trace_mode": os.getenv('TRACE_MODE', 'off'),
+    "trace_sample_rate": float(os.getenv('TRACE_SAMPLE_RATE', '0.1')),
+    "trace_max_mb": 50,  # 超過此大小的 trace 不保留
+    "report_name": "browser_metrics"
+}
+
+# DOM 快照設定（dom_snapshot.py）
+# 診斷日曆狀態用的壓縮 HTML/MHTML，比全頁 PNG 小很多且可搜尋文字
+DOM_SNAPSHOT_CONFIG = {
+    "enabled": os.getenv('DOM_SNAPSHOT', '1') != '0',
+    "format": os.getenv('DOM_SNAPSHOT_FORMAT', 'html'),  # html（page.content）或 mhtml（CDP）
+    "compression": os.getenv('DOM_SNAPSHOT_COMPRESSION', 'auto'),  # auto / zstd / gzip
+    "level": 9
+}
+
+# 網路錄製/重播設定（network_replay.py）
+# live：正常連網；record：錄製流量到封存檔；replay：從封存檔回應，不連網
+NETWORK_REPLAY_CONFIG = {
+    "mode": os.getenv('NETWORK_MODE', 'live'),
+    "archive": os.getenv('NETWORK_ARCHIVE', 'network_archive.har.json'),
+    "latency": os.getenv('REPLAY_LATENCY', 'recorded'),  # recorded（錄製時的延遲）或 zero
+    "redact_headers": ["cookie", "set-cookie", "authorization"],
+    # 帳號密碼類的表單欄位與網址參數（名稱包含即遮蔽）
+    "redact_fields": ["password", "passwd", "pwd", "account", "username", "userid", "帳號", "密碼"],
+    # 台北通 OAuth 轉址參數（名稱完全相同才遮蔽，不分大小寫；__VIEWSTATE、zipcode 等保留）
+    "redact_params": ["code", "state", "token", "access_token", "id_token", "refresh_token"]
+}
+
+# 效能測試設定（benchmark.py）
+BENCHMARK_CONFIG = {
+    "port": int(os.getenv('BENCHMARK_PORT', '8765')),
+    "results_file": "benchmark_results.json",
+    "regression_threshold": 0.2,  # 比基準慢 20% 以上視為退步
+    "iterations": 20
+}
+
+# 養軌跡設定（離線測試時可設 TRAJECTORY_BUILDING=0 略過外部網站）
+TRAJECTORY_BUILDING_ENABLED = os.getenv('TRAJECTORY_BUILDING', '1') != '0'
 TRAJECTORY_SITES = [
     {
         "url": "https://www.google.com/",
@@ -90,6 +253,106 @@ BROWSER_CONFIG = {
     "user_agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36" if CURRENT_PHASE >= 2 else "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 }
 
+# 日曆重新整理設定（每次送出後回到日曆）
+# 以 DOM 判斷日曆就緒（容器出現且內容穩定），跳轉已回到日曆時不再重新載入
+CALENDAR_REFRESH_CONFIG = {
+    # 只列日曆專用的容器：泛用的 "table" 會把任何穩定的版面表格當成日曆而略過重新載入
+    "container_selectors": ["#calendar", "table.calendar", "#ContentPlaceHolder1_Calendar1"],
+    "stable_ms": 300,  # 內容多久沒變化視為穩定
+    "ready_timeout_ms": 8000,
+    "redirect_timeout_ms": 8000,  # 送出後等待網站跳回日曆的上限（取代固定等 5-6 秒）
+    "poll_ms": 100,
+}
+
+# 虛擬顯示器設定（virtual_display.py）
+# mode：auto 只在有畫面模式（headless=False）啟動 Xvfb；1 一律啟動；0 從不啟動
+DISPLAY_CONFIG = {
+    "mode": os.getenv('VIRTUAL_DISPLAY', 'auto'),
+    "display": os.getenv('XVFB_DISPLAY', ':99'),
+    "screen": "1366x768x24",
+    "command": os.getenv('XVFB_COMMAND', 'Xvfb'),
+    "ready_timeout_seconds": float(os.getenv('XVFB_READY_TIMEOUT', '10')),
+    "poll_interval_seconds": 0.05,
+}
+
+# Playwright driver 設定（Cloud Run 記憶體上限為 2Gi）
+DRIVER_CONFIG = {
+    "memory_warning_mb": 1536,
+    # 瀏覽器模式：
+    #   persistent：每次執行各自 launch_persistent_context（一整組 Chromium process）
+    #   shared：同一個 process 只啟動一個 Chromium，每個帳號各一個隔離的 new_context
+    #   cdp：連線到 browser_server.py 啟動的 Chromium（多個 worker process 共用）
+    "browser_mode": os.getenv('BROWSER_MODE', 'persistent'),
+    "cdp_url": os.getenv('BROWSER_CDP_URL', 'http://127.0.0.1:9222'),
+    "cdp_port": int(os.getenv('BROWSER_CDP_PORT', '9222')),
+}
+
+# 自適應並行設定（concurrency.py）
+# 依容器記憶體、PSI 壓力、CPU 與頁面延遲增減同時執行的頁面數（每個工作單元一個頁面）
+CONCURRENCY_CONFIG = {
+    "min_pages": 1,
+    "max_pages": int(os.getenv('MAX_CONCURRENT_PAGES', '3')),
+    "max_slot_attempts": int(os.getenv('MAX_SLOT_ATTEMPTS', '20')),  # 每個頁面最多申請的時段數，避免無限迴圈
+    "page_memory_mb": 350,  # 每個 Chromium 頁面的最低記憶體估計（實測較高時以實測為準）
+    "memory_safety_ratio": 0.8,  # 只使用 cgroup 上限的這個比例，保留給送出申請時的尖峰
+    "fallback_memory_mb": 2048,  # 讀不到 cgroup 上限時使用（Cloud Run 部署設定為 2Gi）
+    "pressure_high": 10.0,  # PSI memory some avg10（%）
+    "cpu_high": 0.9,  # 相對於 CPU 配額
+    "cpu_low": 0.7,  # 低於此值才增加頁面
+    "latency_high_seconds": 20,  # 頁面導航 p90
+    "latency_window": 20,
+    "interval_seconds": 5,
+    "cooldown_seconds": 15,  # 調整後至少等這麼久才再調整（超過記憶體上限時例外）
+}
+
+# 申請梯次（PRD：每月 1-3 日、21-22 日，最後一天 17:00 截止）
+APPLICATION_WINDOWS = [(1, 3), (21, 22)]
+APPLICATION_CLOSE_TIME = "17:00"
+
+# 國定假日（平日放假的日期，依行政院人事行政總處公告，每年更新）
+# 週末本來就會申請，這裡只需要列出落在週一到週五的假日
+TAIWAN_HOLIDAYS = {
+    "2025-01-01": "元旦",
+    "2025-01-27": "春節", "2025-01-28": "除夕", "2025-01-29": "春節", "2025-01-30": "春節", "2025-01-31": "春節",
+    "2025-02-28": "和平紀念日",
+    "2025-04-03": "兒童節", "2025-04-04": "清明節",
+    "2025-05-01": "勞動節",
+    "2025-05-30": "端午節",
+    "2025-09-29": "教師節",
+    "2025-10-06": "中秋節",
+    "2025-10-10": "國慶日",
+    "2025-10-24": "臺灣光復節",
+    "2025-12-25": "行憲紀念日",
+    "2026-01-01": "元旦",
+    "2026-02-16": "除夕", "2026-02-17": "春節", "2026-02-18": "春節", "2026-02-19": "春節", "2026-02-20": "春節",
+    "2026-02-27": "和平紀念日",
+    "2026-04-03": "兒童節", "2026-04-06": "清明節",
+    "2026-05-01": "勞動節",
+    "2026-06-19": "端午節",
+    "2026-09-25": "中秋節",
+    "2026-09-28": "教師節",
+    "2026-10-09": "國慶日",
+    "2026-10-26": "臺灣光復節",
+    "2026-12-25": "行憲紀念日",
+}
+# 補行上班的週六
+MAKEUP_WORKDAYS = ["2025-02-08"]
+
+# 時段申請規劃設定（slot_planner.py）
+SLOT_PLAN_CONFIG = {
+    "enabled": os.getenv('SLOT_PLANNER', '1') != '0',
+    "weekdays": [int(d) for d in os.getenv('SLOT_WEEKDAYS', '5,6').split(',') if d],  # 0=週一 ... 6=週日
+    "include_holidays": True,
+    "exclude_makeup_workdays": True,
+    "include_unparsed": True,  # 解析不到日期的按鈕仍申請（排在最後）
+    # 偏好權重：沒有列出的時段不申請
+    "period_weights": {"下午": 3, "晚上": 2, "早上": 1},
+    "venue_weights": {},  # 例如 {"大安森林公園_2號門": 1}
+    "holiday_bonus": 0.5,
+    "date_decay_per_day": 0.01,  # 同分時較早的日期優先
+    "seconds_per_submission": 20,  # 每次送出的初始估計（之後以實測修正）
+}
+
 # 增強 headless 反檢測參數
 HEADLESS_STEALTH_ARGS = [
     "--disable-blink-features=AutomationControlled",
@@ -113,6 +376,32 @@ GCS_CONFIG = {
     "location": "asia-east1",
 }
 
+# 物件儲存設定（object_storage.py）：截圖、manifest 與分片搶位檔共用
+STORAGE_CONFIG = {
+    # gcs / local / memory（memory 為記憶體內替身，測試用）
+    "backend": os.getenv('STORAGE_BACKEND', 'gcs' if CURRENT_PHASE == 4 else 'local'),
+    "local_root": os.getenv('STORAGE_LOCAL_ROOT', 'storage'),
+    # 截圖產生後立即在背景上傳（預設 Phase 4）
+    "realtime_upload": os.getenv('REALTIME_UPLOAD', '1' if CURRENT_PHASE == 4 else '0') == '1',
+    "concurrency": int(os.getenv('UPLOAD_CONCURRENCY', '4')),
+    "chunk_size_mb": 1,  # 分段續傳區塊大小（GCS 需為 256 KB 的倍數）
+    "resumable_threshold_mb": 1,  # 超過此大小（例如全頁截圖）改用分段續傳
+    "max_retries": 3,
+    "retry_base_seconds": 0.5,
+}
+
+# 常駐服務模式設定（service.py）
+# 保留已載入的 driver 與已登入的瀏覽器，收到請求後幾秒內即可送出申請
+SERVICE_CONFIG = {
+    "host": os.getenv('SERVICE_HOST', '127.0.0.1'),
+    "port": int(os.getenv('PORT', '8080')),  # Cloud Run 以 PORT 指定
+    "token": os.getenv('SERVICE_TOKEN', ''),  # 有設定時 /apply 與 /jobs 需帶 Bearer token
+    "workers": 1,  # 同時執行的工作數（每個工作一個瀏覽器）
+    "session_ttl_seconds": 1800,  # 已登入瀏覽器閒置超過此時間就關閉
+    "prewarm": os.getenv('SERVICE_PREWARM', '0') == '1',  # 啟動時先登入第一個帳號
+    "max_jobs_kept": 100,  # /jobs 保留的工作紀錄數
+}
+
 # Phase 相關設定
 PHASE_CONFIG = {
     1: {
@@ -0,0 +1,156 @@
+"""
+台北街頭藝人申請系統 - 結果摘要圖模組
+
+結果通知原本要逐一下載本次執行的所有截圖（screenshots/<執行編號>/*.png）。
+上傳前把關鍵畫面（登入結果、每個 success_slot_N、最後的日曆）拼成一張壓縮的摘要圖，
+另外輸出小縮圖，一起登記到 manifest：通知只需要讀一個小物件。
+
+拼圖以 numpy 陣列一次放入整塊畫面（裁切、置中、底色都是陣列運算），
+縮放與 JPEG 編碼交給 Pillow。兩者都是選用套件，未安裝時略過這個階段。
+"""
+
+import logging
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import List, Optional
+
+try:
+    import numpy as np
+    from PIL import Image, ImageDraw
+except ImportError:  # 選用套件，未安裝時不產生摘要圖
+    np = None
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+CONTACT_SHEET_NAME = "contact_sheet.jpg"
+THUMBNAIL_PREFIX = "thumb_"
+
+_LABEL_HEIGHT = 20
+_BACKGROUND = 255
+
+
+def select_key_frames(records: List[dict], patterns: List[str], max_frames: int) -> List[dict]:
+    """依產生順序挑出符合關鍵畫面名稱的截圖（同一個畫面只取最後一張）"""
+    frames = {}
+    for record in records:
+        if record["kind"] != "screenshot" or not record["local"]:
+            continue
+        stem = Path(record["name"]).stem
+        # 分片模式的檔名前面有 "<unit_id>_"
+        if any(fnmatch(stem, pattern) or fnmatch(stem, f"*_{pattern}") for pattern in patterns):
+            frames.pop(stem, None)
+            frames[stem] = record
+    selected = list(frames.values())
+    if len(selected) > max_frames:
+        # 保留第一張（登入結果）與最後幾張（最新的申請結果與日曆）
+        selected = selected[:1] + selected[-(max_frames - 1):]
+    return selected
+
+
+def _tile(path: str, width: int, height: int):
+    """
+    讀入截圖並縮成固定大小的格子
+
+    全頁截圖很長，先依格子比例裁切上半部再縮放，避免整張被壓成細條
+    """
+    with Image.open(path) as image:
+        image = image.convert("RGB")
+        crop_height = min(image.height, round(image.width * height / width))
+        image = image.crop((0, 0, image.width, crop_height))
+        image.thumbnail((width, height), Image.BILINEAR)
+        pixels = np.asarray(image)
+    tile = np.full((height, width, 3), _BACKGROUND, dtype=np.uint8)
+    top = (height - pixels.shape[0]) // 2
+    left = (width - pixels.shape[1]) // 2
+    tile[top:top + pixels.shape[0], left:left + pixels.shape[1]] = pixels
+    return tile
+
+
+def build_contact_sheet(frames: List[dict], output: Path, columns: int, tile_width: int,
+                        quality: int) -> Optional[Path]:
+    """
+    把關鍵畫面拼成一張 JPEG
+
+    Returns:
+        摘要圖路徑，沒有畫面時為 None
+    """
+    if not frames:
+        return None
+    tile_height = round(tile_width * 10 / 16)
+    columns = max(1, min(columns, len(frames)))
+    rows = -(-len(frames) // columns)
+    cell_height = tile_height + _LABEL_HEIGHT
+
+    sheet = np.full((rows * cell_height, columns * tile_width, 3), _BACKGROUND, dtype=np.uint8)
+    for index, frame in enumerate(frames):
+        row, column = divmod(index, columns)
+        top, left = row * cell_height + _LABEL_HEIGHT, column * tile_width
+        sheet[top:top + tile_height, left:left + tile_width] = _tile(frame["path"], tile_width, tile_height)
+        # 格線：每格右、下各一條 1px 灰線
+        sheet[top:top + tile_height, left + tile_width - 1] = 200
+        sheet[top + tile_height - 1, left:left + tile_width] = 200
+
+    image = Image.fromarray(sheet)
+    draw = ImageDraw.Draw(image)
+    for index, frame in enumerate(frames):
+        row, column = divmod(index, columns)
+        draw.text((column * tile_width + 4, row * cell_height + 4), Path(frame["name"]).stem, fill=(0, 0, 0))
+    image.save(output, "JPEG", quality=quality, optimize=True)
+    return output
+
+
+def build_thumbnails(frames: List[dict], directory: Path, width: int, quality: int) -> List[Path]:
+    """每個關鍵畫面一張小縮圖（JPEG）"""
+    paths = []
+    for frame in frames:
+        path = directory / f"{THUMBNAIL_PREFIX}{Path(frame['name']).stem}.jpg"
+        with Image.open(frame["path"]) as image:
+            image = image.convert("RGB")
+            image.thumbnail((width, width * 4), Image.BILINEAR)
+            image.save(path, "JPEG", quality=quality, optimize=True)
+        paths.append(path)
+    return paths
+
+
+def create_run_summary(registry, directory, summary_config: dict) -> dict:
+    """
+    產生本次執行的摘要圖與縮圖，並登記到產出檔案登記表（之後與截圖、manifest 一起上傳）
+
+    Returns:
+        {"contact_sheet": 路徑或 None, "thumbnails": [路徑...], "frames": 畫面數}
+    """
+    result = {"contact_sheet": None, "thumbnails": [], "frames": 0}
+    if not summary_config["enabled"]:
+        return result
+    if Image is None:
+        logger.debug("未安裝 Pillow / numpy，略過結果摘要圖")
+        return result
+
+    frames = select_key_frames(registry.records(["screenshot"]), summary_config["key_frames"],
+                               summary_config["max_frames"])
+    result["frames"] = len(frames)
+    if not frames:
+        logger.info("🖼️  沒有關鍵畫面，略過結果摘要圖")
+        return result
+
+    directory = Path(directory)
+    try:
+        sheet = build_contact_sheet(frames, directory / CONTACT_SHEET_NAME, summary_config["columns"],
+                                    summary_config["tile_width"], summary_config["quality"])
+        registry.add(sheet, "contact_sheet")
+        result["contact_sheet"] = str(sheet)
+        for path in build_thumbnails(frames, directory, summary_config["thumbnail_width"],
+                                     summary_config["quality"]):
+            registry.add(path, "thumbnail")
+            result["thumbnails"].append(str(path))
+    except Exception as e:
+        # 摘要圖只是方便通知，失敗不影響截圖本身的上傳
+        logger.warning(f"⚠️  產生結果摘要圖失敗: {e}")
+        return result
+
+    original = sum(frame["size"] for frame in frames)
+    size = Path(result["contact_sheet"]).stat().st_size
+    logger.info(f"🖼️  結果摘要圖: {len(frames)} 個關鍵畫面 → {size / 1024:.0f} KB "
+                f"(原始截圖 {original / 1024:.0f} KB)，縮圖 {len(result['thumbnails'])} 張")
+    return result
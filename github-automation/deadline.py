@@ -0,0 +1,217 @@
+"""
+台北街頭藝人申請系統 - 執行期限與卡住偵測模組
+
+以 EXECUTION_TIMEOUT_MINUTES 作為整體期限，並負責：
+- 從剩餘時間推算每個步驟的預算（保留截圖上傳與結果回報的時間）
+- 監看頁面進度事件，卡住時取消步驟並留下診斷資料
+- 在期限內執行同步的收尾工作（截圖上傳等）
+"""
+
+import asyncio
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StepTimeout(Exception):
+    """步驟超過預算或頁面卡住"""
+
+    def __init__(self, step: str, reason: str, seconds: float):
+        # 訊息包含 timeout，讓 checkpoint.classify_failure 判斷為網路暫時性問題
+        super().__init__(f"步驟 {step} timeout ({reason}, {seconds:.1f} 秒)")
+        self.step = step
+        self.reason = reason
+
+
+class RunDeadline:
+    """整體執行期限"""
+
+    def __init__(self, total_seconds: float, reserve_seconds: float, step_weights: dict,
+                 now: Callable[[], float] = time.monotonic):
+        self.now = now
+        self.started_at = now()
+        self.total_seconds = total_seconds
+        self.reserve_seconds = reserve_seconds
+        self.step_weights = step_weights
+
+    def fork(self, now: Callable[[], float]) -> "RunDeadline":
+        """同一個期限，改用工作單元自己的時鐘（clock.fork()）計算經過時間"""
+        deadline = RunDeadline(self.total_seconds, self.reserve_seconds, self.step_weights, now=now)
+        deadline.started_at = self.started_at
+        return deadline
+
+    def remaining(self) -> float:
+        """距離整體期限的秒數（含收尾保留時間）"""
+        return max(0.0, self.total_seconds - (self.now() - self.started_at))
+
+    def work_remaining(self) -> float:
+        """扣除收尾保留時間後，流程步驟還能使用的秒數"""
+        return max(0.0, self.remaining() - self.reserve_seconds)
+
+    def budget_for(self, step: str) -> float:
+        """
+        步驟預算：依權重分配剩餘的流程時間
+
+        以「此步驟與之後步驟的權重總和」為分母，前面步驟省下的時間會自動留給後面
+        """
+        steps = list(self.step_weights)
+        following = steps[steps.index(step):] if step in steps else [step]
+        total_weight = sum(self.step_weights.get(s, 0) for s in following) or 1
+        return self.work_remaining() * self.step_weights.get(step, 0) / total_weight
+
+    def expired(self) -> bool:
+        return self.work_remaining() <= 0
+
+
+class PageWatchdog:
+    """頁面卡住偵測：一段時間沒有任何進度事件就視為卡住"""
+
+    PROGRESS_EVENTS = ["request", "response", "requestfinished", "framenavigated",
+                       "domcontentloaded", "load"]
+
+    def __init__(self, stall_seconds: float, interval_seconds: float = 1.0, cancel_grace_seconds: float = 5.0,
+                 now: Callable[[], float] = time.monotonic):
+        self.stall_seconds = stall_seconds
+        self.interval_seconds = interval_seconds
+        self.cancel_grace_seconds = cancel_grace_seconds
+        self.now = now
+        self.last_progress = now()
+        self.quiet_until = 0.0
+        self._attached = set()
+
+    def attach(self, page):
+        """監聽頁面事件（同一頁面只監聽一次）"""
+        if page is None or id(page) in self._attached:
+            return
+        for event in self.PROGRESS_EVENTS:
+            page.on(event, lambda *_: self.touch())
+        self._attached.add(id(page))
+
+    def touch(self):
+        self.last_progress = self.now()
+
+    def expect_quiet(self, ms: float):
+        """刻意等待（人類行為延遲、停留時間）期間不算卡住"""
+        self.touch()
+        self.quiet_until = max(self.quiet_until, self.now() + ms / 1000)
+
+    def stalled_for(self) -> float:
+        reference = max(self.last_progress, self.quiet_until)
+        return max(0.0, self.now() - reference)
+
+    async def run_step(self, step: str, coro, budget: float, page_getter: Callable = None,
+                       on_timeout: Callable = None):
+        """
+        在預算內執行步驟，超時或卡住時取消
+
+        Args:
+            step: 步驟名稱
+            coro: 步驟的 coroutine
+            budget: 預算秒數
+            page_getter: 取得目前頁面的函數（步驟中可能換頁或重建瀏覽器）
+            on_timeout: 取消後收集診斷資料的 async 函數
+        """
+        self.touch()
+        task = asyncio.ensure_future(coro)
+        started = self.now()
+        reason = None
+
+        while not task.done():
+            await asyncio.wait({task}, timeout=self.interval_seconds)
+            if task.done():
+                break
+            if page_getter:
+                self.attach(page_getter())
+            if self.now() - started >= budget:
+                reason = "超過步驟預算"
+            elif self.stalled_for() >= self.stall_seconds:
+                reason = f"頁面 {self.stall_seconds:.0f} 秒無進度"
+            if reason:
+                task.cancel()
+                # 等待有上限：步驟若吞掉 CancelledError 仍會繼續執行，不能讓看門狗跟著卡住
+                await asyncio.wait({task}, timeout=self.cancel_grace_seconds)
+                if task.done():
+                    if not task.cancelled():
+                        task.exception()  # 取回例外，避免 "exception was never retrieved"
+                else:
+                    logger.warning(f"⚠️  步驟 {step} 取消後 {self.cancel_grace_seconds:.0f} 秒仍未結束，不再等待")
+                break
+
+        if reason is None:
+            return task.result()
+
+        elapsed = self.now() - started
+        logger.error(f"⏰ 步驟 {step} 被取消: {reason} (已執行 {elapsed:.1f} 秒)")
+        if on_timeout:
+            await on_timeout(step, reason)
+        raise StepTimeout(step, reason, elapsed)
+
+
+async def capture_diagnostics(page, screenshot_dir: Path, name: str, timeout_seconds: float, snapshotter=None):
+    """
+    卡住時留下截圖、網址與 HTML（本身也有時間上限，避免診斷又卡住）
+
+    有 snapshotter（dom_snapshot.DomSnapshotter）時 HTML 以壓縮快照保存
+
+    Returns:
+        已寫出的檔案路徑列表
+    """
+    written = []
+    if page is None or page.is_closed():
+        return written
+
+    async def _capture():
+        screenshot_dir.mkdir(exist_ok=True)
+        await page.screenshot(path=str(screenshot_dir / f"{name}.png"))
+        written.append(screenshot_dir / f"{name}.png")
+        if snapshotter:
+            info = snapshotter.save(name, await snapshotter.capture_raw(page))
+            if info["path"]:
+                written.append(Path(info["path"]))
+            return
+        html = await page.content()
+        (screenshot_dir / f"{name}.html").write_text(
+            f"<!-- url: {page.url} -->\n{html}", encoding="utf-8"
+        )
+        written.append(screenshot_dir / f"{name}.html")
+
+    try:
+        await asyncio.wait_for(_capture(), timeout=timeout_seconds)
+        logger.info(f"🩺 已保存診斷資料: {name} ({page.url})")
+    except Exception as e:
+        logger.warning(f"⚠️  診斷資料保存失敗: {e}")
+    return written
+
+
+async def run_blocking(func, timeout: float, *args, **kwargs):
+    """
+    在背景執行同步函數並限制等待時間
+
+    使用 daemon thread：逾時後不會拖住程式結束（ThreadPoolExecutor 會在結束時等待）
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def _worker():
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            loop.call_soon_threadsafe(_set_result, future, None, e)
+        else:
+            loop.call_soon_threadsafe(_set_result, future, result, None)
+
+    threading.Thread(target=_worker, daemon=True).start()
+    return await asyncio.wait_for(future, timeout=max(timeout, 0.001))
+
+
+def _set_result(future, result, error: Optional[BaseException]):
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
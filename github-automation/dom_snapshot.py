@@ -0,0 +1,120 @@
+"""
+台北街頭藝人申請系統 - DOM 快照模組
+
+全頁 PNG 體積大、又只能用眼睛看；診斷日曆狀態時改存壓縮過的 DOM 快照：
+- html：page.content() 序列化的 HTML
+- mhtml：透過 CDP Page.captureSnapshot 取得（含樣式與圖片）
+- 有安裝 zstandard 時使用 zstd 壓縮，否則使用 gzip
+- 內容沒變（hash 相同）時不重複存檔
+- 回報相對於 PNG 截圖節省的大小
+"""
+
+import gzip
+import hashlib
+import logging
+from pathlib import Path
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:  # 選用套件，未安裝時改用 gzip
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+
+def compress(data: bytes, compression: str, level: int):
+    """
+    壓縮資料
+
+    Returns:
+        (壓縮後資料, 副檔名)
+    """
+    if compression == "auto":
+        compression = "zstd" if zstandard else "gzip"
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("未安裝 zstandard，無法使用 zstd 壓縮")
+        return zstandard.ZstdCompressor(level=level).compress(data), "zst"
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=min(level, 9)), "gz"
+    raise ValueError(f"未知的壓縮方式: {compression}")
+
+
+class DomSnapshotter:
+    """DOM 快照（含重複內容偵測與 PNG 大小比較）"""
+
+    def __init__(self, output_dir: Path, snapshot_format: str = "html",
+                 compression: str = "auto", level: int = 9):
+        self.output_dir = Path(output_dir)
+        self.snapshot_format = snapshot_format
+        self.compression = compression
+        self.level = level
+        self.seen_hashes = {}
+        self.png_sizes = []
+        self.stats = {"snapshots": 0, "duplicates": 0, "raw_bytes": 0,
+                      "compressed_bytes": 0, "png_equivalent_bytes": 0}
+
+    def note_png_size(self, size: int):
+        """記錄 PNG 截圖大小，作為比較基準"""
+        self.png_sizes.append(size)
+
+    def png_reference_size(self) -> Optional[int]:
+        if not self.png_sizes:
+            return None
+        return int(sum(self.png_sizes) / len(self.png_sizes))
+
+    async def capture_raw(self, page) -> bytes:
+        """取得頁面內容（mhtml 僅 Chromium 支援）"""
+        if self.snapshot_format == "mhtml":
+            cdp = await page.context.new_cdp_session(page)
+            try:
+                result = await cdp.send("Page.captureSnapshot", {"format": "mhtml"})
+            finally:
+                await cdp.detach()
+            return result["data"].encode("utf-8")
+        html = await page.content()
+        return f"<!-- url: {page.url} -->\n{html}".encode("utf-8")
+
+    def save(self, name: str, raw: bytes) -> dict:
+        """
+        壓縮並存檔（內容與先前快照相同時不存檔）
+
+        Returns:
+            快照資訊（path、hash、大小、是否重複）
+        """
+        digest = hashlib.sha256(raw).hexdigest()
+        info = {"name": name, "sha256": digest, "raw_bytes": len(raw), "path": None,
+                "compressed_bytes": 0, "duplicate_of": self.seen_hashes.get(digest)}
+
+        if info["duplicate_of"]:
+            self.stats["duplicates"] += 1
+            logger.debug(f"🧬 DOM 快照 {name} 與 {info['duplicate_of']} 相同，略過存檔")
+            return info
+
+        data, extension = compress(raw, self.compression, self.level)
+        self.output_dir.mkdir(exist_ok=True)
+        path = self.output_dir / f"{name}.{self.snapshot_format}.{extension}"
+        path.write_bytes(data)
+        self.seen_hashes[digest] = name
+
+        info.update(path=str(path), compressed_bytes=len(data))
+        self.stats["snapshots"] += 1
+        self.stats["raw_bytes"] += len(raw)
+        self.stats["compressed_bytes"] += len(data)
+        reference = self.png_reference_size()
+        if reference:
+            self.stats["png_equivalent_bytes"] += reference
+            saved = 1 - len(data) / reference
+            logger.info(f"🧬 DOM 快照 {path.name}: {len(data) / 1024:.1f} KB "
+                        f"(PNG 約 {reference / 1024:.1f} KB，節省 {saved:.0%})")
+        else:
+            logger.info(f"🧬 DOM 快照 {path.name}: {len(data) / 1024:.1f} KB "
+                        f"(原始 {len(raw) / 1024:.1f} KB)")
+        return info
+
+    def summary(self) -> dict:
+        stats = dict(self.stats)
+        if stats["png_equivalent_bytes"]:
+            stats["bytes_saved_vs_png"] = stats["png_equivalent_bytes"] - stats["compressed_bytes"]
+        return stats
@@ -0,0 +1,222 @@
+"""
+台北街頭藝人申請系統 - Playwright Driver 生命週期管理
+
+每個 process 只啟動一個 Playwright driver（Node process），
+所有重試與瀏覽器 context 共用（shared / cdp 模式下連 Chromium 也只有一個），並負責：
+- 追蹤 driver 與 Chromium 子 process 的 PID
+- 回報各 process 的記憶體用量（RSS）
+- 在任何結束路徑（正常結束、例外、取消、atexit）都確實關閉
+"""
+
+import os
+import atexit
+import asyncio
+import signal
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config import DRIVER_CONFIG
+
+logger = logging.getLogger(__name__)
+
+_PROC = Path("/proc")
+
+
+def _read_proc_table() -> Dict[int, dict]:
+    """讀取 /proc 取得所有 process 的父子關係與指令（非 Linux 環境回傳空表）"""
+    table = {}
+    if not _PROC.exists():
+        return table
+    for entry in _PROC.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+            # comm 可能含空白，以最後一個 ')' 切開
+            ppid = int(stat.rsplit(")", 1)[1].split()[1])
+            cmdline = (entry / "cmdline").read_bytes().replace(b"\0", b" ").decode(errors="ignore")
+            table[int(entry.name)] = {"ppid": ppid, "cmdline": cmdline}
+        except (OSError, IndexError, ValueError):
+            continue
+    return table
+
+
+def _descendants(pid: int, table: Dict[int, dict]) -> List[int]:
+    children = {}
+    for child, info in table.items():
+        children.setdefault(info["ppid"], []).append(child)
+    result, stack = [], list(children.get(pid, []))
+    while stack:
+        current = stack.pop()
+        result.append(current)
+        stack.extend(children.get(current, []))
+    return result
+
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    """讀取 process 的常駐記憶體（MB）"""
+    try:
+        for line in (_PROC / str(pid) / "status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class PlaywrightDriverManager:
+    """Playwright driver 管理器（每個 process 一個）"""
+
+    def __init__(self):
+        self.playwright = None
+        self.driver_pid: Optional[int] = None
+        self.browser = None  # shared / cdp 模式共用的瀏覽器
+        self.browser_pids = set()
+        self.contexts = []
+        self._lock = asyncio.Lock()
+        self._browser_lock = asyncio.Lock()
+
+    async def get_playwright(self):
+        """取得共用的 Playwright 實例（第一次呼叫時才啟動 driver）"""
+        async with self._lock:
+            if self.playwright is None:
+                from playwright.async_api import async_playwright
+                before = set(_descendants(os.getpid(), _read_proc_table()))
+                self.playwright = await async_playwright().start()
+                after = _read_proc_table()
+                new_children = [p for p in _descendants(os.getpid(), after) if p not in before]
+                self.driver_pid = next(
+                    (p for p in new_children if after[p]["ppid"] == os.getpid()), None
+                )
+                logger.info(f"🎭 Playwright driver 已啟動 (PID: {self.driver_pid or '未知'})")
+            return self.playwright
+
+    async def get_shared_browser(self, mode: str, args: List[str] = None, headless: bool = True):
+        """
+        取得共用的瀏覽器（第一次呼叫時才啟動或連線）
+
+        Args:
+            mode: shared（本 process 啟動一個 Chromium）或 cdp（連線到 browser_server.py）
+        """
+        async with self._browser_lock:
+            if self.browser is None or not self.browser.is_connected():
+                playwright = await self.get_playwright()
+                if mode == "cdp":
+                    self.browser = await playwright.chromium.connect_over_cdp(DRIVER_CONFIG["cdp_url"])
+                    logger.info(f"🔌 已連線到共用瀏覽器 {DRIVER_CONFIG['cdp_url']}")
+                elif mode == "shared":
+                    self.browser = await playwright.chromium.launch(headless=headless, args=args or [])
+                    self.refresh_browser_pids()
+                    logger.info(f"🌐 共用瀏覽器已啟動 (Chromium {len(self.browser_pids)} 個 process)")
+                else:
+                    raise ValueError(f"未知的共用瀏覽器模式: {mode}（可選: shared, cdp）")
+            return self.browser
+
+    def register_context(self, context):
+        """登記瀏覽器 context，並記錄新產生的 Chromium PID"""
+        self.contexts.append(context)
+        self.refresh_browser_pids()
+
+    def refresh_browser_pids(self):
+        if not self.driver_pid:
+            return
+        table = _read_proc_table()
+        self.browser_pids = {
+            pid for pid in _descendants(self.driver_pid, table)
+            if "chrom" in table[pid]["cmdline"].lower()
+        }
+
+    async def close_context(self, context):
+        """關閉瀏覽器 context（重試時使用，driver 繼續保留）"""
+        if context in self.contexts:
+            self.contexts.remove(context)
+        try:
+            await context.close()
+        except Exception as e:
+            logger.warning(f"⚠️  關閉瀏覽器 context 時發生錯誤: {e}")
+        self.refresh_browser_pids()
+
+    async def shutdown(self):
+        """關閉所有 context 並停止 driver，被取消時仍會強制結束子 process"""
+        try:
+            for context in list(self.contexts):
+                await self.close_context(context)
+            if self.browser is not None:
+                # cdp 模式只中斷連線，瀏覽器由 browser_server.py 管理
+                await self.browser.close()
+                self.browser = None
+            if self.playwright is not None:
+                await self.playwright.stop()
+                logger.info("🛑 Playwright driver 已停止")
+        except (asyncio.CancelledError, Exception) as e:
+            logger.warning(f"⚠️  driver 正常關閉失敗，改為強制結束: {e!r}")
+            self.kill_leftovers()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        finally:
+            self.playwright = None
+            self.browser = None
+            self.kill_leftovers()
+
+    def kill_leftovers(self):
+        """強制結束仍存活的 driver 與 Chromium process（同步，可在 atexit 使用）"""
+        table = _read_proc_table()
+        leftovers = set(self.browser_pids)
+        if self.driver_pid:
+            leftovers.update(_descendants(self.driver_pid, table))
+            leftovers.add(self.driver_pid)
+        for pid in leftovers:
+            if pid in table:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                    logger.debug(f"   強制結束 PID {pid}")
+                except OSError:
+                    pass
+        self.browser_pids.clear()
+        self.driver_pid = None
+
+    def memory_report(self) -> dict:
+        """各 process 的記憶體用量"""
+        self.refresh_browser_pids()
+        driver_rss = read_rss_mb(self.driver_pid) if self.driver_pid else None
+        browsers = [
+            {"pid": pid, "rss_mb": round(rss, 1)}
+            for pid in sorted(self.browser_pids)
+            if (rss := read_rss_mb(pid)) is not None
+        ]
+        python_rss = read_rss_mb(os.getpid())
+        total = sum(b["rss_mb"] for b in browsers) + (driver_rss or 0) + (python_rss or 0)
+        return {
+            "python": {"pid": os.getpid(), "rss_mb": round(python_rss or 0, 1)},
+            "driver": {"pid": self.driver_pid, "rss_mb": round(driver_rss or 0, 1)},
+            "browsers": browsers,
+            "total_rss_mb": round(total, 1),
+        }
+
+    def log_memory(self, label: str = ""):
+        report = self.memory_report()
+        logger.info(f"🧠 記憶體用量{label}: 共 {report['total_rss_mb']} MB "
+                    f"(Python {report['python']['rss_mb']} MB, driver {report['driver']['rss_mb']} MB, "
+                    f"Chromium {len(report['browsers'])} 個 process)")
+        if report["total_rss_mb"] > DRIVER_CONFIG["memory_warning_mb"]:
+            logger.warning(f"⚠️  記憶體用量接近容器上限 ({DRIVER_CONFIG['memory_warning_mb']} MB)")
+        return report
+
+
+_manager: Optional[PlaywrightDriverManager] = None
+
+
+def get_driver_manager() -> PlaywrightDriverManager:
+    """取得本 process 的 driver 管理器"""
+    global _manager
+    if _manager is None:
+        _manager = PlaywrightDriverManager()
+        atexit.register(_manager.kill_leftovers)
+    return _manager
+
+
+async def shutdown_driver():
+    """關閉本 process 的 driver（主程式結束時呼叫）"""
+    if _manager is not None:
+        await _manager.shutdown()
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+台北街頭藝人申請系統 - 本機假網站
+
+模擬 tpbusker.gov.taipei 的申請流程，讓效能測試不需要連網：
+- signin.aspx →「確定登入」→「點我登入」→ 台北通帳密頁 → 登入
+- apply.aspx / applys3.aspx 場地日曆（每格有早上/下午/晚上三個時段）
+- 申請表單（本次展演項目）→ 成功彈跳視窗 → 確定回到日曆
+- 可設定開放時間（模擬 17:00 開放搶位），開放前日曆不顯示「個人登記」
+- 可排定故障（慢速回應、500、session 失效、沒有成功彈跳視窗、維護頁面），量測重試恢復時間
+
+使用方式：
+    python fake_site.py --port 8765 --days 14
+    python fake_site.py --fault error500:after=1,requests=2 --fault maintenance:after=3,seconds=30
+    TPBUSKER_BASE_URL=http://127.0.0.1:8765 PHASE=2 python main.py
+"""
+
+import json
+import time
+import html
+import secrets
+import argparse
+import threading
+from datetime import date, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, urlencode
+
+PERIODS = ["早上", "下午", "晚上"]
+WEEKDAY_NAMES = "一二三四五六日"
+SUCCESS_MESSAGE = "個人登記(需管理者審核通過)完成!"
+SESSION_COOKIE = "ASP.NET_SessionId"
+
+_LOGIN_PAGES = ("/apply.aspx", "/applys3.aspx", "/applyform.aspx")
+
+# 故障類型：預設影響的路徑（None 表示全部）與 HTTP 方法
+FAULT_TYPES = {
+    "slow": {"paths": None, "methods": ("GET", "POST"), "description": "慢速回應（每個請求延遲 delay_ms）"},
+    "error500": {"paths": _LOGIN_PAGES, "methods": ("GET", "POST"), "description": "HTTP 500"},
+    "session_drop": {"paths": _LOGIN_PAGES, "methods": ("GET", "POST"), "description": "登入 session 失效，導回 signin.aspx"},
+    "no_popup": {"paths": ("/applyform.aspx",), "methods": ("POST",), "description": "送出成功但沒有成功彈跳視窗"},
+    "maintenance": {"paths": None, "methods": ("GET", "POST"), "description": "系統維護頁面（503）"},
+}
+
+
+def parse_fault(spec: str) -> dict:
+    """
+    解析故障設定："類型[:after=N,requests=N,seconds=S,delay_ms=M]"
+
+    - after: 成功申請幾個時段後開始（預設 1）
+    - requests: 影響幾個符合的請求（預設 1；slow 預設 3）
+    - seconds: 改為持續幾秒（設定時不看 requests）
+    - delay_ms: slow 每個請求的延遲（預設 8000）
+    """
+    kind, _, options = spec.partition(":")
+    if kind not in FAULT_TYPES:
+        raise ValueError(f"未知的故障類型: {kind}（可選: {', '.join(FAULT_TYPES)}）")
+    fault = {"type": kind, "after": 1, "requests": 3 if kind == "slow" else 1, "seconds": None, "delay_ms": 8000}
+    for option in filter(None, options.split(",")):
+        name, _, value = option.partition("=")
+        if name not in ("after", "requests", "seconds", "delay_ms"):
+            raise ValueError(f"未知的故障參數: {name}")
+        fault[name] = float(value) if name == "seconds" else int(value)
+    return fault
+
+
+class FakeSiteState:
+    """假網站狀態（時段、登入 session、申請紀錄）"""
+
+    def __init__(self, start_date: date = None, days: int = 14, latency_ms: int = 0, open_at: float = None,
+                 faults: list = None, now=time.time):
+        self.lock = threading.Lock()
+        self.start_date = start_date or date.today() + timedelta(days=1)
+        self.days = days
+        self.latency_ms = latency_ms
+        # 紀錄時間的來源（恢復時間測試改用虛擬時鐘，讓略過的等待也算進時間軸）
+        self.now = now
+        self.sessions = {}
+        self.reset(open_at, faults)
+
+    def reset(self, open_at: float = None, faults: list = None):
+        """清空時段、申請紀錄並重新排定故障（登入 session 保留）"""
+        with self.lock:
+            self.open_at = open_at  # self.now() 的時間，None 表示一直開放
+            self.slots = {}  # (venue, slot_id) -> 申請者名稱（None 表示可申請）
+            self.applications = []
+            self.attempts = []  # 所有送出（含已額滿），搶位測試用
+            self.request_count = 0
+            self.faults = [{**fault, "activated_at": None, "cleared_at": None, "hits": 0} for fault in faults or []]
+
+    def is_open(self) -> bool:
+        return self.open_at is None or self.now() >= self.open_at
+
+    def take_fault(self, path: str, method: str):
+        """
+        取得這個請求要套用的故障（並計入次數）
+
+        故障在成功申請 after 個時段後啟動，影響 requests 個符合的請求或持續 seconds 秒
+        """
+        with self.lock:
+            for fault in self.faults:
+                if fault["cleared_at"] is not None or len(self.applications) < fault["after"]:
+                    continue
+                spec = FAULT_TYPES[fault["type"]]
+                if method not in spec["methods"] or (spec["paths"] and path not in spec["paths"]):
+                    continue
+                now = self.now()
+                if fault["activated_at"] is None:
+                    fault["activated_at"] = now
+                elif fault["seconds"] is not None and now - fault["activated_at"] >= fault["seconds"]:
+                    fault["cleared_at"] = now
+                    continue
+                fault["hits"] += 1
+                if fault["seconds"] is None and fault["hits"] >= fault["requests"]:
+                    fault["cleared_at"] = now
+                return fault
+        return None
+
+    def drop_sessions(self):
+        """所有登入 session 失效"""
+        with self.lock:
+            self.sessions.clear()
+
+    def venue_slots(self, venue: str) -> dict:
+        """取得場地時段（第一次存取時建立）"""
+        with self.lock:
+            if not any(key[0] == venue for key in self.slots):
+                for offset in range(self.days):
+                    day = self.start_date + timedelta(days=offset)
+                    for period in PERIODS:
+                        self.slots[(venue, f"{day.isoformat()}_{period}")] = None
+            return {sid: owner for (v, sid), owner in self.slots.items() if v == venue}
+
+    def try_apply(self, venue: str, slot_id: str, applicant: str, faulted: bool = False) -> bool:
+        """
+        申請時段（先搶先贏）
+
+        Args:
+            faulted: 這次送出的請求被套用了故障（恢復時間不以它計算）
+        """
+        self.venue_slots(venue)
+        with self.lock:
+            key = (venue, slot_id)
+            success = self.is_open() and key in self.slots and self.slots[key] is None
+            record = {"venue": venue, "slot": slot_id, "applicant": applicant, "time": self.now(),
+                      "faulted": faulted}
+            self.attempts.append({**record, "success": success})
+            if success:
+                self.slots[key] = applicant
+                self.applications.append(record)
+            return success
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "request_count": self.request_count,
+                "open_at": self.open_at,
+                "applications": list(self.applications),
+                "attempts": list(self.attempts),
+                "open_slots": sum(1 for owner in self.slots.values() if owner is None),
+                "faults": [dict(fault) for fault in self.faults],
+            }
+
+
+def _page(title: str, body: str) -> bytes:
+    return f"""<!DOCTYPE html>
+<html lang="zh-Hant"><head><meta charset="utf-8"><title>{title}</title>
+<style>td {{ vertical-align: top; border: 1px solid #ccc; padding: 4px; }}</style>
+</head><body>{body}</body></html>""".encode("utf-8")
+
+
+class FakeSiteHandler(BaseHTTPRequestHandler):
+    """假網站請求處理"""
+
+    state: FakeSiteState = None
+    fault: dict = None
+
+    def log_message(self, format, *args):
+        pass
+
+    # ---- 共用 ----
+    def _session_user(self):
+        for part in (self.headers.get("Cookie") or "").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == SESSION_COOKIE:
+                return self.state.sessions.get(value)
+        return None
+
+    def _send(self, status: int, body: bytes = b"", headers: dict = None, content_type="text/html; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _redirect(self, location: str, headers: dict = None):
+        self._send(302, b"", {"Location": location, **(headers or {})})
+
+    def _form(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        data = self.rfile.read(length).decode("utf-8") if length else ""
+        return {k: v[0] for k, v in parse_qs(data).items()}
+
+    def _before_request(self, path: str) -> bool:
+        """
+        共用前置處理（計數、延遲、故障）
+
+        Returns:
+            True 表示故障已經直接回應，不再處理這個請求
+        """
+        with self.state.lock:
+            self.state.request_count += 1
+        if self.state.latency_ms:
+            time.sleep(self.state.latency_ms / 1000)
+        if path == "/__state":
+            return False
+
+        self.fault = self.state.take_fault(path, self.command)
+        kind = self.fault["type"] if self.fault else None
+        if kind == "slow":
+            time.sleep(self.fault["delay_ms"] / 1000)
+        elif kind == "session_drop":
+            # 接著由各頁面的登入檢查導回 signin.aspx
+            self.state.drop_sessions()
+        elif kind == "error500":
+            self._send(500, _page("Server Error", "<h1>Server Error in '/' Application.</h1>"))
+            return True
+        elif kind == "maintenance":
+            self._send(503, _page("系統維護", "<h1>系統維護中，請稍後再試</h1>"), {"Retry-After": "30"})
+            return True
+        return False
+
+    # ---- 路由 ----
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        path = url.path.lower()
+        if self._before_request(path):
+            return
+
+        if path in ("/", "/index.aspx"):
+            self._send(200, _page("首頁", "<h1>臺北市街頭藝人</h1><a href='/signin.aspx'>登入</a>"))
+        elif path == "/signin.aspx":
+            self._send(200, self._signin_page())
+        elif path == "/taipeipass/login":
+            self._send(200, self._taipeipass_page())
+        elif path in ("/apply.aspx", "/applys3.aspx"):
+            self._calendar(url.path, query)
+        elif path == "/applyform.aspx":
+            self._apply_form(query)
+        elif path == "/__state":
+            self._send(200, json.dumps(self.state.snapshot(), ensure_ascii=False).encode("utf-8"),
+                       content_type="application/json")
+        else:
+            self._send(404, _page("404", "找不到頁面"))
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        path = url.path.lower()
+        form = self._form()
+        if self._before_request(path):
+            return
+
+        if path == "/signin.aspx":
+            self._send(200, self._signin_choice_page())
+        elif path == "/taipeipass/login":
+            if not form.get("account") or not form.get("password"):
+                self._send(200, self._taipeipass_page("請輸入帳號密碼"))
+                return
+            token = secrets.token_hex(12)
+            self.state.sessions[token] = form["account"]
+            self._redirect("/index.aspx", {"Set-Cookie": f"{SESSION_COOKIE}={token}; Path=/"})
+        elif path == "/applyform.aspx":
+            self._submit_application(query, form)
+        else:
+            self._send(404, _page("404", "找不到頁面"))
+
+    # ---- 頁面 ----
+    def _signin_page(self) -> bytes:
+        return _page("登入", """
+<form method="post" action="/signin.aspx">
+  <p>請使用台北通登入</p>
+  <input type="submit" id="ct100_ContentPlaceHolder1_Button1" class="button9" value="確定登入">
+</form>""")
+
+    def _signin_choice_page(self) -> bytes:
+        return _page("登入方式", """
+<div class="login_type"><h3>台北通</h3><a href="/taipeipass/login">點我登入</a></div>""")
+
+    def _taipeipass_page(self, error: str = "") -> bytes:
+        return _page("台北通登入", f"""
+<form method="post" action="/taipeipass/login" id="loginForm">
+  <p class="error">{html.escape(error)}</p>
+  <input type="text" name="account" placeholder="請輸入帳號">
+  <input type="password" name="password" placeholder="請輸入密碼">
+  <a class="green_btn login_btn" href="javascript:void(0)"
+     onclick="document.getElementById('loginForm').submit()">登入</a>
+</form>""")
+
+    def _calendar(self, path: str, query: dict):
+        if not self._session_user():
+            self._redirect("/signin.aspx")
+            return
+        venue = f"{query.get('pl', '')}-{query.get('loc', '')}"
+        slots = self.state.venue_slots(venue)
+        venue_url = f"{path}?pl={query.get('pl', '')}&loc={query.get('loc', '')}"
+
+        is_open = self.state.is_open()
+        cells = []
+        for offset in range(self.state.days):
+            day = self.state.start_date + timedelta(days=offset)
+            periods = []
+            for period in PERIODS:
+                slot_id = f"{day.isoformat()}_{period}"
+                if not is_open:
+                    action = '<span class="closed">尚未開放</span>'
+                elif slots.get(slot_id) is None:
+                    href = "/applyform.aspx?" + urlencode({
+                        "pl": query.get("pl", ""), "loc": query.get("loc", ""), "slot": slot_id, "ret": venue_url
+                    })
+                    action = f'<a class="button_apply" title="個人登記" href="{html.escape(href)}">個人登記</a>'
+                else:
+                    action = '<span class="registered">已登記</span>'
+                periods.append(f'<div class="period" data-period="{period}">{period} {action}</div>')
+            cells.append(
+                f'<td data-date="{day.isoformat()}"><div class="date">{day.year}/{day.month}/{day.day} '
+                f'({WEEKDAY_NAMES[day.weekday()]})</div>{"".join(periods)}</td>'
+            )
+        rows = "".join(f"<tr>{''.join(cells[i:i + 7])}</tr>" for i in range(0, len(cells), 7))
+        self._send(200, _page("場地申請", f'<h2>場地 {venue}</h2><table id="calendar">{rows}</table>'))
+
+    def _apply_form(self, query: dict):
+        if not self._session_user():
+            self._redirect("/signin.aspx")
+            return
+        action = "/applyform.aspx?" + urlencode({key: query.get(key, "") for key in ("pl", "loc", "slot", "ret")})
+        self._send(200, _page("個人登記", f"""
+<form method="post" action="{html.escape(action)}">
+  <p>時段：{html.escape(query.get('slot', ''))}</p>
+  <label>本次展演項目</label>
+  <textarea name="txtItems" rows="3"></textarea>
+  <button type="submit">確定送出</button>
+</form>"""))
+
+    def _submit_application(self, query: dict, form: dict):
+        user = self._session_user()
+        if not user:
+            self._redirect("/signin.aspx")
+            return
+        venue = f"{query.get('pl', '')}-{query.get('loc', '')}"
+        ret = query.get("ret") or "/index.aspx"
+        if self.state.try_apply(venue, query.get("slot", ""), user, faulted=self.fault is not None):
+            if self.fault and self.fault["type"] == "no_popup":
+                # 申請已成立，但彈跳視窗沒有出現（也不會自動回到日曆）
+                self._send(200, _page("申請結果", "<div id=\"popup\"></div>"))
+                return
+            message = SUCCESS_MESSAGE
+        elif not self.state.is_open():
+            message = "尚未開放申請"
+        else:
+            message = "此時段已額滿"
+        self._send(200, _page("申請結果", f"""
+<div id="popup" class="modal">
+  <p>{message}</p>
+  <button type="button" onclick="location.href='{html.escape(ret)}'">確定</button>
+</div>"""))
+
+
+class FakeSite:
+    """在背景 thread 執行的假網站"""
+
+    def __init__(self, port: int = 8765, days: int = 14, latency_ms: int = 0, start_date: date = None,
+                 open_at: float = None, faults: list = None):
+        self.state = FakeSiteState(start_date=start_date, days=days, latency_ms=latency_ms, open_at=open_at,
+                                   faults=faults)
+        handler = type("BoundFakeSiteHandler", (FakeSiteHandler,), {"state": self.state})
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeSite":
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本機假 tpbusker 網站")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--latency-ms", type=int, default=0)
+    parser.add_argument("--open-in", type=float, default=None, help="幾秒後開放申請（預設一直開放）")
+    parser.add_argument("--fault", action="append", default=[],
+                        help=f"排定故障，可重複：類型[:after=N,requests=N,seconds=S,delay_ms=M]，類型: {', '.join(FAULT_TYPES)}")
+    args = parser.parse_args()
+
+    open_at = time.time() + args.open_in if args.open_in is not None else None
+    faults = [parse_fault(spec) for spec in args.fault]
+    site = FakeSite(args.port, args.days, args.latency_ms, open_at=open_at, faults=faults)
+    print(f"🌐 假網站已啟動: {site.base_url}")
+    if open_at:
+        print(f"   {args.open_in:.0f} 秒後開放申請")
+    for fault in faults:
+        print(f"   故障: {fault['type']}（{FAULT_TYPES[fault['type']]['description']}），"
+              f"成功申請 {fault['after']} 個時段後開始")
+    print(f"   TPBUSKER_BASE_URL={site.base_url}")
+    try:
+        site.server.serve_forever()
+    except KeyboardInterrupt:
+        site.stop()
+
+
+if __name__ == "__main__":
+    main()
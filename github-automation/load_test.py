@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+台北街頭藝人申請系統 - 搶位負載測試
+
+在本機假網站模擬開放申請瞬間（例如 17:00）的搶位：
+- K 個競爭者：輕量 HTTP client，開放前已登入，開放後依反應時間搶熱門時段
+- 我方：實際的 StreetArtistApplication 流程（Playwright）
+依我方設定組合（並行頁面數、是否共用登入、預先登入提前秒數）各跑數次，
+輸出搶到的時段數、勝率與開放後到成功送出的延遲。
+
+使用方式：
+    python load_test.py                                          # 預設組合，結果寫入 load_test_results.json
+    python load_test.py --competitors 12 --days 2 --trials 3
+    python load_test.py --parallelism 1,2,3 --session-reuse on --prewarm-offsets 30,10,0
+    python load_test.py --clock real                             # 保留設定的人類行為延遲
+"""
+
+import os
+import sys
+
+# 必須在載入 config 之前設定：指向本機假網站、離線、不產生多餘的產出檔
+os.environ.setdefault("PHASE", "2")
+os.environ["TPBUSKER_BASE_URL"] = f"http://127.0.0.1:{os.getenv('LOAD_TEST_PORT', '8766')}"
+os.environ.setdefault("TAIPEI_USERNAME", "load-test-ours")
+os.environ.setdefault("TAIPEI_PASSWORD", "load-test")
+os.environ.setdefault("TRAJECTORY_BUILDING", "0")
+os.environ.setdefault("SCREENSHOT_POLICY", "none")
+os.environ.setdefault("DOM_SNAPSHOT", "0")
+
+import re
+import json
+import html
+import time
+import random
+import asyncio
+import logging
+import argparse
+import itertools
+import threading
+import importlib.util
+import http.cookiejar
+import urllib.request
+from pathlib import Path
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from config import ACCOUNTS, VENUE_URLS, CURRENT_VENUE_URL, CONCURRENCY_CONFIG, RATE_LIMIT_CONFIG
+from fake_site import FakeSite, SUCCESS_MESSAGE
+from object_storage import MemoryStorageBackend
+from sharding import build_work_units, ClaimStore, SlotClaimer
+
+logger = logging.getLogger(__name__)
+
+_APPLY_LINK = re.compile(r'href="(/applyform\.aspx\?[^"]+)"')
+
+
+class Competitor(threading.Thread):
+    """模擬的競爭申請者（urllib + cookie，不開瀏覽器）"""
+
+    def __init__(self, name: str, base_url: str, venue_url: str, open_at: float, reaction_ms: float,
+                 hot_slots: int, wanted: int, rng: random.Random):
+        super().__init__(daemon=True)
+        self.name = name
+        self.base_url = base_url
+        self.venue_url = venue_url
+        self.open_at = open_at
+        self.reaction_ms = reaction_ms
+        self.hot_slots = hot_slots
+        self.wanted = wanted
+        self.rng = rng
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.won = []
+        self.errors = 0
+
+    def _get(self, url: str) -> str:
+        with self.opener.open(url, timeout=10) as response:
+            return response.read().decode("utf-8")
+
+    def _post(self, url: str, data: dict) -> str:
+        with self.opener.open(url, urlencode(data).encode("utf-8"), timeout=10) as response:
+            return response.read().decode("utf-8")
+
+    def run(self):
+        try:
+            self._post(f"{self.base_url}/taipeipass/login", {"account": self.name, "password": "x"})
+            time.sleep(max(0.0, self.open_at - time.time()) + self.reaction_ms / 1000)
+            attempts = 0
+            while len(self.won) < self.wanted and attempts < self.wanted * 3:
+                links = [html.unescape(link) for link in _APPLY_LINK.findall(self._get(self.venue_url))]
+                if not links:
+                    break
+                # 大家都搶前面幾個熱門時段
+                link = self.rng.choice(links[:self.hot_slots])
+                attempts += 1
+                if SUCCESS_MESSAGE in self._post(f"{self.base_url}{link}", {"txtItems": "競爭者"}):
+                    self.won.append(time.time() - self.open_at)
+        except Exception as e:
+            self.errors += 1
+            logger.debug(f"競爭者 {self.name} 發生錯誤: {e}")
+
+
+def split_date_ranges(start, days: int, parts: int) -> list:
+    """把日曆切成 parts 段（每個頁面一段，避免我方頁面互搶）"""
+    parts = max(1, min(parts, days))
+    size = -(-days // parts)
+    ranges = []
+    for offset in range(0, days, size):
+        first = start + timedelta(days=offset)
+        last = start + timedelta(days=min(days, offset + size) - 1)
+        ranges.append(f"{first.isoformat()}~{last.isoformat()}")
+    return ranges
+
+
+async def run_ours(site: FakeSite, open_at: float, parallelism: int, session_reuse: bool,
+                   prewarm_offset: float, clock_mode: str, trial_id: str) -> dict:
+    """
+    執行我方流程
+
+    prewarm_offset 秒前開始開瀏覽器與登入，開放時才前往日曆申請；
+    session_reuse 時所有頁面共用第一個頁面的登入狀態（同一個 context 的分頁）
+    """
+    from main import StreetArtistApplication, create_run_deadline, WARM_STEPS
+    from clock import create_clock
+
+    clock = create_clock(clock_mode)
+    deadline = create_run_deadline(clock)
+    claimer = SlotClaimer(ClaimStore(MemoryStorageBackend(), trial_id), 0)
+    units = build_work_units(
+        accounts=ACCOUNTS[:1], venues=[_venue_name()],
+        date_ranges=split_date_ranges(site.state.start_date, site.state.days, parallelism)
+    )
+    apps = []
+    for unit in units:
+        # 平行的工作單元各自一條時間軸，虛擬等待不會加總
+        unit_clock = clock.fork()
+        apps.append(StreetArtistApplication(venue_url=unit["venue_url"], account=ACCOUNTS[0], work_unit=unit,
+                                            claimer=claimer, deadline=deadline.fork(unit_clock.now),
+                                            clock=unit_clock))
+    for app in apps:
+        app.checkpoint_path = Path(app.screenshot_dir) / f"load-test-{trial_id}-{app.work_unit['unit_id']}.json"
+
+    try:
+        await asyncio.sleep(max(0.0, open_at - prewarm_offset - time.time()))
+        warm_started = time.time()
+        if session_reuse:
+            await apps[0].warm_up()
+            for app in apps[1:]:
+                app.adopt_session(await apps[0].anti_detection.open_sibling())
+        else:
+            await asyncio.gather(*[app.warm_up() for app in apps])
+        warm_seconds = time.time() - warm_started
+
+        await asyncio.sleep(max(0.0, open_at - time.time()))
+        successes = await asyncio.gather(*[app.run_with_retry(warm_steps=WARM_STEPS) for app in apps],
+                                         return_exceptions=True)
+    finally:
+        for app in reversed(apps):
+            await app.cleanup()
+    return {
+        "warm_seconds": round(warm_seconds, 2),
+        "late_start": warm_started + warm_seconds > open_at,
+        "flow_errors": sum(1 for s in successes if s is not True),
+    }
+
+
+def _venue_name() -> str:
+    return next(name for name, url in VENUE_URLS.items() if url == CURRENT_VENUE_URL)
+
+
+def percentile(values: list, ratio: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * ratio))], 3)
+
+
+async def run_trial(site: FakeSite, config: dict, args, trial: int) -> dict:
+    """一次搶位：開放時間設在預先登入之後，競爭者與我方同時開始"""
+    lead = config["prewarm_offset"] + args.setup_seconds
+    open_at = time.time() + lead
+    site.state.reset(open_at)
+    rng = random.Random(f"{args.seed}-{trial}")
+    venue_url = CURRENT_VENUE_URL
+    competitors = [
+        Competitor(f"competitor-{i}", site.base_url, venue_url, open_at,
+                   max(0.0, rng.gauss(args.reaction_ms, args.reaction_jitter_ms)),
+                   args.hot_slots, args.wanted, random.Random(rng.random()))
+        for i in range(args.competitors)
+    ]
+    for competitor in competitors:
+        competitor.start()
+    ours = await run_ours(site, open_at, config["parallelism"], config["session_reuse"],
+                          config["prewarm_offset"], args.clock, f"trial-{trial}")
+    for competitor in competitors:
+        competitor.join(timeout=30)
+
+    state = site.state.snapshot()
+    our_name = ACCOUNTS[0]["username"]
+    won = [a for a in state["applications"] if a["applicant"] == our_name]
+    attempts = [a for a in state["attempts"] if a["applicant"] == our_name]
+    attempted_slots = {}
+    for attempt in state["attempts"]:
+        attempted_slots.setdefault(attempt["slot"], set()).add(attempt["applicant"])
+    contested = {slot for slot, applicants in attempted_slots.items() if len(applicants) > 1}
+    return {
+        "wins": len(won),
+        "attempts": len(attempts),
+        "contested_slots": len(contested),
+        "contested_won": sum(1 for a in won if a["slot"] in contested),
+        "total_slots": site.state.days * 3,
+        "our_latency": [a["time"] - open_at for a in won],
+        "competitor_latency": [t for c in competitors for t in c.won],
+        "competitor_errors": sum(c.errors for c in competitors),
+        **ours,
+    }
+
+
+def summarize(config: dict, trials: list) -> dict:
+    wins = sum(t["wins"] for t in trials)
+    attempts = sum(t["attempts"] for t in trials)
+    contested = sum(t["contested_slots"] for t in trials)
+    our_latency = [x for t in trials for x in t["our_latency"]]
+    competitor_latency = [x for t in trials for x in t["competitor_latency"]]
+    return {
+        "config": config,
+        "trials": len(trials),
+        "wins_per_trial": round(wins / len(trials), 2),
+        "win_rate": round(wins / attempts, 3) if attempts else 0.0,
+        "slot_share": round(wins / sum(t["total_slots"] for t in trials), 3),
+        "contested_win_rate": round(sum(t["contested_won"] for t in trials) / contested, 3) if contested else None,
+        "first_submit_p50_seconds": percentile([min(t["our_latency"]) for t in trials if t["our_latency"]], 0.5),
+        "submit_latency_p50_seconds": percentile(our_latency, 0.5),
+        "submit_latency_p95_seconds": percentile(our_latency, 0.95),
+        "competitor_latency_p50_seconds": percentile(competitor_latency, 0.5),
+        "late_starts": sum(1 for t in trials if t["late_start"]),
+        "flow_errors": sum(t["flow_errors"] for t in trials),
+        "runs": trials,
+    }
+
+
+def print_report(summaries: list):
+    print("\n" + "=" * 96)
+    print(f"{'並行':>4} {'共用登入':>8} {'提前(秒)':>8} {'勝率':>7} {'占比':>7} {'爭搶勝率':>8} "
+          f"{'每輪搶到':>8} {'首筆 p50':>9} {'p95':>7} {'對手 p50':>9}")
+    fmt = lambda v, spec: format(v, spec) if v is not None else "-"
+    for s in summaries:
+        c = s["config"]
+        print(f"{c['parallelism']:>4} {'是' if c['session_reuse'] else '否':>8} {c['prewarm_offset']:>8.0f} "
+              f"{s['win_rate']:>7.0%} {s['slot_share']:>7.0%} {fmt(s['contested_win_rate'], '>8.0%')} "
+              f"{s['wins_per_trial']:>8} {fmt(s['first_submit_p50_seconds'], '>9.2f')} "
+              f"{fmt(s['submit_latency_p95_seconds'], '>7.2f')} {fmt(s['competitor_latency_p50_seconds'], '>9.2f')}")
+    print("=" * 96)
+
+
+async def run_matrix(args) -> list:
+    from driver_manager import shutdown_driver
+
+    configs = []
+    for parallelism, reuse, offset in itertools.product(args.parallelism, args.session_reuse, args.prewarm_offsets):
+        # 只有一個頁面時共用登入與否沒有差別
+        if parallelism == 1 and not reuse and True in args.session_reuse:
+            continue
+        configs.append({"parallelism": parallelism, "session_reuse": reuse, "prewarm_offset": offset})
+
+    site = FakeSite(int(os.environ["TPBUSKER_BASE_URL"].rsplit(":", 1)[1]), days=args.days).start()
+    summaries = []
+    try:
+        for config in configs:
+            print(f"🏁 並行 {config['parallelism']}、共用登入 {config['session_reuse']}、"
+                  f"提前 {config['prewarm_offset']} 秒，對手 {args.competitors} 個 × {args.trials} 輪")
+            trials = []
+            for trial in range(args.trials):
+                result = await run_trial(site, config, args, trial)
+                print(f"   第 {trial + 1} 輪: 搶到 {result['wins']}/{result['total_slots']}，"
+                      f"送出 {result['attempts']} 次")
+                trials.append(result)
+            summaries.append(summarize(config, trials))
+    finally:
+        site.stop()
+        await shutdown_driver()
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本機假網站搶位負載測試")
+    parser.add_argument("--competitors", type=int, default=8, help="競爭者人數 K")
+    parser.add_argument("--days", type=int, default=3, help="開放的天數（每天 3 個時段）")
+    parser.add_argument("--trials", type=int, default=2, help="每個組合的輪數")
+    parser.add_argument("--parallelism", default="1,2", help="逗號分隔的並行頁面數")
+    parser.add_argument("--session-reuse", default="on,off", help="on/off，逗號分隔")
+    parser.add_argument("--prewarm-offsets", default="20,0", help="預先登入提前秒數，逗號分隔（0 = 開放時才登入）")
+    parser.add_argument("--reaction-ms", type=float, default=1500, help="競爭者開放後的平均反應時間")
+    parser.add_argument("--reaction-jitter-ms", type=float, default=700)
+    parser.add_argument("--hot-slots", type=int, default=4, help="競爭者集中搶的前幾個時段")
+    parser.add_argument("--wanted", type=int, default=1, help="每個競爭者要搶的時段數")
+    parser.add_argument("--setup-seconds", type=float, default=3, help="開放前保留給啟動的秒數")
+    parser.add_argument("--clock", choices=["virtual", "real"], default="virtual",
+                        help="virtual 略過人類行為延遲（量測流程本身），real 保留設定的延遲")
+    parser.add_argument("--seed", default="load-test")
+    parser.add_argument("--output", default="load_test_results.json")
+    args = parser.parse_args()
+    args.parallelism = [int(p) for p in args.parallelism.split(",") if p]
+    args.session_reuse = [v.strip() == "on" for v in args.session_reuse.split(",") if v.strip()]
+    args.prewarm_offsets = [float(o) for o in args.prewarm_offsets.split(",") if o]
+    logging.basicConfig(level=logging.WARNING)
+
+    if importlib.util.find_spec("playwright") is None:
+        print("❌ 需要 Playwright 才能執行我方流程")
+        sys.exit(1)
+
+    summaries = asyncio.run(run_matrix(args))
+    print_report(summaries)
+    Path(args.output).write_text(json.dumps({
+        "timestamp": datetime.now().isoformat(),
+        "competitors": args.competitors,
+        "days": args.days,
+        "clock": args.clock,
+        "rate_limit": {k: RATE_LIMIT_CONFIG[k] for k in ("enabled", "rate_per_second", "burst")},
+        "max_slot_attempts": CONCURRENCY_CONFIG["max_slot_attempts"],
+        "results": summaries,
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"💾 結果已寫入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -21,6 +21,8 @@ sys.stderr.flush()
 import asyncio
 import json
 import logging
+import signal
+import time
 from pathlib import Path
 from datetime import datetime
 
@@ -31,6 +33,7 @@ sys.stderr.flush()
 try:
     print("📦 載入 anti_detection 模組...", flush=True)
     from anti_detection import AntiDetectionManager, LoginAntiDetection
+    from driver_manager import get_driver_manager, shutdown_driver
     print("✅ anti_detection 模組載入完成", flush=True)
     sys.stdout.flush()
     sys.stderr.flush()
@@ -53,10 +56,31 @@ try:
         SCREENSHOT_DIR,
         TRAJECTORY_BUILDING_ENABLED,
         MAX_RETRIES,
-        RETRY_DELAY_SECONDS,
+        RETRY_BACKOFF,
+        CHECKPOINT_DIR,
+        CHECKPOINT_RUN_ID,
+        CHECKPOINT_RESUMABLE,
+        EXECUTION_TIMEOUT_MINUTES,
+        DEADLINE_CONFIG,
+        CLOCK_MODE,
+        PROFILING_CONFIG,
         CURRENT_PHASE,
         PHASE_CONFIG,
-        GCS_CONFIG
+        GCS_CONFIG,
+        STORAGE_CONFIG,
+        CONCURRENCY_CONFIG,
+        CALENDAR_REFRESH_CONFIG,
+        SINGLE_FLIGHT_CONFIG,
+        SLOT_PLAN_CONFIG,
+        RUN_SUMMARY_CONFIG,
+        DISPLAY_CONFIG,
+        APPLICATION_WINDOWS,
+        APPLICATION_CLOSE_TIME,
+        TAIWAN_HOLIDAYS,
+        MAKEUP_WORKDAYS,
+        VENUE_URLS,
+        ACCOUNTS,
+        SHARD_CONFIG
     )
     print(f"✅ config 模組載入完成 (PHASE={CURRENT_PHASE})", flush=True)
     sys.stdout.flush()
@@ -83,6 +107,90 @@ except Exception as e:
     sys.stderr.flush()
     sys.exit(1)
 
+try:
+    print("📦 載入 artifact_registry / contact_sheet 模組...", flush=True)
+    from artifact_registry import get_artifact_registry, ArtifactTags
+    from contact_sheet import create_run_summary
+    print("✅ artifact_registry / contact_sheet 模組載入完成", flush=True)
+    sys.stdout.flush()
+    sys.stderr.flush()
+except Exception as e:
+    print(f"❌ artifact_registry / contact_sheet 模組載入失敗: {e}", flush=True)
+    import traceback
+    traceback.print_exc()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    sys.exit(1)
+
+try:
+    print("📦 載入 virtual_display 模組...", flush=True)
+    from virtual_display import virtual_display
+    print("✅ virtual_display 模組載入完成", flush=True)
+    sys.stdout.flush()
+    sys.stderr.flush()
+except Exception as e:
+    print(f"❌ virtual_display 模組載入失敗: {e}", flush=True)
+    import traceback
+    traceback.print_exc()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    sys.exit(1)
+
+try:
+    print("📦 載入 calendar_parser / slot_planner / site_structure 模組...", flush=True)
+    from calendar_parser import describe_button, CalendarTracker, wait_calendar_ready
+    from slot_planner import create_slot_planner, SubmissionBudget, window_deadline, taipei_now, taipei_today
+    from site_structure import get_site_structure
+    print("✅ calendar_parser / slot_planner / site_structure 模組載入完成", flush=True)
+    sys.stdout.flush()
+    sys.stderr.flush()
+except Exception as e:
+    print(f"❌ calendar_parser / slot_planner / site_structure 模組載入失敗: {e}", flush=True)
+    import traceback
+    traceback.print_exc()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    sys.exit(1)
+
+try:
+    print("📦 載入 clock / deadline / checkpoint / browser_profiler 模組...", flush=True)
+    from clock import create_clock
+    from deadline import RunDeadline, PageWatchdog, capture_diagnostics, run_blocking
+    from checkpoint import (
+        FlowCheckpoint, StepFailed, classify_failure, resume_step_for, compute_backoff
+    )
+    from browser_profiler import create_trace_sampler
+    print("✅ clock / deadline / checkpoint / browser_profiler 模組載入完成", flush=True)
+    sys.stdout.flush()
+    sys.stderr.flush()
+except Exception as e:
+    print(f"❌ clock / deadline / checkpoint / browser_profiler 模組載入失敗: {e}", flush=True)
+    import traceback
+    traceback.print_exc()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    sys.exit(1)
+
+try:
+    print("📦 載入 sharding / single_flight / rate_limiter / concurrency 模組...", flush=True)
+    from sharding import (
+        build_work_units, assign_units, create_claim_store, SlotClaimer,
+        date_in_range, write_shard_result, merge_shard_results, account_id
+    )
+    from single_flight import create_single_flight, flight_key, application_period
+    from rate_limiter import get_rate_limiter
+    from concurrency import create_concurrency_controller, SiblingPages
+    print("✅ sharding / single_flight / rate_limiter / concurrency 模組載入完成", flush=True)
+    sys.stdout.flush()
+    sys.stderr.flush()
+except Exception as e:
+    print(f"❌ sharding / single_flight / rate_limiter / concurrency 模組載入失敗: {e}", flush=True)
+    import traceback
+    traceback.print_exc()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    sys.exit(1)
+
 # 設定日誌系統
 def setup_logging():
     """設定日誌系統"""
@@ -110,15 +218,66 @@ def setup_logging():
 # 初始化日誌
 logger = setup_logging()
 
+# 沿用已登入的瀏覽器時可略過的步驟
+WARM_STEPS = ["browser", "trajectory", "login"]
+
 
 class StreetArtistApplication:
     """街頭藝人申請主程式"""
     
-    def __init__(self):
+    def __init__(self, venue_url=CURRENT_VENUE_URL, account=None, work_unit=None, claimer=None,
+                 deadline=None, clock=None, controller=None):
         self.anti_detection = None
         self.page = None
         self.applied_slots = []
         self.screenshot_dir = Path(SCREENSHOT_DIR)
+        self.first_submit_at = None  # 第一次送出申請的時間（time.monotonic，常駐服務統計用）
+        self.retries = 0  # run_with_retry 的重試次數（恢復時間測試統計用）
+        
+        # 場地與帳號（分片模式下由工作單元指定）
+        self.venue_url = venue_url
+        account = account or {"username": TAIPEI_ARTIST_USERNAME, "password": TAIPEI_ARTIST_PASSWORD}
+        self.username = account["username"]
+        self.password = account["password"]
+        self.work_unit = work_unit
+        self.claimer = claimer
+        # 同時執行的工作單元共用截圖目錄，產出檔名加上 unit_id 避免互相覆蓋
+        self.artifact_prefix = f"{work_unit['unit_id']}_" if work_unit else ""
+        # 本工作單元目前的步驟與時段（登記表是共用的，步驟與時段不能共用）
+        self.artifact_tags = ArtifactTags()
+        self.controller = controller  # 自適應並行控制（回報頁面導航耗時）
+        self.on_step_done = None  # 步驟完成時通知（同帳號的其他頁面等待登入完成）
+        self.sibling_pages = None  # 同帳號其他場地在本頁面的 context 開分頁（concurrency.SiblingPages）
+        
+        # 時段規劃（只申請週末與國定假日，價值高的先送出）
+        self.venue_name = work_unit["venue"] if work_unit else next(
+            (name for name, url in VENUE_URLS.items() if url == venue_url), None)
+        self.planner = create_slot_planner(SLOT_PLAN_CONFIG, TAIWAN_HOLIDAYS, MAKEUP_WORKDAYS)
+        
+        # 日曆增量解析（只重新解析有變動的格子）與重新載入統計
+        self.calendar = CalendarTracker(venue_url)
+        self.register_selector = None
+        self.reload_stats = {"reloads": 0, "reloads_skipped": 0}
+        self.calendar_reused = False  # 上一次回到日曆時沿用頁面、沒有重新載入
+        
+        # 流程檢查點（重試時從最早失效的步驟續跑；依執行區分，之後無關的執行不會讀到）
+        unit_id = work_unit["unit_id"] if work_unit else "default"
+        self.checkpoint_path = Path(CHECKPOINT_DIR) / CHECKPOINT_RUN_ID / f"{unit_id}.json"
+        
+        # 所有刻意等待都透過時鐘（虛擬時鐘模式下立即前進）
+        self.clock = clock or create_clock(CLOCK_MODE)
+        
+        # 執行期限與卡住偵測（以時鐘時間計算，虛擬時鐘下仍能檢查時間預算）
+        self.deadline = deadline or create_run_deadline(self.clock)
+        self.watchdog = PageWatchdog(
+            DEADLINE_CONFIG["stall_seconds"],
+            DEADLINE_CONFIG["watchdog_interval_seconds"],
+            DEADLINE_CONFIG["cancel_grace_seconds"],
+            now=self.clock.now
+        )
+        
+        # Playwright tracing 抽樣：每次執行決定一次，重建瀏覽器時沿用
+        self.trace_sampler = create_trace_sampler(PROFILING_CONFIG)
         
         # 確保截圖目錄存在
         self.screenshot_dir.mkdir(exist_ok=True)
@@ -135,9 +294,14 @@ class StreetArtistApplication:
             logger.debug("🔧 啟動反檢測管理器...")
             self.anti_detection = AntiDetectionManager(
                 headless=BROWSER_CONFIG["headless"],
-                screenshot_dir=SCREENSHOT_DIR
+                screenshot_dir=SCREENSHOT_DIR,
+                clock=self.clock,
+                trace_sampler=self.trace_sampler
             )
+            self.anti_detection.artifact_prefix = self.artifact_prefix
+            self.anti_detection.artifact_tags = self.artifact_tags
             self.page = await self.anti_detection.start_browser()
+            self.anti_detection.watchdog = self.watchdog
             logger.debug("✅ 反檢測瀏覽器啟動完成")
         else:
             logger.warning("⚠️  反檢測功能已停用，使用基本瀏覽器")
@@ -158,8 +322,8 @@ class StreetArtistApplication:
     async def perform_login(self):
         """執行登入流程"""
         logger.info("🔐 開始執行登入流程...")
-        if TAIPEI_ARTIST_USERNAME:
-            logger.debug(f"👤 使用帳號: {TAIPEI_ARTIST_USERNAME[:4]}****")
+        if self.username:
+            logger.debug(f"👤 使用帳號: {self.username[:4]}****")
         else:
             logger.error("❌ 未設定 TAIPEI_USERNAME 環境變數")
         
@@ -168,8 +332,8 @@ class StreetArtistApplication:
             # 使用增強版登入
             login_handler = LoginAntiDetection(self.anti_detection)
             success = await login_handler.perform_enhanced_login(
-                TAIPEI_ARTIST_USERNAME, 
-                TAIPEI_ARTIST_PASSWORD
+                self.username, 
+                self.password
             )
             
             if success:
@@ -197,18 +361,23 @@ class StreetArtistApplication:
         
         try:
             # 使用配置檔案中的場地網址
-            logger.info(f"📍 前往時段頁面: {CURRENT_VENUE_URL}")
+            logger.info(f"📍 前往時段頁面: {self.venue_url}")
             logger.debug("🌐 載入頁面中...")
-            await self.page.goto(CURRENT_VENUE_URL, wait_until='networkidle')
+            await get_rate_limiter().acquire("navigate", self.venue_url, clock=self.clock)
+            started = time.monotonic()
+            await self.page.goto(self.venue_url, wait_until='networkidle')
+            self.record_page_latency(started)
+            await get_site_structure().verify(self.page, "calendar")
             
             # 使用反檢測等待
             if self.anti_detection:
+                await self.anti_detection.profile_page("goto_venue")
                 logger.debug("⏱️  執行反檢測延遲...")
                 await self.anti_detection.wait_with_random_delay(2000, 4000)
                 await self.anti_detection.take_screenshot("venue_page")
                 logger.debug("📸 場地頁面截圖完成")
             else:
-                await self.page.wait_for_timeout(3000)
+                await self.clock.sleep(3000, self.page, "page_load")
             
             logger.info("✅ 成功進入時段頁面")
             return True
@@ -223,72 +392,76 @@ class StreetArtistApplication:
         logger.debug("🔍 使用動態搜尋方式尋找可申請時段...")
         
         try:
-            # 尋找「個人登記」按鈕的選擇器
-            personal_register_selectors = [
-                '.button_apply[title="個人登記"]',
-                'text="個人登記"',
-                'button:has-text("個人登記")',
-                '[title="個人登記"]'
-            ]
-            
             # 使用動態搜尋方式，直到沒有「個人登記」按鈕為止
-            max_attempts = 20  # 最多申請 20 個時段，避免無限迴圈
+            # 送出次數上限（避免無限迴圈）與本梯次截止時間共同構成預算
+            budget = SubmissionBudget(
+                CONCURRENCY_CONFIG["max_slot_attempts"],
+                window_deadline(taipei_now(), APPLICATION_WINDOWS, APPLICATION_CLOSE_TIME),
+                SLOT_PLAN_CONFIG["seconds_per_submission"]
+            )
             attempt = 0
             
-            while attempt < max_attempts:
-                attempt += 1
+            while True:
+                allowed, stop_reason = budget.allows_next()
+                if not allowed:
+                    logger.warning(f"⚠️  {stop_reason}，停止申請")
+                    break
+                budget.start()
+                attempt = budget.attempts
                 
+                redirect_expected = False
                 try:
                     logger.info(f"📝 搜尋第 {attempt} 個可申請時段...")
                     
                     # 重新搜尋所有「個人登記」按鈕
-                    current_buttons = []
-                    for selector in personal_register_selectors:
-                        try:
-                            buttons = await self.page.query_selector_all(selector)
-                            if buttons:
-                                current_buttons = buttons
-                                logger.debug(f"✅ 使用選擇器 '{selector}' 找到 {len(buttons)} 個按鈕")
-                                break
-                        except:
-                            continue
+                    current_buttons = await self.find_register_buttons()
+                    
+                    # 沿用的頁面沒有按鈕時不一定是申請完了，重新載入一次再判斷
+                    if not current_buttons and self.calendar_reused:
+                        logger.debug("🔄 沿用的日曆沒有找到按鈕，重新載入確認...")
+                        await self.return_to_calendar(force_reload=True)
+                        current_buttons = await self.find_register_buttons()
                     
                     # 如果沒有找到任何「個人登記」按鈕，表示全部申請完成
                     if not current_buttons:
                         logger.info(f"✅ 沒有更多可申請時段，共申請了 {len(self.applied_slots)} 個時段")
                         break
                     
-                    logger.info(f"🔍 找到 {len(current_buttons)} 個剩餘時段，申請第一個...")
-                    logger.debug("🎯 準備點擊第一個「個人登記」按鈕...")
+                    logger.info(f"🔍 找到 {len(current_buttons)} 個剩餘時段，挑選最優先的時段...")
                     
-                    # 總是點擊第一個找到的「個人登記」按鈕
-                    target_button = current_buttons[0]
+                    # 依規劃挑選價值最高的時段（分片模式下跳過其他 task 已取得的時段）
+                    target_button, target_slot = await self.pick_planned_button(current_buttons)
+                    if target_button is None:
+                        logger.info(f"✅ 剩餘時段都不需申請或已由其他 task 負責，共申請了 {len(self.applied_slots)} 個時段")
+                        break
+                    logger.debug(f"🎯 準備點擊「個人登記」按鈕: {target_slot['text']}")
                     
                     # 使用反檢測點擊
                     if self.anti_detection:
+                        # 之後的截圖都登記在這個時段下
+                        self.tag_artifact_slot(target_slot, attempt)
+                        
                         # 先截圖當前狀態
                         await self.anti_detection.take_screenshot(f"before_slot_{attempt}")
                         
                         # 點擊第一個個人登記按鈕
+                        await get_rate_limiter().acquire("open_form", clock=self.clock)
                         await target_button.click()
                         await self.page.wait_for_load_state('networkidle')
                         await self.anti_detection.wait_with_random_delay(2000, 4000)
                         
                         # 截圖申請表單
                         await self.anti_detection.take_screenshot(f"form_slot_{attempt}")
+                        structure = get_site_structure()
+                        await structure.verify(self.page, "apply_form")
                         
-                        # 填寫表演項目
-                        performance_selectors = [
-                            'textarea',
-                            'textarea[name*="項目"]',
-                            'input[name*="項目"]'
-                        ]
-                        
+                        # 填寫表演項目（網站結構計畫記錄的選擇器優先）
                         performance_filled = False
-                        for perf_selector in performance_selectors:
+                        for perf_selector in structure.selectors("performance_items"):
                             if await self.anti_detection.human_like_type(
                                 perf_selector, PERFORMANCE_ITEMS, "表演項目"
                             ):
+                                structure.learn("performance_items", perf_selector)
                                 performance_filled = True
                                 break
                         
@@ -302,21 +475,19 @@ class StreetArtistApplication:
                         await self.anti_detection.wait_with_random_delay(1000, 2000)
                         
                         # 點擊確定送出
-                        submit_selectors = [
-                            'button:has-text("確定送出")',
-                            'input[value="確定送出"]',
-                            'button:has-text("送出")',
-                            'input[type="submit"]'
-                        ]
-                        
                         submit_success = False
-                        for submit_selector in submit_selectors:
+                        await get_rate_limiter().acquire("submit", clock=self.clock)
+                        for submit_selector in structure.selectors("submit"):
                             if await self.anti_detection.human_like_click(
                                 submit_selector, "送出按鈕"
                             ):
+                                structure.learn("submit", submit_selector)
                                 submit_success = True
                                 break
                         
+                        if submit_success and self.first_submit_at is None:
+                            self.first_submit_at = time.monotonic()
+                        
                         if submit_success:
                             # 等待成功彈跳視窗
                             try:
@@ -324,6 +495,7 @@ class StreetArtistApplication:
                                     'text="個人登記(需管理者審核通過)完成!"', 
                                     timeout=10000
                                 )
+                                await self.anti_detection.profile_page(f"submit_slot_{attempt}")
                                 if success_popup:
                                     logger.info("🎉 申請成功！")
                                     
@@ -342,11 +514,10 @@ class StreetArtistApplication:
                                             'button:has-text("確定")', "確認按鈕"
                                         )
                                         
-                                        # 重要：等待 5 秒讓頁面跳回日曆頁面
-                                        logger.debug("⏱️  等待 5 秒讓頁面跳回日曆...")
-                                        await self.anti_detection.wait_with_random_delay(5000, 6000)
+                                        # 網站會自行跳回日曆頁面（由 return_to_calendar 等待，不再固定等 5 秒）
+                                        redirect_expected = True
                                         
-                                        self.applied_slots.append(f"時段 {attempt}")
+                                        self.applied_slots.append(self.slot_label(target_slot, attempt))
                                         logger.info(f"🎉 第 {attempt} 個時段申請成功！")
                                 
                             except Exception as popup_error:
@@ -356,33 +527,27 @@ class StreetArtistApplication:
                     
                     # 每次申請完成後都確保回到日曆頁面（無論成功或失敗）
                     logger.debug("🔄 確認回到時段選擇頁面...")
-                    current_url = self.page.url
-                    logger.debug(f"🌐 當前頁面: {current_url}")
-                    if CURRENT_VENUE_URL not in current_url:
-                        # 如果不在日曆頁面，重新導航
-                        logger.debug("🔄 重新導航回日曆頁面...")
-                        await self.page.goto(CURRENT_VENUE_URL)
-                        await self.page.wait_for_load_state('networkidle')
+                    await self.return_to_calendar(wait_redirect=redirect_expected)
                     
                     if self.anti_detection:
+                        await self.anti_detection.profile_page(f"calendar_after_slot_{attempt}")
                         await self.anti_detection.wait_with_random_delay(2000, 3000)
                     
                 except Exception as slot_error:
                     logger.error(f"❌ 申請第 {attempt} 個時段時發生錯誤: {slot_error}")
+                    if self.anti_detection:
+                        await self.anti_detection.take_dom_snapshot(f"slot_{attempt}_error")
                     # 發生錯誤時也要確保回到日曆頁面
                     try:
-                        logger.debug("🔄 錯誤恢復：重新導航回日曆頁面...")
-                        await self.page.goto(CURRENT_VENUE_URL)
-                        await self.page.wait_for_load_state('networkidle')
+                        logger.debug("🔄 錯誤恢復：確認回到日曆頁面...")
+                        await self.return_to_calendar(wait_redirect=redirect_expected)
                         if self.anti_detection:
                             await self.anti_detection.wait_with_random_delay(2000, 3000)
-                    except:
+                    except Exception:
                         pass
                     continue
-            
-            # 檢查是否達到最大嘗試次數
-            if attempt >= max_attempts:
-                logger.warning(f"⚠️  達到最大嘗試次數 ({max_attempts})，停止申請")
+                finally:
+                    budget.finish()
             
             logger.info(f"✅ 時段申請完成，成功申請: {len(self.applied_slots)} 個時段")
             return True
@@ -391,6 +556,105 @@ class StreetArtistApplication:
             logger.error(f"❌ 申請時段時發生錯誤: {e}")
             return False
     
+    async def find_register_buttons(self):
+        """搜尋目前頁面上所有「個人登記」按鈕（網站結構計畫記錄的選擇器優先）"""
+        structure = get_site_structure()
+        for selector in structure.selectors("register_button"):
+            try:
+                buttons = await self.page.query_selector_all(selector)
+                if buttons:
+                    logger.debug(f"✅ 使用選擇器 '{selector}' 找到 {len(buttons)} 個按鈕")
+                    structure.learn("register_button", selector)
+                    self.register_selector = selector
+                    return buttons
+            except Exception:
+                continue
+        return []
+    
+    async def pick_planned_button(self, buttons):
+        """
+        依時段規劃挑選下一個要申請的按鈕
+
+        Returns:
+            (按鈕, 時段)；沒有需要申請的時段時為 (None, None)
+        """
+        slots = await self.parse_register_slots(buttons)
+        if self.planner:
+            slots = self.planner.plan(slots, self.venue_name)
+            if not slots:
+                logger.info("⏭️  剩餘時段都不在申請條件內（週末、國定假日、偏好時段）")
+        
+        for slot in slots:
+            if not self.claimer:
+                return slot["button"], slot
+            if not date_in_range(slot["date"], self.work_unit["date_range"]):
+                continue
+            if self.claimer.try_claim(self.work_unit["account_id"], slot["key"], self.work_unit["unit_id"]):
+                logger.debug(f"🔒 已取得時段: {slot['text']}")
+                return slot["button"], slot
+            logger.debug(f"⏭️  時段已由其他 task 取得: {slot['text']}")
+        return None, None
+    
+    async def parse_register_slots(self, buttons):
+        """
+        解析按鈕所在的時段（一次取出、只重新解析有變動的日曆格）
+
+        Playwright 專用選擇器（text=...）無法在頁面內查詢，改為逐一解析按鈕
+        """
+        slots = None
+        try:
+            slots = await self.calendar.refresh(self.page, self.register_selector)
+        except Exception as e:
+            logger.debug(f"無法增量解析日曆，改為逐一解析按鈕: {e}")
+        if slots is None or len(slots) != len(buttons):
+            slots = [await describe_button(button, self.venue_url) for button in buttons]
+        for slot, button in zip(slots, buttons):
+            slot["button"] = button
+        return slots
+    
+    async def return_to_calendar(self, wait_redirect=False, force_reload=False):
+        """
+        確認回到日曆頁面
+
+        送出成功後網站會自行跳回日曆：等到網址回到日曆且日曆容器穩定即可，
+        只有不在日曆、日曆沒有就緒或 force_reload 時才重新載入
+        """
+        cfg = CALENDAR_REFRESH_CONFIG
+        if wait_redirect and not force_reload and self.venue_url not in self.page.url:
+            try:
+                await self.page.wait_for_url(lambda url: self.venue_url in url,
+                                             timeout=cfg["redirect_timeout_ms"])
+            except Exception:
+                logger.debug("⏱️  沒有等到網站跳回日曆")
+        
+        if not force_reload and self.venue_url in self.page.url and await wait_calendar_ready(
+                self.page, cfg["container_selectors"], cfg["stable_ms"], cfg["ready_timeout_ms"], cfg["poll_ms"]):
+            self.calendar_reused = True
+            self.reload_stats["reloads_skipped"] += 1
+            logger.debug("✅ 已在日曆頁面且內容穩定，略過重新載入")
+            return
+        
+        logger.debug(f"🔄 重新導航回日曆頁面（目前: {self.page.url}）...")
+        await get_rate_limiter().acquire("calendar_reload", self.venue_url, clock=self.clock)
+        started = time.monotonic()
+        await self.page.goto(self.venue_url, wait_until="domcontentloaded")
+        await wait_calendar_ready(self.page, cfg["container_selectors"], cfg["stable_ms"],
+                                  cfg["ready_timeout_ms"], cfg["poll_ms"])
+        self.record_page_latency(started)
+        self.calendar_reused = False
+        self.reload_stats["reloads"] += 1
+    
+    @staticmethod
+    def slot_label(slot, attempt):
+        """時段的顯示名稱（解析失敗時用嘗試次數代替）"""
+        if slot["date"] and slot["period"]:
+            return f"{slot['date'].isoformat()} {slot['period']}"
+        return slot["text"] or f"attempt_{attempt}"
+    
+    def tag_artifact_slot(self, slot, attempt):
+        """把目前處理的時段記錄到產出檔案登記表"""
+        self.artifact_tags.set_slot(self.slot_label(slot, attempt))
+    
     async def take_final_screenshot(self):
         """拍攝最終截圖"""
         logger.info("📸 拍攝最終截圖...")
@@ -398,89 +662,150 @@ class StreetArtistApplication:
         try:
             if self.anti_detection:
                 await self.anti_detection.take_screenshot("final_result", full_page=True)
+                await self.anti_detection.take_dom_snapshot("final_result")
                 logger.info("✅ 最終截圖已儲存 (透過反檢測管理器)")
             else:
-                screenshot_path = self.screenshot_dir / "final_result.png"
+                screenshot_path = self.screenshot_dir / f"{self.artifact_prefix}final_result.png"
                 await self.page.screenshot(path=str(screenshot_path), full_page=True)
                 logger.info(f"✅ 最終截圖已儲存: {screenshot_path}")
         except Exception as e:
             logger.warning(f"⚠️  最終截圖失敗: {e}")
     
+    async def warm_up(self):
+        """只執行 browser/trajectory/login（預先登入，之後以 warm_steps 續跑）"""
+        steps = {"browser": self.initialize_browser, "trajectory": self.build_browsing_trajectory,
+                 "login": self.perform_login}
+        for step in WARM_STEPS:
+            if await steps[step]() is False:
+                raise RuntimeError(f"步驟 {step} 失敗")
+    
+    def adopt_session(self, manager):
+        """沿用已登入的瀏覽器（之後以 warm_steps 略過 browser/trajectory/login）"""
+        self.anti_detection = manager
+        manager.artifact_prefix = self.artifact_prefix
+        manager.artifact_tags = self.artifact_tags
+        manager.clock = self.clock
+        manager.watchdog = self.watchdog
+        self.page = manager.page
+    
+    def record_page_latency(self, started):
+        if self.controller:
+            self.controller.record_latency(time.monotonic() - started)
+    
     async def cleanup(self):
         """清理資源"""
         logger.debug("🧹 開始清理瀏覽器資源...")
+        get_site_structure().save()
         if self.anti_detection:
             await self.anti_detection.close_browser()
             logger.debug("✅ 反檢測瀏覽器清理完成")
         else:
             logger.info("✅ 基本清理完成")
     
-    async def run_with_retry(self):
-        """帶重試機制的主執行流程"""
-        for attempt in range(1, MAX_RETRIES + 1):
-            logger.info(f"\n🎯 開始第 {attempt} 次嘗試...")
-            logger.info("=" * 60)
-            
-            try:
-                success = await self.run_single_attempt()
-                if success:
-                    logger.info(f"✅ 第 {attempt} 次嘗試成功！")
-                    return True
-                else:
-                    logger.error(f"❌ 第 {attempt} 次嘗試失敗")
-                    
-            except Exception as e:
-                logger.error(f"❌ 第 {attempt} 次嘗試發生異常: {e}")
-            
-            # 清理當前嘗試的資源
+    async def release_browser(self):
+        """重建瀏覽器前關閉目前的瀏覽器（同帳號的其他分頁還在用時保留共用的 context）"""
+        if self.sibling_pages is None:
             await self.cleanup()
-            
-            # 如果不是最後一次嘗試，等待後重試
-            if attempt < MAX_RETRIES:
-                logger.info(f"⏱️  等待 {RETRY_DELAY_SECONDS} 秒後重試...")
-                await asyncio.sleep(RETRY_DELAY_SECONDS)
-        
-        logger.error(f"❌ 所有 {MAX_RETRIES} 次嘗試都失敗了")
-        return False
+            return
+        get_site_structure().save()
+        await self.sibling_pages.release(self.anti_detection)
+        self.anti_detection = None
     
-    async def run_single_attempt(self):
-        """單次完整執行流程"""
-        try:
-            # 初始化瀏覽器
-            await self.initialize_browser()
-            
-            # 建立瀏覽軌跡
-            await self.build_browsing_trajectory()
-            
-            # 執行登入
-            login_success = await self.perform_login()
-            if not login_success:
-                logger.error("❌ 登入失敗，終止此次嘗試")
-                return False
-            
-            # 導航到場地頁面
-            nav_success = await self.navigate_to_venue()
-            if not nav_success:
-                logger.error("❌ 導航失敗，終止此次嘗試")
-                return False
-            
-            # 申請時段
-            apply_success = await self.apply_time_slots()
-            if not apply_success:
-                logger.error("❌ 申請時段失敗")
+    async def capture_timeout_diagnostics(self, step, reason):
+        """步驟被取消時保存診斷資料"""
+        written = await capture_diagnostics(
+            self.page, self.screenshot_dir, f"{self.artifact_prefix}timeout_{step}",
+            DEADLINE_CONFIG["diagnostics_timeout_seconds"],
+            self.anti_detection.dom_snapshotter if self.anti_detection else None
+        )
+        for path in written:
+            get_artifact_registry().add(path, "diagnostic", tags=self.artifact_tags)
+    
+    async def finalize_results(self):
+        """拍攝最終截圖並顯示結果摘要"""
+        await self.take_final_screenshot()
+        self.show_results()
+        return True
+    
+    async def run_with_retry(self, warm_steps=None):
+        """
+        帶重試機制的主執行流程（失敗時從最早失效的步驟續跑，不再整個重來）
+        
+        Args:
+            warm_steps: 已由呼叫端完成的步驟（常駐服務沿用已登入的瀏覽器時略過 browser/trajectory/login）
+        """
+        steps = {
+            "browser": self.initialize_browser,
+            "trajectory": self.build_browsing_trajectory,
+            "login": self.perform_login,
+            "navigate": self.navigate_to_venue,
+            "apply": self.apply_time_slots,
+            "finalize": self.finalize_results,
+        }
+        checkpoint = FlowCheckpoint.load(self.checkpoint_path)
+        for step in warm_steps or []:
+            checkpoint.mark_done(step)
+        self.applied_slots = list(checkpoint.applied_slots)
+        failures = 0
+        
+        while (step := checkpoint.next_step()) is not None:
+            if self.deadline.expired():
+                logger.error(f"⏰ 已達執行期限，停止於步驟 {step}")
                 return False
             
-            # 拍攝最終截圖
-            await self.take_final_screenshot()
-            
-            # 顯示結果摘要
-            self.show_results()
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"❌ 執行過程發生錯誤: {e}")
-            return False
+            budget = self.deadline.budget_for(step)
+            logger.info(f"▶️  執行步驟: {step} (預算 {budget:.0f} 秒)")
+            self.artifact_tags.set_step(step)
+            if self.anti_detection:
+                await self.anti_detection.trace_step_start(step)
+            try:
+                result = await self.watchdog.run_step(
+                    step, steps[step](), budget,
+                    page_getter=lambda: self.page,
+                    on_timeout=self.capture_timeout_diagnostics
+                )
+                if result is False:
+                    kind = await classify_failure(step, None, self.page)
+                    raise StepFailed(step, kind, "步驟回傳失敗")
+                checkpoint.mark_done(step, self.applied_slots)
+                if self.anti_detection:
+                    await self.anti_detection.trace_step_end(step, failed=False)
+                if self.on_step_done:
+                    self.on_step_done(step)
+                
+            except Exception as e:
+                failures += 1
+                self.retries = failures
+                kind = await classify_failure(step, e, self.page)
+                resume_at = resume_step_for(step, kind)
+                delay = min(compute_backoff(failures, kind, RETRY_BACKOFF), self.deadline.work_remaining())
+                checkpoint.record_failure(step, kind, str(e), resume_at, delay)
+                logger.error(f"❌ 步驟 {step} 失敗 ({kind}): {e}")
+                
+                # 截圖策略為 errors/milestones 時，把失敗前的畫面寫出
+                if self.anti_detection:
+                    self.anti_detection.flush_screenshot_buffer(f"{step}_{kind}")
+                    await self.anti_detection.take_dom_snapshot(f"failure_{step}_{kind}")
+                    await self.anti_detection.trace_step_end(step, failed=True)
+                
+                if failures >= MAX_RETRIES:
+                    logger.error(f"❌ 已失敗 {failures} 次，達到重試上限 ({MAX_RETRIES})")
+                    # 只有同一個執行的 task 重試會接手；本機執行沒有人會接手，直接清除
+                    if not CHECKPOINT_RESUMABLE:
+                        checkpoint.clear()
+                    return False
+                
+                # 只有需要重建瀏覽器時才關閉目前的瀏覽器
+                if resume_at == "browser":
+                    await self.release_browser()
+                checkpoint.invalidate_from(resume_at)
+                
+                logger.info(f"⏱️  等待 {delay:.1f} 秒後從步驟 {resume_at} 續跑 (第 {failures} 次重試)...")
+                await self.clock.sleep(delay * 1000, label="retry_backoff")
+        
+        checkpoint.clear()
+        logger.info(f"✅ 流程完成 (重試 {failures} 次)")
+        return True
     
     def show_results(self):
         """顯示申請結果摘要"""
@@ -493,7 +818,176 @@ class StreetArtistApplication:
         else:
             logger.warning("   - 無可申請時段或申請失敗")
         logger.info(f"📁 截圖位置: {self.screenshot_dir}")
+        if self.anti_detection:
+            stats = self.anti_detection.screenshot_policy.stats()
+            logger.info(f"📸 截圖策略 {stats['mode']}: 存檔 {stats['persisted']} 張，"
+                        f"僅放入記憶體 {stats['buffered']} 張")
+            if self.anti_detection.dom_snapshotter:
+                snap = self.anti_detection.dom_snapshotter.summary()
+                saved = snap.get("bytes_saved_vs_png")
+                logger.info(f"🧬 DOM 快照: {snap['snapshots']} 份 ({snap['compressed_bytes'] / 1024:.1f} KB)，"
+                            f"重複略過 {snap['duplicates']} 份"
+                            + (f"，比 PNG 節省 {saved / 1024:.1f} KB" if saved is not None else ""))
+        get_rate_limiter().log_summary()
+        if self.calendar.stats["refreshes"]:
+            logger.info(f"📅 日曆: 重新載入 {self.reload_stats['reloads']} 次、略過 {self.reload_stats['reloads_skipped']} 次，"
+                        f"重新解析 {self.calendar.stats['cells_parsed']} 格、沿用 {self.calendar.stats['cells_reused']} 格")
+        structure = get_site_structure().summary()
+        logger.info(f"🗺️  網站結構計畫: 選擇器命中 {structure['hits']} 次、重新探索 {structure['misses']} 次、"
+                    f"改版作廢 {structure['invalidated']} 頁")
+        logger.info("="*60)
+
+
+def create_run_deadline(clock):
+    """建立整體執行期限（EXECUTION_TIMEOUT_MINUTES）"""
+    return RunDeadline(
+        EXECUTION_TIMEOUT_MINUTES * 60,
+        DEADLINE_CONFIG["reporting_reserve_seconds"],
+        DEADLINE_CONFIG["step_weights"],
+        now=clock.now
+    )
+
+
+async def run_shard(deadline, clock):
+    """
+    Cloud Run Jobs 分片模式：只執行分配給本 task 的工作單元
+    
+    Returns:
+        (是否全部成功, 申請到的時段)；所有分片都完成時為合併後的時段，否則為本分片的時段
+    """
+    task_index = SHARD_CONFIG["task_index"]
+    task_count = SHARD_CONFIG["task_count"]
+    units = assign_units(build_work_units(), task_index, task_count)
+    logger.info(f"🧩 分片模式: task {task_index}/{task_count}，分配到 {len(units)} 個工作單元")
+    
+    store = create_claim_store()
+    claimer = SlotClaimer(store, task_index)
+    
+    # 各工作單元一個頁面，同時執行的頁面數由容器資源決定
+    controller = create_concurrency_controller(CONCURRENCY_CONFIG)
+    controller.start()
+    groups = {}
+    for unit in units:
+        groups.setdefault(unit["account_index"], []).append(unit)
+    try:
+        group_results = await asyncio.gather(*[
+            run_account_units(group, claimer, deadline, clock, controller) for group in groups.values()
+        ])
+    finally:
+        await controller.stop()
+    unit_results = [result for results in group_results for result in results]
+    if controller.decisions:
+        logger.info(f"🎛️  並行頁面數調整 {len(controller.decisions)} 次，最後為 {controller.limit}")
+    
+    write_shard_result(store, task_index, task_count, unit_results)
+    summary = merge_shard_results(store, task_count)
+    applied = summary["applied_slots"] if summary else [
+        {"unit_id": result["unit_id"], "venue": result["venue"], "slot": slot}
+        for result in unit_results for slot in result["applied_slots"]
+    ]
+    return (all(result["success"] for result in unit_results),
+            [f"{item['venue']} {item['slot']}" for item in applied])
+
+
+async def run_account_units(units, claimer, deadline, clock, controller):
+    """同一個帳號的工作單元：第一個頁面登入，其他場地在同一個瀏覽器開分頁"""
+    siblings = SiblingPages()
+    apps = []
+    for unit in units:
+        # 每個工作單元自己的時間軸（虛擬時鐘下平行的等待不會加總），期限仍是同一個
+        unit_clock = clock.fork()
+        apps.append(StreetArtistApplication(
+            venue_url=unit["venue_url"],
+            account=ACCOUNTS[unit["account_index"]],
+            work_unit=unit,
+            claimer=claimer,
+            deadline=deadline.fork(unit_clock.now),
+            clock=unit_clock,
+            controller=controller
+        ))
+    leader = apps[0]
+    leader.sibling_pages = siblings
+    leader.on_step_done = lambda step: step == "login" and siblings.session_ready(leader.anti_detection)
+    
+    async def run_unit(unit, app):
+        async with controller.slot():
+            logger.info(f"📦 工作單元 {unit['unit_id']}: {unit['venue']} {unit['date_range'] or '(整個日曆)'}")
+            if app is leader:
+                try:
+                    return await app.run_with_retry()
+                finally:
+                    siblings.leader_finished()
+            manager = await siblings.open_page()
+            if manager is None:
+                return await app.run_with_retry()
+            app.adopt_session(manager)
+            return await app.run_with_retry(warm_steps=WARM_STEPS)
+    
+    try:
+        successes = await asyncio.gather(*[run_unit(unit, app) for unit, app in zip(units, apps)],
+                                         return_exceptions=True)
+    finally:
+        # 先關分頁，最後才關共用的瀏覽器
+        for app in reversed(apps):
+            await app.cleanup()
+        await siblings.close_retired()
+    
+    results = []
+    for unit, app, success in zip(units, apps, successes):
+        if isinstance(success, BaseException):
+            logger.error(f"❌ 工作單元 {unit['unit_id']} 發生錯誤: {success}")
+            success = False
+        results.append({**unit, "success": success, "applied_slots": app.applied_slots})
+    return results
+
+
+def current_flight_key(accounts, venues):
+    """本次申請的合併 key：(帳號, 場地組合, 申請梯次)"""
+    period = SINGLE_FLIGHT_CONFIG["period"] or application_period(taipei_today())
+    return flight_key(",".join(account_id(a.get("username")) for a in accounts), venues, period)
+
+
+async def report_screenshots(deadline, screenshot_dir):
+    """處理本次執行的截圖與 manifest（Phase 4 上傳，其他 Phase 寫在本機）"""
+    # Phase 4: 處理截圖上傳
+    if CURRENT_PHASE == 4:
+        logger.info("\n" + "="*60)
+        logger.info("📤 處理截圖上傳...")
+        
+        try:
+            # 截圖上傳必須在整體期限內完成
+            result = await run_blocking(
+                handle_screenshots, deadline.remaining(),
+                phase=CURRENT_PHASE, gcs_config=GCS_CONFIG
+            )
+            
+            if result["success"]:
+                logger.info(f"✅ 截圖處理成功！")
+                logger.info(f"   數量: {result['screenshot_count']} 張")
+                logger.info(f"   位置: {result['storage_location']}")
+                
+                if result.get("manifest"):
+                    logger.info(f"   Manifest: {result['manifest']}")
+                if result.get("contact_sheet"):
+                    logger.info(f"   摘要圖: {result['contact_sheet']}")
+                
+                if result.get("gcs_urls"):
+                    logger.info(f"   GCS URLs:")
+                    for url in result["gcs_urls"]:
+                        logger.info(f"      - {url}")
+            else:
+                logger.error("❌ 截圖處理失敗")
+        
+        except asyncio.TimeoutError:
+            logger.error("⏰ 截圖上傳超過執行期限，停止等待")
+        except Exception as e:
+            logger.error(f"❌ 處理截圖時發生錯誤: {e}")
+        
         logger.info("="*60)
+    else:
+        # Phase 1-3：摘要圖、manifest 與截圖放在同一個資料夾（Phase 3 會一起打包成 Artifacts）
+        create_run_summary(get_artifact_registry(), screenshot_dir, RUN_SUMMARY_CONFIG)
+        get_artifact_registry().write_manifest(screenshot_dir)
 
 
 async def main():
@@ -506,7 +1000,7 @@ async def main():
     logger.info(f"📋 執行環境: Headless={BROWSER_CONFIG['headless']}")
     
     # 檢查環境變數
-    if not TAIPEI_ARTIST_USERNAME or not TAIPEI_ARTIST_PASSWORD:
+    if not all(account.get("username") and account.get("password") for account in ACCOUNTS):
         logger.error("❌ 缺少必要的環境變數 TAIPEI_USERNAME 或 TAIPEI_PASSWORD")
         logger.error("   請檢查 Repository Secrets 設定或本機環境變數")
         return
@@ -514,55 +1008,65 @@ async def main():
     # 顯示 Phase 3 特殊資訊
     if CURRENT_PHASE == 3:
         logger.info("🌐 GitHub Actions 執行環境")
-        logger.info("🖥️  使用 xvfb 虛擬顯示器")
         logger.info("📸 截圖將上傳到 Artifacts")
     
     # 顯示 Phase 4 特殊資訊
     if CURRENT_PHASE == 4:
         logger.info("☁️  Cloud Run 執行環境")
-        logger.info("🖥️  使用 xvfb 虛擬顯示器")
         logger.info("📸 截圖將上傳到 Google Cloud Storage")
         logger.info(f"🗂️  GCS Bucket: {GCS_CONFIG['bucket_name']}")
     
-    app = StreetArtistApplication()
+    clock = create_clock(CLOCK_MODE)
+    deadline = create_run_deadline(clock)
+    app = StreetArtistApplication(deadline=deadline, clock=clock)
+    
+    async def run_once():
+        if SHARD_CONFIG["task_count"] > 1 or len(build_work_units()) > 1:
+            # 預設的 app 沒有執行，申請結果來自各工作單元
+            success, applied_slots = await run_shard(deadline, clock)
+        else:
+            success = await app.run_with_retry()
+            applied_slots = list(app.applied_slots)
+        await report_screenshots(deadline, app.screenshot_dir)
+        return {"success": success, "applied_slots": applied_slots}
     
     try:
-        success = await app.run_with_retry()
-        if success:
+        # 同一個 Cloud Run Jobs 執行的各個 task 本來就要一起跑（由搶位檔協調），不合併
+        if SINGLE_FLIGHT_CONFIG["enabled"] and SHARD_CONFIG["task_count"] == 1:
+            flight = create_single_flight(SINGLE_FLIGHT_CONFIG, STORAGE_CONFIG, GCS_CONFIG)
+            result = await flight.run(current_flight_key(ACCOUNTS, SHARD_CONFIG["venues"]), run_once)
+            if result.get("coalesced"):
+                logger.info(f"🔗 本次觸發已合併到 {result.get('owner')} 的執行，"
+                            f"申請時段: {result.get('applied_slots') or '無'}")
+        else:
+            result = await run_once()
+        if result["success"]:
             logger.info("\n🎉 程式執行成功！")
         else:
             logger.error("\n😞 程式執行失敗，請檢查錯誤訊息")
-        
-        # Phase 4: 處理截圖上傳
-        if CURRENT_PHASE == 4:
-            logger.info("\n" + "="*60)
-            logger.info("📤 處理截圖上傳...")
-            
-            try:
-                result = handle_screenshots(phase=CURRENT_PHASE, gcs_config=GCS_CONFIG)
-                
-                if result["success"]:
-                    logger.info(f"✅ 截圖處理成功！")
-                    logger.info(f"   數量: {result['screenshot_count']} 張")
-                    logger.info(f"   位置: {result['storage_location']}")
-                    
-                    if result.get("gcs_urls"):
-                        logger.info(f"   GCS URLs:")
-                        for url in result["gcs_urls"]:
-                            logger.info(f"      - {url}")
-                else:
-                    logger.error("❌ 截圖處理失敗")
-            
-            except Exception as e:
-                logger.error(f"❌ 處理截圖時發生錯誤: {e}")
-            
-            logger.info("="*60)
     
     finally:
-        # 確保資源清理
+        # 確保資源清理（包含 Playwright driver 與所有 Chromium process）
         await app.cleanup()
+        get_driver_manager().log_memory("（結束前）")
+        await shutdown_driver()
+        if clock.virtual:
+            clock.log_report()
         logger.info("🧹 資源清理完成")
 
 
+async def run_main():
+    """執行主函數，收到 SIGTERM（Cloud Run 停止容器）時取消主流程以便清理"""
+    task = asyncio.ensure_future(main())
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, task.cancel)
+    except (NotImplementedError, RuntimeError):
+        pass
+    await task
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    # 有畫面模式才啟動 Xvfb（已有顯示器時沿用），結束時關閉
+    with virtual_display(DISPLAY_CONFIG, BROWSER_CONFIG["headless"]):
+        asyncio.run(run_main())
\ No newline at end of file
@@ -0,0 +1,241 @@
+"""
+台北街頭藝人申請系統 - 網路錄製與重播模組
+
+record：把整個流程的網路流量（signin.aspx、台北通、場地日曆、表單送出）
+        存成 HAR 格式的封存檔，帳號密碼、Cookie 與網址中的 OAuth code/state/token 會先遮蔽
+replay：透過 Playwright routing 從封存檔回應所有請求，完全不連網，
+        可選擇依錄製時的延遲或零延遲回應
+"""
+
+import json
+import base64
+import asyncio
+import logging
+from pathlib import Path
+from datetime import datetime
+from collections import defaultdict, deque
+from typing import List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+REDACTED = "[REDACTED]"
+
+
+class Redactor:
+    """敏感資料遮蔽（header、表單欄位與網址參數、帳號密碼字串）"""
+
+    # 值是網址的 header（OAuth 轉址的 code/state 也會出現在這裡）
+    URL_HEADERS = {"location", "referer"}
+
+    def __init__(self, headers: List[str], fields: List[str], secrets: List[str] = None, params: List[str] = None):
+        self.headers = {h.lower() for h in headers}
+        self.fields = [f.lower() for f in fields]
+        self.params = {p.lower() for p in (params or [])}
+        self.secrets = [s for s in (secrets or []) if s]
+
+    def sensitive(self, key: str) -> bool:
+        """帳號密碼類欄位以名稱包含判斷，OAuth 參數必須名稱完全相同"""
+        key = key.lower()
+        return key in self.params or any(f in key for f in self.fields)
+
+    def text(self, value: str) -> str:
+        for secret in self.secrets:
+            value = value.replace(secret, REDACTED)
+        return value
+
+    def _header_value(self, name: str, value: str) -> str:
+        name = name.lower()
+        if name in self.headers:
+            return REDACTED
+        return self.url(value) if name in self.URL_HEADERS else self.text(value)
+
+    def header_list(self, headers: dict) -> list:
+        return [{"name": name, "value": self._header_value(name, value)} for name, value in headers.items()]
+
+    def _pairs(self, pairs: list) -> str:
+        return urlencode([
+            (key, REDACTED if self.sensitive(key) else self.text(value))
+            for key, value in pairs
+        ])
+
+    def post_data(self, data: Optional[str]) -> Optional[str]:
+        if not data:
+            return data
+        pairs = parse_qsl(data, keep_blank_values=True)
+        if not pairs:
+            return self.text(data)
+        return self._pairs(pairs)
+
+    def url(self, url: str) -> str:
+        """網址參數與表單欄位一樣依欄位名稱遮蔽"""
+        parts = urlsplit(url)
+        pairs = parse_qsl(parts.query, keep_blank_values=True)
+        # 沒有要遮蔽的參數時保留原本的編碼
+        if not any(self.sensitive(key) for key, _ in pairs):
+            return self.text(url)
+        return self.text(urlunsplit(parts._replace(query=self._pairs(pairs))))
+
+
+class NetworkRecorder:
+    """錄製瀏覽器 context 的所有請求"""
+
+    def __init__(self, archive_path: str, redactor: Redactor):
+        self.archive_path = Path(archive_path)
+        self.redactor = redactor
+        self.entries = []
+        self._pending = set()
+
+    def attach(self, context):
+        context.on("requestfinished", self._on_request_finished)
+        logger.info(f"🎙️  網路錄製已啟用 → {self.archive_path}")
+
+    def _on_request_finished(self, request):
+        task = asyncio.ensure_future(self._record(request))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _record(self, request):
+        try:
+            response = await request.response()
+            if response is None:
+                return
+            try:
+                body = await response.body()
+            except Exception:
+                body = b""  # 轉址回應沒有 body
+            content_type = response.headers.get("content-type", "")
+            if content_type.startswith("text/") or "json" in content_type or "javascript" in content_type:
+                body = self.redactor.text(body.decode("utf-8", errors="replace")).encode("utf-8")
+
+            timing = request.timing or {}
+            self.entries.append({
+                "startedDateTime": datetime.now().isoformat(),
+                "time": max(0.0, timing.get("responseEnd", 0) or 0),
+                "request": {
+                    "method": request.method,
+                    "url": self.redactor.url(request.url),
+                    "headers": self.redactor.header_list(await request.all_headers()),
+                    "postData": {"text": self.redactor.post_data(request.post_data)} if request.post_data else None,
+                },
+                "response": {
+                    "status": response.status,
+                    "headers": self.redactor.header_list(await response.all_headers()),
+                    "content": {
+                        "mimeType": content_type,
+                        "size": len(body),
+                        "encoding": "base64",
+                        "text": base64.b64encode(body).decode("ascii"),
+                    },
+                },
+                "timings": timing,
+            })
+        except Exception as e:
+            logger.debug(f"錄製請求失敗 ({request.url}): {e}")
+
+    async def save(self):
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        self.archive_path.parent.mkdir(parents=True, exist_ok=True)
+        self.archive_path.write_text(json.dumps({
+            "log": {
+                "version": "1.2",
+                "creator": {"name": "street-artist-automation", "version": "1.0"},
+                "entries": self.entries,
+            }
+        }, ensure_ascii=False), encoding="utf-8")
+        logger.info(f"💾 已錄製 {len(self.entries)} 個請求 → {self.archive_path}")
+
+
+class NetworkReplayer:
+    """從封存檔重播回應（不連網）"""
+
+    # 重播時不能原樣回傳的 header（長度與編碼由 Playwright 重新計算）
+    SKIP_HEADERS = {"content-length", "content-encoding", "transfer-encoding", "set-cookie"}
+
+    def __init__(self, archive_path: str, latency: str = "recorded", redactor: Redactor = None):
+        self.archive_path = Path(archive_path)
+        self.latency = latency
+        # 封存檔中的網址已遮蔽，查詢時以同樣方式遮蔽實際請求的網址
+        self.redactor = redactor
+        self.entries = defaultdict(deque)
+        self.last_served = {}
+        self.hits = 0
+        self.misses = []
+
+        archive = json.loads(self.archive_path.read_text(encoding="utf-8"))
+        for entry in archive["log"]["entries"]:
+            self.entries[self._key(entry["request"]["method"], entry["request"]["url"])].append(entry)
+        logger.info(f"📼 載入網路封存檔: {sum(len(q) for q in self.entries.values())} 個請求 "
+                    f"(延遲模式: {latency})")
+
+    @staticmethod
+    def _key(method: str, url: str) -> tuple:
+        return method.upper(), url.split("#", 1)[0]
+
+    async def attach(self, context):
+        await context.route("**/*", self._handle)
+
+    def _next_entry(self, key: tuple):
+        """依錄製順序回應，同一網址用完後重複最後一次的回應"""
+        queue = self.entries.get(key)
+        if queue:
+            self.last_served[key] = queue.popleft()
+        return self.last_served.get(key)
+
+    async def _handle(self, route):
+        request = route.request
+        url = self.redactor.url(request.url) if self.redactor else request.url
+        entry = self._next_entry(self._key(request.method, url))
+        if entry is None:
+            self.misses.append(f"{request.method} {request.url}")
+            await route.abort("blockedbyclient")
+            return
+
+        self.hits += 1
+        if self.latency == "recorded" and entry.get("time"):
+            await asyncio.sleep(entry["time"] / 1000)
+
+        response = entry["response"]
+        await route.fulfill(
+            status=response["status"],
+            headers={h["name"]: h["value"] for h in response["headers"]
+                     if h["name"].lower() not in self.SKIP_HEADERS},
+            body=base64.b64decode(response["content"]["text"]),
+        )
+
+    def log_summary(self):
+        logger.info(f"📼 重播結果: 命中 {self.hits} 個請求，未錄製 {len(self.misses)} 個")
+        for miss in self.misses[:10]:
+            logger.warning(f"   ⚠️  未錄製: {miss}")
+
+
+async def attach_network_mode(context, replay_config: dict, secrets: List[str] = None):
+    """
+    依設定在 context 上啟用錄製或重播
+
+    Returns:
+        NetworkRecorder / NetworkReplayer，live 模式回傳 None
+    """
+    mode = replay_config["mode"]
+    redactor = Redactor(replay_config["redact_headers"], replay_config["redact_fields"], secrets,
+                        replay_config["redact_params"])
+    if mode == "record":
+        recorder = NetworkRecorder(replay_config["archive"], redactor)
+        recorder.attach(context)
+        return recorder
+    if mode == "replay":
+        replayer = NetworkReplayer(replay_config["archive"], replay_config["latency"], redactor)
+        await replayer.attach(context)
+        return replayer
+    if mode != "live":
+        raise ValueError(f"未知的網路模式: {mode}")
+    return None
+
+
+async def finish_network_mode(handler):
+    """結束錄製（寫檔）或重播（輸出統計）"""
+    if isinstance(handler, NetworkRecorder):
+        await handler.save()
+    elif isinstance(handler, NetworkReplayer):
+        handler.log_summary()
@@ -0,0 +1,173 @@
+"""
+台北街頭藝人申請系統 - 網路請求計時模組
+
+記錄每個請求的各階段時間（DNS、連線、TLS、TTFB、下載）、大小與發起來源，
+並標記當時的流程步驟；執行結束時輸出各步驟的瀑布圖摘要與最慢的前 N 個資源，
+用來判斷 networkidle 的時間花在 tpbusker 的 ASP.NET postback、台北通登入轉址，
+還是第三方資源（決定要封鎖、快取或預先載入什麼）。
+"""
+
+import json
+import asyncio
+import logging
+from pathlib import Path
+from collections import defaultdict
+from typing import Callable, List, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+TPBUSKER = "tpbusker"
+TAIPEI_PASS = "taipei_pass"
+THIRD_PARTY = "third_party"
+
+
+def _phase(timing: dict, start: str, end: str) -> Optional[float]:
+    """計算兩個時間點的差（Playwright 無資料時為 -1）"""
+    a, b = timing.get(start, -1), timing.get(end, -1)
+    if a is None or b is None or a < 0 or b < 0:
+        return None
+    return round(b - a, 1)
+
+
+def timing_phases(timing: dict) -> dict:
+    """把 request.timing 轉成各階段耗時（毫秒）"""
+    total = timing.get("responseEnd", -1)
+    return {
+        "dns_ms": _phase(timing, "domainLookupStart", "domainLookupEnd"),
+        "connect_ms": _phase(timing, "connectStart", "connectEnd"),
+        "tls_ms": _phase(timing, "secureConnectionStart", "connectEnd"),
+        "ttfb_ms": _phase(timing, "requestStart", "responseStart"),
+        "download_ms": _phase(timing, "responseStart", "responseEnd"),
+        "total_ms": round(total, 1) if total is not None and total >= 0 else None,
+    }
+
+
+class NetworkTimingRecorder:
+    """在瀏覽器 context 上記錄請求計時"""
+
+    def __init__(self, site_host: str, sso_markers: List[str], step_getter: Callable[[object], Optional[str]],
+                 top_n: int = 10, waterfall_limit: int = 100):
+        self.site_host = site_host
+        self.sso_markers = sso_markers
+        self.step_getter = step_getter
+        self.top_n = top_n
+        self.waterfall_limit = waterfall_limit
+        self.entries = []
+        self._pending = set()
+
+    def attach(self, context):
+        context.on("requestfinished", lambda request: self._schedule(request, failed=False))
+        context.on("requestfailed", lambda request: self._schedule(request, failed=True))
+        logger.info("⏱️  網路請求計時已啟用")
+
+    def categorize(self, url: str) -> str:
+        parsed = urlparse(url)
+        if any(marker in parsed.netloc or marker in parsed.path for marker in self.sso_markers):
+            return TAIPEI_PASS
+        if parsed.netloc == self.site_host:
+            return TPBUSKER
+        return THIRD_PARTY
+
+    def _schedule(self, request, failed: bool):
+        # 步驟要在事件發生當下取得，非同步記錄時可能已進入下一步
+        step = self.step_getter(request) or "unknown"
+        task = asyncio.ensure_future(self._record(request, step, failed))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _record(self, request, step: str, failed: bool):
+        try:
+            timing = request.timing or {}
+            sizes = {}
+            if not failed:
+                try:
+                    sizes = await request.sizes()
+                except Exception:
+                    pass
+            frame_url = ""
+            try:
+                frame_url = request.frame.url
+            except Exception:
+                pass
+            self.entries.append({
+                "step": step,
+                "url": request.url,
+                "method": request.method,
+                "resource_type": request.resource_type,
+                "category": self.categorize(request.url),
+                # Playwright 沒有提供 initiator，以所在 frame 與轉址來源代替
+                "initiator": {
+                    "frame": frame_url,
+                    "redirected_from": request.redirected_from.url if request.redirected_from else None,
+                },
+                "failed": request.failure if failed else None,
+                "start_time": timing.get("startTime"),
+                **timing_phases(timing),
+                "response_bytes": (sizes.get("responseBodySize", 0) or 0) + (sizes.get("responseHeadersSize", 0) or 0),
+                "request_bytes": (sizes.get("requestBodySize", 0) or 0) + (sizes.get("requestHeadersSize", 0) or 0),
+            })
+        except Exception as e:
+            logger.debug(f"請求計時失敗 ({request.url}): {e}")
+
+    async def flush(self):
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    def summary(self) -> dict:
+        """各步驟瀑布圖摘要與最慢資源"""
+        by_step = defaultdict(list)
+        for entry in self.entries:
+            by_step[entry["step"]].append(entry)
+
+        steps = {}
+        for step, entries in by_step.items():
+            entries = sorted(entries, key=lambda e: e["start_time"] or 0)
+            first_start = next((e["start_time"] for e in entries if e["start_time"]), 0)
+            categories = defaultdict(lambda: {"count": 0, "total_ms": 0.0, "bytes": 0})
+            for entry in entries:
+                category = categories[entry["category"]]
+                category["count"] += 1
+                category["total_ms"] = round(category["total_ms"] + (entry["total_ms"] or 0), 1)
+                category["bytes"] += entry["response_bytes"]
+            steps[step] = {
+                "requests": len(entries),
+                "failed": sum(1 for e in entries if e["failed"]),
+                "bytes": sum(e["response_bytes"] for e in entries),
+                "categories": dict(categories),
+                "waterfall": [
+                    {
+                        "offset_ms": round(e["start_time"] - first_start, 1) if e["start_time"] else None,
+                        "total_ms": e["total_ms"],
+                        "ttfb_ms": e["ttfb_ms"],
+                        "category": e["category"],
+                        "resource_type": e["resource_type"],
+                        "url": e["url"][:200],
+                    }
+                    for e in entries[:self.waterfall_limit]
+                ],
+            }
+
+        slowest = sorted((e for e in self.entries if e["total_ms"] is not None),
+                         key=lambda e: e["total_ms"], reverse=True)[:self.top_n]
+        return {
+            "request_count": len(self.entries),
+            "steps": steps,
+            "slowest": [{k: v for k, v in e.items() if k != "start_time"} for e in slowest],
+        }
+
+    def write(self, path: Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.summary(), ensure_ascii=False, indent=2), encoding="utf-8")
+        return path
+
+    def log_summary(self):
+        summary = self.summary()
+        logger.info(f"⏱️  網路請求計時: 共 {summary['request_count']} 個請求")
+        for step, data in summary["steps"].items():
+            parts = ", ".join(f"{name} {c['count']} 個/{c['total_ms'] / 1000:.1f} 秒"
+                              for name, c in data["categories"].items())
+            logger.info(f"   - {step}: {data['requests']} 個請求 ({parts})")
+        for entry in summary["slowest"][:5]:
+            logger.info(f"   🐢 {entry['total_ms']:.0f} ms [{entry['step']}/{entry['category']}] {entry['url'][:100]}")
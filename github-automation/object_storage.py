@@ -0,0 +1,390 @@
+"""
+台北街頭藝人申請系統 - 物件儲存模組
+
+截圖上傳、manifest 與分片搶位檔都透過同一個儲存介面：
+- local：本機資料夾（Phase 1-3、本機多 process 測試）
+- gcs：Google Cloud Storage（Phase 4），整個 process 共用一個有連線池的客戶端，
+       大檔（全頁截圖）使用分段續傳上傳
+- memory：記憶體內的物件儲存替身，可設定延遲、頻寬與失敗率，
+          讓上傳吞吐量與失敗處理能在本機測試與效能測試
+"""
+
+import os
+import time
+import random
+import shutil
+import logging
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, List, Optional, Tuple
+
+from config import STORAGE_CONFIG, GCS_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# GCS 分段上傳的區塊大小必須是 256 KB 的倍數
+GCS_CHUNK_UNIT = 256 * 1024
+
+
+class StorageBackend(ABC):
+    """儲存介面（子類別實作 _put_file、_put_bytes 與讀取相關方法，缺少任何一個時無法建立）"""
+
+    name = "base"
+
+    def __init__(self, concurrency: int = 4, max_retries: int = 3, retry_base_seconds: float = 0.5):
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+        self.stats = {"uploads": 0, "bytes": 0, "retries": 0, "failures": 0}
+
+    # ---- 子類別實作 ----
+    @abstractmethod
+    def url(self, key: str) -> str:
+        ...
+
+    @abstractmethod
+    def _put_file(self, local_path: str, key: str, content_type: str = None):
+        ...
+
+    @abstractmethod
+    def _put_bytes(self, data: bytes, key: str, content_type: str = None):
+        ...
+
+    @abstractmethod
+    def create_if_absent(self, key: str, data: str) -> bool:
+        """原子建立物件，已存在則回傳 False"""
+
+    @abstractmethod
+    def read_text(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def list(self, prefix: str) -> List[str]:
+        """列出 prefix/ 底下的物件 key（已排序）"""
+
+    # ---- 共用：重試、並行 ----
+    def _with_retry(self, action: Callable, key: str):
+        for retry in range(self.max_retries + 1):
+            try:
+                return action()
+            except Exception as e:
+                if retry >= self.max_retries:
+                    with self._lock:
+                        self.stats["failures"] += 1
+                    raise
+                with self._lock:
+                    self.stats["retries"] += 1
+                delay = self.retry_base_seconds * (2 ** retry)
+                logger.warning(f"⚠️  上傳 {key} 失敗（第 {retry + 1} 次）: {e}，{delay:.1f} 秒後重試")
+                time.sleep(delay)
+
+    def upload_file(self, local_path, key: str, content_type: str = None) -> str:
+        """上傳檔案（失敗自動重試），回傳物件網址"""
+        size = os.path.getsize(local_path)
+        self._with_retry(lambda: self._put_file(str(local_path), key, content_type), key)
+        with self._lock:
+            self.stats["uploads"] += 1
+            self.stats["bytes"] += size
+        return self.url(key)
+
+    def upload_bytes(self, data, key: str, content_type: str = None) -> str:
+        data = data.encode("utf-8") if isinstance(data, str) else data
+        self._with_retry(lambda: self._put_bytes(data, key, content_type), key)
+        with self._lock:
+            self.stats["uploads"] += 1
+            self.stats["bytes"] += len(data)
+        return self.url(key)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                                    thread_name_prefix=f"{self.name}-upload")
+            return self._executor
+
+    def upload_in_background(self, local_path, key: str, on_done: Callable = None):
+        """背景上傳（不阻塞瀏覽器流程），完成後以網址呼叫 on_done，失敗時為 None"""
+        def _task():
+            try:
+                url = self.upload_file(local_path, key)
+            except Exception as e:
+                logger.error(f"❌ 上傳失敗 ({key}): {e}")
+                url = None
+            if on_done:
+                on_done(url)
+            return url
+
+        future = self._get_executor().submit(_task)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(lambda f: self._discard_pending(f))
+        return future
+
+    def _discard_pending(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def wait_pending(self, timeout: float = None) -> bool:
+        """等待背景上傳完成，回傳是否全部完成"""
+        with self._lock:
+            pending = list(self._pending)
+        if not pending:
+            return True
+        _, not_done = wait(pending, timeout=timeout)
+        return not not_done
+
+    def upload_many(self, items: List[Tuple[str, str]]) -> dict:
+        """
+        並行上傳多個檔案
+
+        Args:
+            items: (本機路徑, key) 列表
+
+        Returns:
+            key → 網址（失敗為 None）
+        """
+        results = {}
+        if not items:
+            return results
+        futures = {self._get_executor().submit(self.upload_file, path, key): key for path, key in items}
+        for future, key in futures.items():
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                logger.error(f"❌ 上傳失敗 ({key}): {e}")
+                results[key] = None
+        return results
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+class LocalStorageBackend(StorageBackend):
+    """本機資料夾"""
+
+    name = "local"
+
+    def __init__(self, root: str, **kwargs):
+        super().__init__(**kwargs)
+        self.root = Path(root)
+
+    def url(self, key: str) -> str:
+        return (self.root / key).absolute().as_uri()
+
+    def _path(self, key: str) -> Path:
+        path = self.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def _put_file(self, local_path: str, key: str, content_type: str = None):
+        shutil.copyfile(local_path, self._path(key))
+
+    def _put_bytes(self, data: bytes, key: str, content_type: str = None):
+        path = self._path(key)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def create_if_absent(self, key: str, data: str) -> bool:
+        try:
+            fd = os.open(str(self._path(key)), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+        return True
+
+    def read_text(self, key: str) -> Optional[str]:
+        path = self.root / key
+        return path.read_text(encoding="utf-8") if path.exists() else None
+
+    def list(self, prefix: str) -> List[str]:
+        folder = self.root / prefix
+        if not folder.exists():
+            return []
+        return sorted(f"{prefix}/{p.name}" for p in folder.iterdir()
+                      if p.is_file() and not p.name.endswith(".tmp"))
+
+
+class MemoryStorageBackend(StorageBackend):
+    """
+    記憶體內物件儲存替身
+
+    Args:
+        latency_ms: 每次上傳的固定延遲
+        bandwidth_mbps: 模擬頻寬（MB/s，0 為不限制）
+        failure_rate: 每次上傳失敗的機率（測試重試與失敗處理）
+    """
+
+    name = "memory"
+
+    def __init__(self, latency_ms: float = 0, bandwidth_mbps: float = 0, failure_rate: float = 0,
+                 seed: int = None, **kwargs):
+        super().__init__(**kwargs)
+        self.objects = {}
+        self.latency_ms = latency_ms
+        self.bandwidth_mbps = bandwidth_mbps
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.attempts = 0
+
+    def url(self, key: str) -> str:
+        return f"memory://{key}"
+
+    def _simulate_transfer(self, size: int, key: str):
+        with self._lock:
+            self.attempts += 1
+            fail = self.failure_rate and self.random.random() < self.failure_rate
+        delay = self.latency_ms / 1000
+        if self.bandwidth_mbps:
+            delay += size / (self.bandwidth_mbps * 1024 * 1024)
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise ConnectionError(f"模擬上傳失敗: {key}")
+
+    def _put_file(self, local_path: str, key: str, content_type: str = None):
+        data = Path(local_path).read_bytes()
+        self._put_bytes(data, key, content_type)
+
+    def _put_bytes(self, data: bytes, key: str, content_type: str = None):
+        self._simulate_transfer(len(data), key)
+        with self._lock:
+            self.objects[key] = bytes(data)
+
+    def create_if_absent(self, key: str, data: str) -> bool:
+        with self._lock:
+            if key in self.objects:
+                return False
+            self.objects[key] = data.encode("utf-8")
+            return True
+
+    def read_text(self, key: str) -> Optional[str]:
+        with self._lock:
+            data = self.objects.get(key)
+        return data.decode("utf-8") if data is not None else None
+
+    def list(self, prefix: str) -> List[str]:
+        with self._lock:
+            return sorted(key for key in self.objects
+                          if key.startswith(f"{prefix}/") and "/" not in key[len(prefix) + 1:])
+
+
+_gcs_clients = {}
+_gcs_clients_lock = threading.Lock()
+
+
+def get_gcs_client(project_id: str, pool_size: int = 10):
+    """
+    取得共用的 GCS 客戶端（每個專案一個，連線池大小配合上傳並行數）
+
+    google.cloud.storage.Client 是 thread-safe，重複建立只會多做認證與連線
+    """
+    with _gcs_clients_lock:
+        if project_id not in _gcs_clients:
+            import google.auth
+            from google.auth.transport.requests import AuthorizedSession
+            from google.cloud import storage
+            from requests.adapters import HTTPAdapter
+
+            # Cloud Run 環境會自動使用 Service Account 認證
+            credentials, _ = google.auth.default(scopes=list(storage.Client.SCOPE))
+            session = AuthorizedSession(credentials)
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            _gcs_clients[project_id] = storage.Client(project=project_id, _http=session)
+            logger.info(f"✅ GCS 客戶端初始化成功 (專案: {project_id}，連線池: {pool_size})")
+        return _gcs_clients[project_id]
+
+
+class GCSStorageBackend(StorageBackend):
+    """Google Cloud Storage"""
+
+    name = "gcs"
+
+    def __init__(self, gcs_config: dict, chunk_size_mb: float = 1, resumable_threshold_mb: float = 1,
+                 client=None, **kwargs):
+        super().__init__(**kwargs)
+        self.bucket_name = gcs_config["bucket_name"]
+        self.client = client or get_gcs_client(gcs_config["project_id"], max(10, self.concurrency * 2))
+        self.bucket = self.client.bucket(self.bucket_name)
+        # 區塊大小取 256 KB 的倍數
+        self.chunk_size = max(1, int(chunk_size_mb * 1024 * 1024) // GCS_CHUNK_UNIT) * GCS_CHUNK_UNIT
+        self.resumable_threshold = int(resumable_threshold_mb * 1024 * 1024)
+
+    def url(self, key: str) -> str:
+        return f"gs://{self.bucket_name}/{key}"
+
+    def _put_file(self, local_path: str, key: str, content_type: str = None):
+        blob = self.bucket.blob(key)
+        # 設定 chunk_size 會改用分段續傳：斷線時只重送失敗的區塊
+        if os.path.getsize(local_path) >= self.resumable_threshold:
+            blob.chunk_size = self.chunk_size
+        blob.upload_from_filename(local_path, content_type=content_type)
+
+    def _put_bytes(self, data: bytes, key: str, content_type: str = None):
+        self.bucket.blob(key).upload_from_string(data, content_type=content_type)
+
+    def create_if_absent(self, key: str, data: str) -> bool:
+        # if_generation_match=0：物件不存在時才建立（原子操作）
+        from google.api_core.exceptions import PreconditionFailed
+        try:
+            self.bucket.blob(key).upload_from_string(
+                data, content_type="application/json", if_generation_match=0
+            )
+        except PreconditionFailed:
+            return False
+        return True
+
+    def read_text(self, key: str) -> Optional[str]:
+        from google.api_core.exceptions import NotFound
+        try:
+            return self.bucket.blob(key).download_as_text()
+        except NotFound:
+            return None
+
+    def list(self, prefix: str) -> List[str]:
+        blobs = self.client.list_blobs(self.bucket_name, prefix=f"{prefix}/", delimiter="/")
+        return sorted(blob.name for blob in blobs)
+
+
+def create_storage_backend(backend: str, storage_config: dict, gcs_config: dict = None,
+                           local_root: str = None) -> StorageBackend:
+    """依設定建立儲存後端"""
+    common = {
+        "concurrency": storage_config["concurrency"],
+        "max_retries": storage_config["max_retries"],
+        "retry_base_seconds": storage_config["retry_base_seconds"],
+    }
+    if backend == "gcs":
+        if not gcs_config:
+            raise ValueError("gcs 儲存需要提供 gcs_config")
+        return GCSStorageBackend(
+            gcs_config,
+            chunk_size_mb=storage_config["chunk_size_mb"],
+            resumable_threshold_mb=storage_config["resumable_threshold_mb"],
+            **common
+        )
+    if backend == "local":
+        return LocalStorageBackend(local_root or storage_config["local_root"], **common)
+    if backend == "memory":
+        return MemoryStorageBackend(**common)
+    raise ValueError(f"未知的儲存類型: {backend}")
+
+
+_storage = None
+
+
+def get_storage_backend() -> StorageBackend:
+    """取得本 process 共用的截圖儲存（STORAGE_CONFIG["backend"]）"""
+    global _storage
+    if _storage is None:
+        _storage = create_storage_backend(STORAGE_CONFIG["backend"], STORAGE_CONFIG, GCS_CONFIG)
+    return _storage
@@ -0,0 +1,169 @@
+"""
+台北街頭藝人申請系統 - tpbusker 請求速率限制模組
+
+同時處理多個場地、分頁或帳號時，送往 tpbusker.gov.taipei 的總請求速率沒有上限，
+申請期間被網站限流或暫時封鎖的代價太大。
+以 token bucket 限制導航、表單送出與日曆重新載入：
+- burst：可連續送出的次數；rate_per_second：長期平均速率
+- local：同一個 process 內所有頁面與 context 共用
+- file：狀態檔以 flock 鎖定，同一台機器的多個 process（例如本機分片）共用
+- 記錄每個動作因限流多等了多久
+- 等待透過呼叫端的時鐘（clock.py），虛擬時鐘下不實際等待，但計入該工作單元的時間軸
+
+取 token 採「預約」方式：不足時先扣成負數並算出需要等待的時間，
+不必輪詢，先到的請求先放行。
+"""
+
+import json
+import time
+import fcntl
+import asyncio
+import logging
+from pathlib import Path
+from collections import defaultdict
+from typing import Callable
+from urllib.parse import urlparse
+
+from config import RATE_LIMIT_CONFIG, TPBUSKER_BASE_URL
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """單一 process 內的 token bucket"""
+
+    def __init__(self, rate_per_second: float, burst: float, now: Callable[[], float] = time.monotonic):
+        if rate_per_second <= 0 or burst < 1:
+            raise ValueError("rate_per_second 必須大於 0，burst 至少為 1")
+        self.rate = rate_per_second
+        self.burst = burst
+        self.now = now
+        self.tokens = burst
+        self.updated = now()
+
+    def reserve(self, cost: float = 1, now: float = None) -> float:
+        """預約 token，回傳需要等待的秒數（now 為呼叫端時鐘的時間）"""
+        now = self.now() if now is None else now
+        # 各工作單元的虛擬時間軸不同步，時間倒退時不補充
+        self.tokens = min(self.burst, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= cost
+        return max(0.0, -self.tokens / self.rate)
+
+
+class FileTokenBucket:
+    """以狀態檔協調的 token bucket（同一台機器的多個 process 共用）"""
+
+    def __init__(self, path, rate_per_second: float, burst: float):
+        if rate_per_second <= 0 or burst < 1:
+            raise ValueError("rate_per_second 必須大於 0，burst 至少為 1")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.rate = rate_per_second
+        self.burst = burst
+
+    def reserve(self, cost: float = 1, now: float = None) -> float:
+        # 跨 process 只能用牆上時間（不使用呼叫端的時鐘）
+        with open(self.path, "a+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or "{}")
+                except ValueError:
+                    state = {}
+                now = time.time()
+                tokens = state.get("tokens", self.burst)
+                updated = state.get("updated", now)
+                tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate) - cost
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({"tokens": tokens, "updated": now}))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return max(0.0, -tokens / self.rate)
+
+
+class RateLimiter:
+    """tpbusker 請求限流（只限制網站本身的網址）"""
+
+    def __init__(self, bucket, site_host: str, enabled: bool = True):
+        self.bucket = bucket
+        self.site_host = site_host
+        self.enabled = enabled
+        self.stats = {"acquired": 0, "throttled": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+        self.by_label = defaultdict(lambda: {"count": 0, "wait_seconds": 0.0})
+
+    def applies_to(self, url: str = None) -> bool:
+        """沒有網址（表單送出、點擊）一律視為 tpbusker 請求"""
+        return url is None or urlparse(url).netloc == self.site_host
+
+    async def acquire(self, label: str, url: str = None, clock=None) -> float:
+        """
+        取得一次請求額度
+
+        Args:
+            label: 動作名稱（navigate / open_form / submit / calendar_reload ...）
+            url: 導航目標，非 tpbusker 網址不限流
+            clock: 呼叫端的時鐘（clock.py），沒有時以實際時間等待
+
+        Returns:
+            因限流等待的秒數
+        """
+        if not self.enabled or not self.applies_to(url):
+            return 0.0
+        wait = self.bucket.reserve(now=clock.now() if clock else None)
+        if wait > 0:
+            logger.debug(f"🚦 {label} 限流等待 {wait:.2f} 秒")
+            if clock:
+                await clock.sleep(wait * 1000, label="rate_limit")
+            else:
+                await asyncio.sleep(wait)
+            self.stats["throttled"] += 1
+        self.stats["acquired"] += 1
+        self.stats["wait_seconds"] += wait
+        self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], wait)
+        entry = self.by_label[label]
+        entry["count"] += 1
+        entry["wait_seconds"] += wait
+        return wait
+
+    def summary(self) -> dict:
+        return {
+            **{k: round(v, 3) if isinstance(v, float) else v for k, v in self.stats.items()},
+            "by_label": {k: {"count": v["count"], "wait_seconds": round(v["wait_seconds"], 3)}
+                         for k, v in self.by_label.items()},
+        }
+
+    def log_summary(self):
+        if not self.stats["acquired"]:
+            return
+        logger.info(f"🚦 tpbusker 限流: {self.stats['acquired']} 個請求，"
+                    f"其中 {self.stats['throttled']} 個等待，共多等 {self.stats['wait_seconds']:.1f} 秒 "
+                    f"(最長 {self.stats['max_wait_seconds']:.1f} 秒)")
+
+
+def create_rate_limiter(rate_limit_config: dict, site_url: str) -> RateLimiter:
+    """依設定建立限流器"""
+    rate = rate_limit_config["rate_per_second"]
+    burst = rate_limit_config["burst"]
+    coordinator = rate_limit_config["coordinator"]
+    if coordinator == "file":
+        bucket = FileTokenBucket(rate_limit_config["state_file"], rate, burst)
+    elif coordinator == "local":
+        bucket = TokenBucket(rate, burst)
+    else:
+        raise ValueError(f"未知的限流協調方式: {coordinator}（可選: local, file）")
+    return RateLimiter(bucket, urlparse(site_url).netloc, rate_limit_config["enabled"])
+
+
+_limiter = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """取得本 process 共用的限流器（所有頁面與 context 共用同一個 bucket）"""
+    global _limiter
+    if _limiter is None:
+        _limiter = create_rate_limiter(RATE_LIMIT_CONFIG, TPBUSKER_BASE_URL)
+    return _limiter
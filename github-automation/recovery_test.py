@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+台北街頭藝人申請系統 - 故障恢復時間測試
+
+在本機假網站排定故障（fake_site.FAULT_TYPES），執行完整的 StreetArtistApplication 流程
+（run_with_retry 與每個時段的錯誤恢復），量測每種故障：
+- 恢復時間：故障開始到下一次成功送出（不含被套用故障的那次送出）
+- 少搶到的時段數：與沒有故障的基準執行相比
+- 重試次數、流程是否完成、整體多花的時間
+
+時間軸使用流程的時鐘：虛擬時鐘（預設）下，略過的人類行為延遲與重試退避仍會計入，
+調整重試策略（RETRY_BACKOFF、MAX_RETRIES）時可直接比較恢復時間。
+
+使用方式：
+    python recovery_test.py                                   # 所有故障類型，結果寫入 recovery_results.json
+    python recovery_test.py --faults "error500;maintenance:seconds=60" --trials 3
+    python recovery_test.py --after 2 --days 3 --clock real
+"""
+
+import os
+import sys
+
+# 必須在載入 config 之前設定：指向本機假網站、離線、不產生多餘的產出檔
+os.environ.setdefault("PHASE", "2")
+os.environ["TPBUSKER_BASE_URL"] = f"http://127.0.0.1:{os.getenv('RECOVERY_TEST_PORT', '8767')}"
+os.environ.setdefault("TAIPEI_USERNAME", "recovery-test")
+os.environ.setdefault("TAIPEI_PASSWORD", "recovery-test")
+os.environ.setdefault("TRAJECTORY_BUILDING", "0")
+os.environ.setdefault("SCREENSHOT_POLICY", "none")
+os.environ.setdefault("DOM_SNAPSHOT", "0")
+# 每一天都申請（不只週末），少搶到的時段數才有意義；不寫入學到的網站結構
+os.environ.setdefault("SLOT_PLANNER", "0")
+os.environ.setdefault("SITE_STRUCTURE", "0")
+
+import json
+import asyncio
+import logging
+import argparse
+import shutil
+import tempfile
+import importlib.util
+from pathlib import Path
+from datetime import datetime
+
+from config import ACCOUNTS, CURRENT_VENUE_URL, MAX_RETRIES, RETRY_BACKOFF
+from fake_site import FakeSite, FAULT_TYPES, parse_fault
+
+logger = logging.getLogger(__name__)
+
+
+async def run_flow(site: FakeSite, clock_mode: str, work_dir: Path, faults: list, label: str) -> dict:
+    """排定故障後執行一次完整流程"""
+    from main import StreetArtistApplication, create_run_deadline
+    from clock import create_clock
+
+    clock = create_clock(clock_mode)
+    # 假網站的紀錄與流程使用同一條時間軸
+    site.state.now = clock.now
+    site.state.reset(None, faults)
+
+    app = StreetArtistApplication(venue_url=CURRENT_VENUE_URL, account=ACCOUNTS[0],
+                                  deadline=create_run_deadline(clock), clock=clock)
+    # 每次執行各自的檢查點，上一輪失敗留下的檢查點不會讓下一輪從中途續跑
+    app.checkpoint_path = work_dir / f"recovery-{label}.json"
+    started = clock.now()
+    try:
+        success = await app.run_with_retry()
+    except Exception as e:
+        logger.debug(f"流程例外: {e}")
+        success = False
+    finally:
+        await app.cleanup()
+    finished = clock.now()
+
+    state = site.state.snapshot()
+    our_name = ACCOUNTS[0]["username"]
+    won = [a for a in state["applications"] if a["applicant"] == our_name]
+    return {
+        "success": success is True,
+        "retries": app.retries,
+        "wins": len(won),
+        "duration_seconds": round(finished - started, 2),
+        "applications": won,
+        "faults": state["faults"],
+    }
+
+
+def recovery_seconds(run: dict):
+    """故障開始到下一次未受故障影響的成功送出；故障沒有發生時為 0，沒有恢復時為 None"""
+    fault = run["faults"][0] if run["faults"] else None
+    if not fault or fault["activated_at"] is None:
+        return 0.0
+    after = [a["time"] for a in run["applications"] if a["time"] >= fault["activated_at"] and not a["faulted"]]
+    return round(min(after) - fault["activated_at"], 2) if after else None
+
+
+def summarize(name: str, fault: dict, runs: list, baseline: dict) -> dict:
+    recoveries = [recovery_seconds(run) for run in runs]
+    recovered = [r for r in recoveries if r is not None]
+    return {
+        "fault": name,
+        "spec": fault,
+        "trials": len(runs),
+        "triggered": sum(1 for run in runs if run["faults"] and run["faults"][0]["activated_at"] is not None),
+        "recovered": len(recovered),
+        "recovery_seconds_max": max(recovered) if recovered else None,
+        "recovery_seconds_avg": round(sum(recovered) / len(recovered), 2) if recovered else None,
+        "slots_lost_avg": round(sum(baseline["wins"] - run["wins"] for run in runs) / len(runs), 2),
+        "retries_avg": round(sum(run["retries"] for run in runs) / len(runs), 2),
+        "flow_failures": sum(1 for run in runs if not run["success"]),
+        "extra_seconds_avg": round(sum(run["duration_seconds"] for run in runs) / len(runs)
+                                   - baseline["duration_seconds"], 2),
+        "runs": [{k: v for k, v in run.items() if k != "applications"} for run in runs],
+    }
+
+
+def print_report(baseline: dict, summaries: list):
+    fmt = lambda v, spec: format(v, spec) if v is not None else "-"
+    print("\n" + "=" * 88)
+    print(f"基準（無故障）: 搶到 {baseline['wins']} 個時段，耗時 {baseline['duration_seconds']:.1f} 秒")
+    print(f"{'故障':<14} {'觸發':>4} {'恢復':>4} {'恢復秒數(平均)':>14} {'最長':>7} "
+          f"{'少搶到':>6} {'重試':>5} {'流程失敗':>8} {'多花秒數':>8}")
+    for s in summaries:
+        print(f"{s['fault']:<14} {s['triggered']:>4} {s['recovered']:>4} {fmt(s['recovery_seconds_avg'], '>14.1f')} "
+              f"{fmt(s['recovery_seconds_max'], '>7.1f')} {s['slots_lost_avg']:>6} {s['retries_avg']:>5} "
+              f"{s['flow_failures']:>8} {s['extra_seconds_avg']:>8.1f}")
+    print("=" * 88)
+
+
+async def run_matrix(args) -> tuple:
+    from driver_manager import shutdown_driver
+
+    site = FakeSite(int(os.environ["TPBUSKER_BASE_URL"].rsplit(":", 1)[1]), days=args.days).start()
+    work_dir = Path(tempfile.mkdtemp(prefix="street-artist-recovery-"))
+    summaries = []
+    try:
+        print(f"📏 基準執行（無故障，{args.days} 天 × 3 個時段）...")
+        baseline = await run_flow(site, args.clock, work_dir, [], "baseline")
+        print(f"   搶到 {baseline['wins']} 個時段，耗時 {baseline['duration_seconds']:.1f} 秒")
+
+        for spec in args.faults:
+            fault = parse_fault(spec)
+            if "after=" not in spec:
+                fault["after"] = args.after
+            print(f"💥 {fault['type']}（{FAULT_TYPES[fault['type']]['description']}）× {args.trials} 輪")
+            runs = []
+            for trial in range(args.trials):
+                run = await run_flow(site, args.clock, work_dir, [fault], f"{fault['type']}-{trial}")
+                print(f"   第 {trial + 1} 輪: 搶到 {run['wins']} 個，恢復 {recovery_seconds(run)} 秒，"
+                      f"重試 {run['retries']} 次")
+                runs.append(run)
+            summaries.append(summarize(fault["type"], fault, runs, baseline))
+    finally:
+        site.stop()
+        await shutdown_driver()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return baseline, summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本機假網站故障恢復時間測試")
+    parser.add_argument("--faults", default=";".join(FAULT_TYPES),
+                        help="分號分隔的故障設定，例如 \"error500;maintenance:seconds=60,after=2\"")
+    parser.add_argument("--after", type=int, default=1, help="成功申請幾個時段後觸發故障（故障設定沒有指定時）")
+    parser.add_argument("--days", type=int, default=2, help="開放的天數（每天 3 個時段）")
+    parser.add_argument("--trials", type=int, default=1, help="每種故障的輪數")
+    parser.add_argument("--clock", choices=["virtual", "real"], default="virtual",
+                        help="virtual 略過等待但計入時間軸，real 實際等待")
+    parser.add_argument("--output", default="recovery_results.json")
+    args = parser.parse_args()
+    # 故障參數本身用逗號分隔，故障之間用分號
+    args.faults = [spec.strip() for spec in args.faults.split(";") if spec.strip()]
+    logging.basicConfig(level=logging.WARNING)
+
+    if importlib.util.find_spec("playwright") is None:
+        print("❌ 需要 Playwright 才能執行我方流程")
+        sys.exit(1)
+
+    baseline, summaries = asyncio.run(run_matrix(args))
+    print_report(baseline, summaries)
+    Path(args.output).write_text(json.dumps({
+        "timestamp": datetime.now().isoformat(),
+        "days": args.days,
+        "clock": args.clock,
+        "max_retries": MAX_RETRIES,
+        "retry_backoff": RETRY_BACKOFF,
+        "baseline": {k: v for k, v in baseline.items() if k != "applications"},
+        "results": summaries,
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"💾 結果已寫入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
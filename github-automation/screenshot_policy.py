@@ -0,0 +1,90 @@
+"""
+台北街頭藝人申請系統 - 截圖策略模組
+
+決定每張截圖要不要存檔：
+- none：完全不截圖
+- errors：只保存錯誤截圖；其他畫面以編碼後的 bytes 放在固定大小的環狀緩衝區，
+          步驟失敗時才把最後 K 張寫出
+- milestones：保存關鍵畫面（登入結果、申請成功、最終結果）與錯誤截圖，其他放緩衝區
+- all：每張都存檔（原本的行為）
+"""
+
+import time
+import fnmatch
+import logging
+from collections import deque
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+POLICY_MODES = ["none", "errors", "milestones", "all"]
+
+ERROR = "error"
+MILESTONE = "milestone"
+FRAME = "frame"
+
+
+class ScreenshotPolicy:
+    """截圖策略與環狀緩衝區"""
+
+    def __init__(self, mode: str, ring_buffer_size: int, milestones: List[str], errors: List[str]):
+        if mode not in POLICY_MODES:
+            raise ValueError(f"未知的截圖策略: {mode}（可選: {', '.join(POLICY_MODES)}）")
+        self.mode = mode
+        self.milestones = milestones
+        self.errors = errors
+        self.buffer = deque(maxlen=ring_buffer_size)
+        self.persisted_count = 0
+        self.buffered_count = 0
+
+    def classify(self, name: str) -> str:
+        if any(fnmatch.fnmatch(name, pattern) for pattern in self.errors):
+            return ERROR
+        if any(fnmatch.fnmatch(name, pattern) for pattern in self.milestones):
+            return MILESTONE
+        return FRAME
+
+    def should_capture(self) -> bool:
+        return self.mode != "none"
+
+    def should_persist(self, kind: str) -> bool:
+        if self.mode == "all":
+            return True
+        if self.mode == "milestones":
+            return kind in (MILESTONE, ERROR)
+        if self.mode == "errors":
+            return kind == ERROR
+        return False
+
+    def buffer_frame(self, name: str, data: bytes, extension: str):
+        """把未存檔的畫面放進環狀緩衝區（超過上限時丟棄最舊的）"""
+        self.buffer.append({"name": name, "data": data, "extension": extension, "time": time.time()})
+        self.buffered_count += 1
+
+    def drain(self) -> list:
+        """取出緩衝區中所有畫面（失敗時寫出）"""
+        frames = list(self.buffer)
+        self.buffer.clear()
+        return frames
+
+    def fork(self) -> "ScreenshotPolicy":
+        """同樣設定、各自的緩衝區與計數（同帳號的其他分頁失敗時只寫出自己的畫面）"""
+        return ScreenshotPolicy(self.mode, self.buffer.maxlen, self.milestones, self.errors)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "persisted": self.persisted_count,
+            "buffered": self.buffered_count,
+            "in_buffer": len(self.buffer),
+        }
+
+
+def create_screenshot_policy(policy_config: dict, mode: str = None) -> ScreenshotPolicy:
+    """依設定建立截圖策略"""
+    return ScreenshotPolicy(
+        mode or policy_config["mode"],
+        policy_config["ring_buffer_size"],
+        policy_config["milestones"],
+        policy_config["errors"],
+    )
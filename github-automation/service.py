@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+台北街頭藝人申請系統 - 常駐服務模式
+
+原本每則「申請」訊息都會啟動全新的 GitHub Actions / Cloud Run 容器，
+每次都要重新安裝、開 Xvfb、啟動 Chromium 與登入。常駐服務則：
+- 啟動時先載入 Playwright driver（可選擇預先登入第一個帳號）
+- 每個帳號保留一個已登入的瀏覽器（閒置超過 session_ttl_seconds 才關閉）
+- 申請請求放進內部工作佇列，依序執行；相同 (帳號, 場地, 申請梯次) 的請求合併成一個工作
+- 提供 /healthz 與 /metrics（Prometheus 文字格式）
+
+端點：
+    POST /apply          {"account": 0, "venue": "北投公園_1號點", "wait": false}
+    GET  /jobs/<job_id>  工作狀態與結果
+    GET  /healthz        健康檢查
+    GET  /metrics        統計資料
+
+使用方式：
+    python service.py                              # 預設 127.0.0.1:8080
+    curl -X POST localhost:8080/apply -d '{"wait": true}'
+    SERVICE_HOST=0.0.0.0 SERVICE_TOKEN=... python service.py   # 對外開放時必須設定 token
+"""
+
+import json
+import time
+import uuid
+import signal
+import asyncio
+import logging
+import ipaddress
+from pathlib import Path
+from datetime import datetime
+from collections import OrderedDict
+
+from config import (
+    ACCOUNTS, VENUE_URLS, CURRENT_VENUE_NAME, CHECKPOINT_DIR, CLOCK_MODE, SERVICE_CONFIG,
+    SINGLE_FLIGHT_CONFIG, STORAGE_CONFIG, GCS_CONFIG, DISPLAY_CONFIG, BROWSER_CONFIG
+)
+from main import StreetArtistApplication, create_run_deadline, report_screenshots, current_flight_key, WARM_STEPS
+from single_flight import create_single_flight, key_digest
+from rate_limiter import get_rate_limiter
+from site_structure import get_site_structure
+from clock import create_clock
+from artifact_registry import reset_artifact_registry
+from driver_manager import get_driver_manager, shutdown_driver
+from virtual_display import virtual_display
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 64 * 1024
+HTTP_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized",
+                404: "Not Found", 413: "Payload Too Large", 500: "Internal Server Error",
+                503: "Service Unavailable"}
+
+
+class WarmSession:
+    """已登入的瀏覽器（AntiDetectionManager）"""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+
+    def alive(self) -> bool:
+        page = self.manager.page
+        return page is not None and not page.is_closed()
+
+
+class SessionCache:
+    """每個帳號一個已登入的瀏覽器"""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.sessions = {}
+
+    async def checkout(self, account_index: int, venue_url: str, clock=None):
+        """
+        取出可用的瀏覽器（先確認登入狀態還在）
+
+        確認用的導航與其他 tpbusker 導航一樣先取得限流額度（clock 為這個工作的時鐘）
+
+        Returns:
+            WarmSession，沒有或已失效時為 None
+        """
+        session = self.sessions.pop(account_index, None)
+        if session is None:
+            return None
+        if not session.alive() or time.monotonic() - session.last_used > self.ttl_seconds:
+            await self._close(session)
+            return None
+        try:
+            page = session.manager.page
+            await get_rate_limiter().acquire("navigate", venue_url, clock=clock)
+            await page.goto(venue_url, wait_until="domcontentloaded")
+            if "signin" in page.url.lower():
+                logger.info("🔑 快取的登入狀態已失效，重新登入")
+                await self._close(session)
+                return None
+        except Exception as e:
+            logger.warning(f"⚠️  快取的瀏覽器無法使用: {e}")
+            await self._close(session)
+            return None
+        session.uses += 1
+        return session
+
+    def put(self, account_index: int, session: WarmSession):
+        session.last_used = time.monotonic()
+        self.sessions[account_index] = session
+
+    async def reap(self):
+        """關閉閒置過久的瀏覽器"""
+        now = time.monotonic()
+        for account_index, session in list(self.sessions.items()):
+            if now - session.last_used > self.ttl_seconds:
+                self.sessions.pop(account_index, None)
+                logger.info(f"🧹 關閉閒置的瀏覽器 (帳號 {account_index})")
+                await self._close(session)
+
+    async def close_all(self):
+        for account_index in list(self.sessions):
+            await self._close(self.sessions.pop(account_index))
+
+    @staticmethod
+    async def _close(session: WarmSession):
+        try:
+            await session.manager.close_browser()
+        except Exception as e:
+            logger.warning(f"⚠️  關閉瀏覽器時發生錯誤: {e}")
+
+
+class Job:
+    """申請工作"""
+
+    def __init__(self, account_index: int, venue: str, key: dict):
+        self.id = uuid.uuid4().hex[:12]
+        self.account_index = account_index
+        self.venue = venue
+        self.key = key
+        self.requesters = 1  # 合併進來的請求數
+        self.status = "queued"
+        self.received_at = time.monotonic()
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.done = asyncio.Event()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "account": self.account_index,
+            "venue": self.venue,
+            "status": self.status,
+            "period": self.key["period"],
+            "requesters": self.requesters,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+        }
+
+
+class ServiceMetrics:
+    """服務統計（/metrics）"""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.jobs = {"succeeded": 0, "failed": 0, "error": 0}
+        self.job_seconds_sum = 0.0
+        self.first_submit_seconds_sum = 0.0
+        self.first_submit_count = 0
+        self.last_first_submit_seconds = None
+        self.warm_hits = 0
+        self.warm_misses = 0
+        self.coalesced = 0
+
+    def record(self, job: Job, seconds: float, first_submit_seconds: float = None):
+        self.jobs[job.status] = self.jobs.get(job.status, 0) + 1
+        self.job_seconds_sum += seconds
+        if first_submit_seconds is not None:
+            self.first_submit_seconds_sum += first_submit_seconds
+            self.first_submit_count += 1
+            self.last_first_submit_seconds = first_submit_seconds
+
+    def render(self, queue_depth: int, sessions: int, driver_ready: bool) -> str:
+        memory = get_driver_manager().memory_report() if driver_ready else {"total_rss_mb": 0}
+        throttle = get_rate_limiter().stats
+        lines = [
+            "# TYPE street_artist_jobs_total counter",
+            *[f'street_artist_jobs_total{{status="{status}"}} {count}' for status, count in self.jobs.items()],
+            "# TYPE street_artist_job_seconds summary",
+            f"street_artist_job_seconds_sum {self.job_seconds_sum:.3f}",
+            f"street_artist_job_seconds_count {sum(self.jobs.values())}",
+            "# TYPE street_artist_trigger_to_first_submit_seconds summary",
+            f"street_artist_trigger_to_first_submit_seconds_sum {self.first_submit_seconds_sum:.3f}",
+            f"street_artist_trigger_to_first_submit_seconds_count {self.first_submit_count}",
+            "# TYPE street_artist_warm_session_total counter",
+            f'street_artist_warm_session_total{{result="hit"}} {self.warm_hits}',
+            f'street_artist_warm_session_total{{result="miss"}} {self.warm_misses}',
+            "# TYPE street_artist_coalesced_requests_total counter",
+            f"street_artist_coalesced_requests_total {self.coalesced}",
+            "# TYPE street_artist_rate_limit_wait_seconds_total counter",
+            f"street_artist_rate_limit_wait_seconds_total {throttle['wait_seconds']:.3f}",
+            "# TYPE street_artist_rate_limited_requests_total counter",
+            f"street_artist_rate_limited_requests_total {throttle['throttled']}",
+            "# TYPE street_artist_queue_depth gauge",
+            f"street_artist_queue_depth {queue_depth}",
+            "# TYPE street_artist_warm_sessions gauge",
+            f"street_artist_warm_sessions {sessions}",
+            "# TYPE street_artist_rss_megabytes gauge",
+            f"street_artist_rss_megabytes {memory['total_rss_mb']}",
+            "# TYPE street_artist_uptime_seconds gauge",
+            f"street_artist_uptime_seconds {time.monotonic() - self.started_at:.0f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def is_loopback(host: str) -> bool:
+    """是否只監聽本機"""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def check_exposure(service_config: dict):
+    """服務持有已登入的帳號 session，監聽非本機位址時必須設定 SERVICE_TOKEN"""
+    if not service_config["token"] and not is_loopback(service_config["host"]):
+        raise ValueError(f"SERVICE_HOST={service_config['host']} 不是本機位址，必須設定 SERVICE_TOKEN")
+
+
+class ApplyService:
+    """常駐申請服務"""
+
+    def __init__(self, service_config: dict = SERVICE_CONFIG):
+        self.config = service_config
+        self.queue = asyncio.Queue()
+        self.jobs = OrderedDict()
+        self.active = {}  # 合併 key → 尚未完成的工作
+        self.flight = (create_single_flight(SINGLE_FLIGHT_CONFIG, STORAGE_CONFIG, GCS_CONFIG)
+                       if SINGLE_FLIGHT_CONFIG["enabled"] else None)
+        self.sessions = SessionCache(service_config["session_ttl_seconds"])
+        self.metrics = ServiceMetrics()
+        self.driver_ready = False
+        self.server = None
+        self.workers = []
+        self.reaper = None
+
+    # ---- 生命週期 ----
+    async def start(self):
+        check_exposure(self.config)
+        # 先載入 Playwright driver，第一個請求不必等
+        await get_driver_manager().get_playwright()
+        self.driver_ready = True
+        logger.info("🔥 Playwright driver 已就緒")
+
+        self.workers = [asyncio.ensure_future(self._worker(i)) for i in range(self.config["workers"])]
+        self.reaper = asyncio.ensure_future(self._reap_loop())
+        self.server = await asyncio.start_server(self._handle_connection, self.config["host"], self.config["port"])
+        logger.info(f"🌐 服務已啟動: http://{self.config['host']}:{self.config['port']}")
+
+        if self.config["prewarm"] and ACCOUNTS:
+            await self.prewarm(0)
+
+    async def prewarm(self, account_index: int):
+        """預先開瀏覽器並登入（完成 browser/trajectory/login 後保留）"""
+        logger.info(f"🔥 預先登入帳號 {account_index}...")
+        app = self._create_app(account_index, VENUE_URLS[CURRENT_VENUE_NAME], "prewarm")
+        try:
+            await app.warm_up()
+            get_site_structure().save()
+            self.sessions.put(account_index, WarmSession(app.anti_detection))
+            logger.info("✅ 預先登入完成")
+        except Exception as e:
+            logger.warning(f"⚠️  預先登入失敗，第一個請求時再登入: {e}")
+            await app.cleanup()
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        for task in self.workers + ([self.reaper] if self.reaper else []):
+            task.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        await self.sessions.close_all()
+        await shutdown_driver()
+        logger.info("🧹 服務已停止")
+
+    # ---- 工作 ----
+    def submit(self, account_index: int, venue: str) -> Job:
+        """加入工作佇列；相同的申請還沒完成時直接回傳該工作"""
+        key = current_flight_key([ACCOUNTS[account_index]], [venue])
+        digest = key_digest(key)
+        job = self.active.get(digest)
+        if job is not None:
+            job.requesters += 1
+            self.metrics.coalesced += 1
+            logger.info(f"🔗 相同的申請已在佇列中，合併到工作 {job.id} (共 {job.requesters} 個請求)")
+            return job
+
+        job = Job(account_index, venue, key)
+        self.active[digest] = job
+        self.jobs[job.id] = job
+        while len(self.jobs) > self.config["max_jobs_kept"]:
+            self.jobs.popitem(last=False)
+        self.queue.put_nowait(job)
+        logger.info(f"📥 收到申請工作 {job.id} (帳號 {account_index}, {venue})，佇列 {self.queue.qsize()} 個")
+        return job
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self.run_job(job)
+            except Exception as e:
+                logger.error(f"❌ 工作 {job.id} 發生錯誤: {e}")
+                job.status = "error"
+                job.result = {"error": str(e)}
+            finally:
+                self.active.pop(key_digest(job.key), None)
+                job.finished_at = datetime.now().isoformat()
+                job.done.set()
+                self.queue.task_done()
+
+    def _create_app(self, account_index: int, venue_url: str, run_id: str):
+        reset_artifact_registry(f"svc-{run_id}")
+        clock = create_clock(CLOCK_MODE)
+        app = StreetArtistApplication(
+            venue_url=venue_url, account=ACCOUNTS[account_index],
+            deadline=create_run_deadline(clock), clock=clock
+        )
+        # 每個工作獨立的檢查點，不沿用上一次的申請紀錄
+        app.checkpoint_path = Path(CHECKPOINT_DIR) / f"service-{run_id}.json"
+        return app
+
+    async def run_job(self, job: Job):
+        job.status = "running"
+        job.started_at = datetime.now().isoformat()
+        started = time.monotonic()
+        # 跨 process / 容器合併（例如另一個服務副本或批次執行的 main.py）
+        if self.flight:
+            result = await self.flight.run(job.key, lambda: self._execute(job))
+        else:
+            result = await self._execute(job)
+
+        job.status = "succeeded" if result.get("success") else "failed"
+        job.result = result
+        first_submit = None if result.get("coalesced") else result.get("trigger_to_first_submit_seconds")
+        self.metrics.record(job, time.monotonic() - started, first_submit)
+        logger.info(f"📤 工作 {job.id} 完成: {job.result}")
+
+    async def _execute(self, job: Job) -> dict:
+        """實際執行申請（沿用或建立已登入的瀏覽器）"""
+        started = time.monotonic()
+        venue_url = VENUE_URLS[job.venue]
+        app = self._create_app(job.account_index, venue_url, job.id)
+
+        warm_steps = []
+        session = await self.sessions.checkout(job.account_index, venue_url, app.clock)
+        if session:
+            self.metrics.warm_hits += 1
+            app.adopt_session(session.manager)
+            warm_steps = WARM_STEPS
+            logger.info(f"♨️  沿用已登入的瀏覽器 (已使用 {session.uses} 次)")
+        else:
+            self.metrics.warm_misses += 1
+
+        success = False
+        try:
+            success = await app.run_with_retry(warm_steps=warm_steps)
+            await report_screenshots(app.deadline, app.screenshot_dir)
+        finally:
+            # 成功時保留瀏覽器給下一個工作，失敗時關閉（下次重新登入）
+            if success and app.anti_detection and app.page and not app.page.is_closed():
+                # 保留瀏覽器時不會經過 app.cleanup()，學到的網站結構在這裡寫出
+                get_site_structure().save()
+                self.sessions.put(job.account_index, session or WarmSession(app.anti_detection))
+            else:
+                await app.cleanup()
+
+        first_submit = app.first_submit_at - job.received_at if app.first_submit_at else None
+        return {
+            "success": success,
+            "applied_slots": list(app.applied_slots),
+            "warm": bool(warm_steps),
+            "seconds": round(time.monotonic() - started, 2),
+            "trigger_to_first_submit_seconds": round(first_submit, 2) if first_submit is not None else None,
+        }
+
+    async def _reap_loop(self):
+        while True:
+            await asyncio.sleep(60)
+            await self.sessions.reap()
+
+    # ---- HTTP ----
+    async def _handle_connection(self, reader, writer):
+        try:
+            status, body, content_type = await self._handle_request(reader)
+        except Exception as e:
+            logger.error(f"❌ 請求處理失敗: {e}")
+            status, body, content_type = 500, {"error": str(e)}, "application/json"
+        payload = body if isinstance(body, bytes) else (
+            body.encode("utf-8") if isinstance(body, str) else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        )
+        writer.write(
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\nContent-Length: {len(payload)}\r\nConnection: close\r\n\r\n"
+            .encode("latin-1") + payload
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _handle_request(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        if not request_line:
+            return 400, {"error": "empty request"}, "application/json"
+        method, target, _ = (request_line.split(" ", 2) + ["", ""])[:3]
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length") or 0)
+        if length > MAX_BODY_BYTES:
+            return 413, {"error": "body too large"}, "application/json"
+        raw_body = await reader.readexactly(length) if length else b""
+        path = target.split("?", 1)[0]
+
+        if method == "GET" and path == "/healthz":
+            status = 200 if self.driver_ready else 503
+            return status, {
+                "status": "ok" if self.driver_ready else "starting",
+                "queue": self.queue.qsize(),
+                "warm_sessions": len(self.sessions.sessions),
+            }, "application/json"
+        if method == "GET" and path == "/metrics":
+            text = self.metrics.render(self.queue.qsize(), len(self.sessions.sessions), self.driver_ready)
+            return 200, text, "text/plain; version=0.0.4"
+
+        # 其餘端點需要驗證（有設定 SERVICE_TOKEN 時）
+        token = self.config["token"]
+        if token and headers.get("authorization") != f"Bearer {token}":
+            return 401, {"error": "unauthorized"}, "application/json"
+
+        if method == "POST" and path == "/apply":
+            return await self._apply(raw_body)
+        if method == "GET" and path.startswith("/jobs/"):
+            job = self.jobs.get(path[len("/jobs/"):])
+            if not job:
+                return 404, {"error": "job not found"}, "application/json"
+            return 200, job.to_dict(), "application/json"
+        return 404, {"error": "not found"}, "application/json"
+
+    async def _apply(self, raw_body: bytes):
+        try:
+            request = json.loads(raw_body or b"{}")
+            account_index = int(request.get("account", 0))
+            venue = request.get("venue") or CURRENT_VENUE_NAME
+        except (ValueError, TypeError, AttributeError) as e:
+            return 400, {"error": f"invalid request: {e}"}, "application/json"
+        if not 0 <= account_index < len(ACCOUNTS):
+            return 400, {"error": f"unknown account index {account_index}"}, "application/json"
+        if venue not in VENUE_URLS:
+            return 400, {"error": f"unknown venue {venue}"}, "application/json"
+
+        job = self.submit(account_index, venue)
+        if request.get("wait"):
+            await job.done.wait()
+            return 200, job.to_dict(), "application/json"
+        return 202, {**job.to_dict(), "coalesced": job.requesters > 1,
+                     "queue_position": self.queue.qsize()}, "application/json"
+
+
+async def serve():
+    service = ApplyService()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    await service.start()
+    try:
+        await stop.wait()
+    finally:
+        await service.stop()
+
+
+if __name__ == "__main__":
+    with virtual_display(DISPLAY_CONFIG, BROWSER_CONFIG["headless"]):
+        asyncio.run(serve())
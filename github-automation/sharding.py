@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+台北街頭藝人申請系統 - Cloud Run Jobs 分片模組
+
+把 (帳號 × 場地 × 日期區間) 拆成工作單元，依 CLOUD_RUN_TASK_INDEX /
+CLOUD_RUN_TASK_COUNT 決定性地分配給各個 task：
+- 工作單元分配（每個 task 算出相同的結果，不需要互相溝通）
+- 時段搶位鎖定檔（同一帳號的同一時段只會有一個 task 送出申請）
+- 各分片結果合併（最後完成的 task 負責合併成 summary.json）
+
+本機測試：
+    python sharding.py local --tasks 3 --dry-run   # 模擬搶位，不開瀏覽器
+    python sharding.py local --tasks 3             # 每個 task 執行 main.py
+    python sharding.py reduce --run-id local       # 手動合併分片結果
+"""
+
+import os
+import sys
+import json
+import hashlib
+import logging
+import argparse
+import subprocess
+import tempfile
+from pathlib import Path
+from datetime import datetime, date
+from typing import List, Optional
+
+from config import ACCOUNTS, VENUE_URLS, SHARD_CONFIG, GCS_CONFIG, STORAGE_CONFIG
+from object_storage import StorageBackend, create_storage_backend
+
+logger = logging.getLogger(__name__)
+
+
+def account_id(username: str) -> str:
+    """帳號代號（避免在鎖定檔與日誌中出現完整帳號）"""
+    return hashlib.sha1((username or "").encode("utf-8")).hexdigest()[:8]
+
+
+def build_work_units(accounts=None, venues=None, date_ranges=None) -> List[dict]:
+    """
+    建立所有工作單元
+
+    Returns:
+        依 unit_id 排序的工作單元列表，每個 task 都會得到相同順序
+    """
+    accounts = accounts if accounts is not None else ACCOUNTS
+    venues = venues if venues is not None else SHARD_CONFIG["venues"]
+    date_ranges = date_ranges if date_ranges is not None else SHARD_CONFIG["date_ranges"]
+
+    units = []
+    for account_index, account in enumerate(accounts):
+        acct = account_id(account.get("username"))
+        for venue in venues:
+            if venue not in VENUE_URLS:
+                raise ValueError(f"未知的場地名稱: {venue}")
+            for date_range in date_ranges:
+                key = f"{acct}|{venue}|{date_range}"
+                units.append({
+                    "unit_id": hashlib.sha1(key.encode("utf-8")).hexdigest()[:12],
+                    "account_index": account_index,
+                    "account_id": acct,
+                    "venue": venue,
+                    "venue_url": VENUE_URLS[venue],
+                    "date_range": date_range,
+                })
+
+    units.sort(key=lambda u: u["unit_id"])
+    return units
+
+
+def assign_units(units: List[dict], task_index: int, task_count: int) -> List[dict]:
+    """依 task 編號輪流分配工作單元（round-robin，負載差距最多 1 個單元）"""
+    if task_count < 1 or not 0 <= task_index < task_count:
+        raise ValueError(f"分片設定錯誤: index={task_index}, count={task_count}")
+    return [unit for i, unit in enumerate(units) if i % task_count == task_index]
+
+
+def parse_date_range(date_range: str):
+    """解析 'YYYY-MM-DD~YYYY-MM-DD'，空字串代表不限制"""
+    if not date_range:
+        return None
+    start, end = date_range.split("~")
+    return date.fromisoformat(start.strip()), date.fromisoformat(end.strip())
+
+
+def date_in_range(slot_date: Optional[date], date_range: str) -> bool:
+    """時段日期是否落在工作單元的日期區間內（無法判斷日期時視為符合）"""
+    bounds = parse_date_range(date_range)
+    if bounds is None or slot_date is None:
+        return True
+    return bounds[0] <= slot_date <= bounds[1]
+
+
+class ClaimStore:
+    """
+    搶位儲存：在物件儲存上以 runs/<run_id>/ 為前綴存放鎖定檔與分片結果
+
+    local 後端用 O_EXCL、gcs 後端用 if_generation_match=0 做原子建立
+    """
+
+    def __init__(self, storage: StorageBackend, run_id: str):
+        self.storage = storage
+        self.prefix = f"runs/{run_id}"
+
+    def create_if_absent(self, name: str, data: str) -> bool:
+        """原子建立檔案，已存在則回傳 False"""
+        return self.storage.create_if_absent(f"{self.prefix}/{name}", data)
+
+    def read(self, name: str) -> Optional[str]:
+        return self.storage.read_text(f"{self.prefix}/{name}")
+
+    def write(self, name: str, data: str):
+        self.storage.upload_bytes(data, f"{self.prefix}/{name}", content_type="application/json")
+
+    def list(self, prefix: str) -> List[str]:
+        base = f"{self.prefix}/"
+        return sorted(key[len(base):] for key in self.storage.list(f"{base}{prefix}")
+                      if key.endswith(".json"))
+
+
+def create_claim_store(backend: str = None, run_id: str = None) -> ClaimStore:
+    """依設定建立搶位儲存"""
+    backend = backend or SHARD_CONFIG["claim_backend"]
+    run_id = run_id or SHARD_CONFIG["run_id"]
+    storage = create_storage_backend(backend, STORAGE_CONFIG, GCS_CONFIG,
+                                     local_root=SHARD_CONFIG["local_storage_dir"])
+    return ClaimStore(storage, run_id)
+
+
+class SlotClaimer:
+    """
+    時段搶位：送出申請前先取得該時段的鎖定檔
+
+    同一個 process 的多個工作單元（同帳號的分頁）共用同一個搶位器，
+    因此以工作單元判斷「已取得」，不是以 process 判斷
+    """
+
+    def __init__(self, store, task_index: int):
+        self.store = store
+        self.task_index = task_index
+        self.owned = {}  # 鎖定檔名稱 -> 取得它的 unit_id
+
+    def try_claim(self, account: str, slot_key: str, unit_id: str = None) -> bool:
+        """
+        嘗試取得時段
+
+        Returns:
+            本工作單元已取得（包含重試前自己取得的）時為 True，
+            被其他 task 或同一個 process 的其他工作單元取得時為 False
+        """
+        claim_name = self._claim_name(account, slot_key)
+        if claim_name in self.owned:
+            return self.owned[claim_name] == unit_id
+        payload = json.dumps({
+            "account_id": account,
+            "slot_key": slot_key,
+            "unit_id": unit_id,
+            "task_index": self.task_index,
+            "claimed_at": datetime.now().isoformat(),
+        }, ensure_ascii=False)
+        if self.store.create_if_absent(claim_name, payload):
+            self.owned[claim_name] = unit_id
+            return True
+        # task 重新啟動後，原本由同一個工作單元取得的時段仍屬於它
+        raw = self.store.read(claim_name)
+        if unit_id is not None and raw and json.loads(raw).get("unit_id") == unit_id:
+            self.owned[claim_name] = unit_id
+            return True
+        return False
+
+    @staticmethod
+    def _claim_name(account: str, slot_key: str) -> str:
+        digest = hashlib.sha1(f"{account}|{slot_key}".encode("utf-8")).hexdigest()
+        return f"claims/{digest}.json"
+
+
+def write_shard_result(store, task_index: int, task_count: int, unit_results: List[dict]):
+    """寫入本分片結果"""
+    store.write(f"results/shard-{task_index:04d}.json", json.dumps({
+        "task_index": task_index,
+        "task_count": task_count,
+        "finished_at": datetime.now().isoformat(),
+        "units": unit_results,
+    }, ensure_ascii=False, indent=2))
+    logger.info(f"📝 分片 {task_index}/{task_count} 結果已寫入")
+
+
+def merge_shard_results(store, task_count: int) -> Optional[dict]:
+    """
+    合併所有分片結果
+
+    Returns:
+        全部分片都完成時回傳合併結果（並寫入 summary.json），否則回傳 None
+    """
+    names = store.list("results")
+    if len(names) < task_count:
+        logger.info(f"⏳ 已完成 {len(names)}/{task_count} 個分片，等待其他 task")
+        return None
+
+    summary = {
+        "task_count": task_count,
+        "merged_at": datetime.now().isoformat(),
+        "units": [],
+        "applied_slots": [],
+        "failed_units": [],
+    }
+    for name in names:
+        shard = json.loads(store.read(name))
+        for unit in shard["units"]:
+            summary["units"].append(unit)
+            summary["applied_slots"].extend(
+                {"unit_id": unit["unit_id"], "venue": unit["venue"], "slot": slot}
+                for slot in unit.get("applied_slots", [])
+            )
+            if not unit.get("success"):
+                summary["failed_units"].append(unit["unit_id"])
+
+    store.write("summary.json", json.dumps(summary, ensure_ascii=False, indent=2))
+    logger.info(f"🧮 分片結果合併完成：{len(summary['units'])} 個單元，"
+                f"{len(summary['applied_slots'])} 個時段")
+    return summary
+
+
+def _simulate_worker():
+    """dry-run 模擬：對同一組假時段搶位，驗證不會重複申請"""
+    task_index = SHARD_CONFIG["task_index"]
+    task_count = SHARD_CONFIG["task_count"]
+    store = create_claim_store()
+    claimer = SlotClaimer(store, task_index)
+
+    unit_results = []
+    for unit in assign_units(build_work_units(), task_index, task_count):
+        applied = []
+        # 模擬每個 task 都看到同一份日曆（含其他分片的日期區間），與 pick_planned_button 一樣先過濾日期區間
+        for day in range(1, 16):
+            slot_date = date(2025, 1, day)
+            if not date_in_range(slot_date, unit["date_range"]):
+                continue
+            slot_key = f"{unit['venue']}|{slot_date.isoformat()}|早上"
+            if claimer.try_claim(unit["account_id"], slot_key, unit["unit_id"]):
+                applied.append(slot_key)
+        unit_results.append({**unit, "success": True, "applied_slots": applied})
+
+    write_shard_result(store, task_index, task_count, unit_results)
+    merge_shard_results(store, task_count)
+
+
+def _launch_local(tasks: int, dry_run: bool, storage_dir: str) -> int:
+    """在本機啟動 N 個 process 模擬 Cloud Run Jobs 的多個 task"""
+    run_id = f"local-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    storage_dir = storage_dir or tempfile.mkdtemp(prefix="street-artist-shards-")
+    command = [sys.executable, __file__, "simulate"] if dry_run else [sys.executable, "main.py"]
+
+    print(f"🚀 啟動 {tasks} 個本機 task (run_id={run_id}, storage={storage_dir})")
+    processes = []
+    for index in range(tasks):
+        env = dict(os.environ)
+        env.update({
+            "CLOUD_RUN_TASK_INDEX": str(index),
+            "CLOUD_RUN_TASK_COUNT": str(tasks),
+            "CLOUD_RUN_EXECUTION": run_id,
+            "SHARD_CLAIM_BACKEND": "local",
+            "SHARD_STORAGE_DIR": storage_dir,
+        })
+        processes.append(subprocess.Popen(command, env=env, cwd=os.path.dirname(os.path.abspath(__file__))))
+
+    exit_codes = [p.wait() for p in processes]
+    summary_path = Path(storage_dir) / "runs" / run_id / "summary.json"
+    print(f"✅ 所有 task 結束，exit codes: {exit_codes}")
+    print(f"📄 合併結果: {summary_path if summary_path.exists() else '尚未產生'}")
+    return max(exit_codes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cloud Run Jobs 分片工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    local = sub.add_parser("local", help="本機啟動多個 task")
+    local.add_argument("--tasks", type=int, default=3)
+    local.add_argument("--dry-run", action="store_true", help="只模擬搶位，不開瀏覽器")
+    local.add_argument("--storage-dir", default=None)
+
+    sub.add_parser("simulate", help="(內部使用) dry-run 模擬 task")
+
+    reduce = sub.add_parser("reduce", help="合併分片結果")
+    reduce.add_argument("--run-id", default=SHARD_CONFIG["run_id"])
+    reduce.add_argument("--task-count", type=int, default=SHARD_CONFIG["task_count"])
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(message)s')
+
+    if args.command == "local":
+        sys.exit(_launch_local(args.tasks, args.dry_run, args.storage_dir))
+    elif args.command == "simulate":
+        _simulate_worker()
+    elif args.command == "reduce":
+        summary = merge_shard_results(create_claim_store(run_id=args.run_id), args.task_count)
+        sys.exit(0 if summary else 1)
+
+
+if __name__ == "__main__":
+    main()
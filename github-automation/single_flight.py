@@ -0,0 +1,196 @@
+"""
+台北街頭藝人申請系統 - 申請觸發合併（single-flight）模組
+
+LINE 群組裡一分鐘內可能有好幾則「申請 / 我要申請 / 我想申請」，
+每則都會觸發一次完整執行，彼此搶同一個帳號與同一批時段。
+以 (帳號, 場地組合, 申請梯次) 為 key：
+- 同一個 key 已有執行中的申請時，後來的觸發不再另外執行，等待並共用它的結果
+- 剛成功完成（reuse_seconds 內）的結果直接回傳；失敗的結果不沿用，下一次觸發重新執行
+- 鎖定檔放在物件儲存上（local 用 O_EXCL、gcs 用 if_generation_match=0），
+  跨 process 與跨容器都有效；本機測試用 local 後端即可
+
+物件儲存沒有刪除操作，因此以「世代」編號取代釋放鎖：
+flights/<key>/<世代>.lock 建立成功者負責執行，完成後寫入 <世代>.result.json；
+下一次觸發建立下一個世代。執行者中途消失時，鎖定檔超過 lease_seconds 即視為失效。
+"""
+
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import os
+import socket
+from datetime import date
+from typing import Awaitable, Callable, List, Optional
+
+from object_storage import StorageBackend, create_storage_backend
+
+logger = logging.getLogger(__name__)
+
+LOCK_SUFFIX = ".lock"
+RESULT_SUFFIX = ".result.json"
+
+
+def application_period(today: date) -> str:
+    """
+    目前對應的申請梯次（today 為台北日期，slot_planner.taipei_today()）
+
+    第一梯次：每月 1-3 日申請當月下半月；第二梯次：每月 21-22 日申請次月上半月。
+    梯次之外的日期歸到下一個梯次（提早觸發的申請也會合併在一起）。
+    """
+    if today.day <= 20:
+        return f"{today.year}-{today.month:02d} 下半月"
+    year, month = (today.year + 1, 1) if today.month == 12 else (today.year, today.month + 1)
+    return f"{year}-{month:02d} 上半月"
+
+
+def flight_key(account: str, venues: List[str], period: str) -> dict:
+    """合併用的 key（場地組合不分順序）"""
+    return {"account": account, "venues": sorted(set(venues)), "period": period}
+
+
+def key_digest(key: dict) -> str:
+    return hashlib.sha1(json.dumps(key, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+class SingleFlight:
+    """同一個 key 同時只執行一次，其他觸發共用結果"""
+
+    def __init__(self, storage: StorageBackend, lease_seconds: float, reuse_seconds: float = 0,
+                 poll_seconds: float = 5, owner: str = None):
+        self.storage = storage
+        self.lease_seconds = lease_seconds
+        self.reuse_seconds = reuse_seconds
+        self.poll_seconds = poll_seconds
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        # 同一個 process 內的觸發直接等同一個 future，不必輪詢物件儲存
+        self._inflight = {}
+        self.stats = {"leader": 0, "coalesced": 0, "reused": 0, "takeover": 0}
+
+    async def run(self, key: dict, fn: Callable[[], Awaitable[dict]]) -> dict:
+        """
+        執行或加入同一個 key 的申請
+
+        Args:
+            key: flight_key() 產生的 key
+            fn: 實際執行申請的函數，回傳可序列化為 JSON 的結果
+
+        Returns:
+            執行結果；非本次執行時 coalesced 為 True
+        """
+        digest = key_digest(key)
+        shared = self._inflight.get(digest)
+        if shared is not None:
+            self.stats["coalesced"] += 1
+            logger.info(f"🔗 相同的申請已在本 process 執行中，等待其結果 ({digest})")
+            return {**await asyncio.shield(shared), "coalesced": True}
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[digest] = future
+        try:
+            result = await self._run_shared(digest, key, fn)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # 沒有其他等待者時避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(digest, None)
+
+    async def _run_shared(self, digest: str, key: dict, fn) -> dict:
+        prefix = f"flights/{digest}"
+        contended = 0
+        while True:
+            generation, lock, result = await asyncio.to_thread(self._latest, prefix)
+            if generation < contended:
+                # 建立失敗代表該世代已存在，列出物件卻看不到它：儲存後端不一致，不再重試
+                raise RuntimeError(f"無法建立世代 {contended} 的鎖定檔，但列出 {prefix} 看不到它")
+
+            if result is not None:
+                # 失敗的結果不沿用（重新觸發通常就是要重試）
+                if result.get("success") and time.time() - result.get("finished_ts", 0) <= self.reuse_seconds:
+                    self.stats["reused"] += 1
+                    logger.info(f"🔗 相同的申請剛完成（{result.get('owner')}），沿用其結果")
+                    return {**result, "coalesced": True}
+            elif lock is not None:
+                if time.time() < lock["expires_ts"]:
+                    waited = await self._wait_result(prefix, generation, lock)
+                    if waited is not None:
+                        self.stats["coalesced"] += 1
+                        return {**waited, "coalesced": True}
+                    continue
+                self.stats["takeover"] += 1
+                logger.warning(f"⚠️  執行者 {lock['owner']} 的鎖定已逾期，重新執行申請")
+
+            next_generation = generation + 1
+            payload = json.dumps({
+                "key": key,
+                "owner": self.owner,
+                "acquired_ts": time.time(),
+                "expires_ts": time.time() + self.lease_seconds,
+            }, ensure_ascii=False)
+            if await asyncio.to_thread(self.storage.create_if_absent, self._name(prefix, next_generation, LOCK_SUFFIX), payload):
+                self.stats["leader"] += 1
+                logger.info(f"🔒 取得申請執行權 (世代 {next_generation}, {digest})")
+                return await self._lead(prefix, next_generation, fn)
+            # 被其他觸發搶先建立，重新讀取後加入它
+            contended = next_generation
+
+    async def _lead(self, prefix: str, generation: int, fn) -> dict:
+        result = None
+        try:
+            result = await fn()
+            return result
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+            raise
+        finally:
+            # 被取消（SIGTERM）時也寫入結果，讓等待者不必等到鎖定逾期
+            record = {**(result if result is not None else {"success": False, "error": "cancelled"}),
+                      "owner": self.owner, "finished_ts": time.time()}
+            try:
+                await asyncio.to_thread(self.storage.upload_bytes, json.dumps(record, ensure_ascii=False),
+                                        self._name(prefix, generation, RESULT_SUFFIX), "application/json")
+            except Exception as e:
+                logger.warning(f"⚠️  無法寫入申請結果，等待者需等到鎖定逾期: {e}")
+
+    async def _wait_result(self, prefix: str, generation: int, lock: dict) -> Optional[dict]:
+        """等待執行者寫入結果，鎖定逾期則回傳 None"""
+        logger.info(f"⏳ 相同的申請正由 {lock['owner']} 執行中，等待其結果...")
+        name = self._name(prefix, generation, RESULT_SUFFIX)
+        while time.time() < lock["expires_ts"]:
+            raw = await asyncio.to_thread(self.storage.read_text, name)
+            if raw:
+                return json.loads(raw)
+            await asyncio.sleep(self.poll_seconds)
+        return None
+
+    def _latest(self, prefix: str):
+        """最新世代的編號、鎖定內容與結果（沒有世代時編號為 0）"""
+        generations = []
+        for key in self.storage.list(prefix):
+            name = key.rsplit("/", 1)[-1]
+            if name.endswith(LOCK_SUFFIX) and name[:-len(LOCK_SUFFIX)].isdigit():
+                generations.append(int(name[:-len(LOCK_SUFFIX)]))
+        if not generations:
+            return 0, None, None
+        generation = max(generations)
+        lock_raw = self.storage.read_text(self._name(prefix, generation, LOCK_SUFFIX))
+        result_raw = self.storage.read_text(self._name(prefix, generation, RESULT_SUFFIX))
+        lock = json.loads(lock_raw) if lock_raw else {"owner": "?", "expires_ts": 0}
+        return generation, lock, json.loads(result_raw) if result_raw else None
+
+    @staticmethod
+    def _name(prefix: str, generation: int, suffix: str) -> str:
+        return f"{prefix}/{generation:06d}{suffix}"
+
+
+def create_single_flight(flight_config: dict, storage_config: dict, gcs_config: dict = None) -> SingleFlight:
+    """依設定建立 single-flight（鎖定檔與分片搶位使用同一種物件儲存）"""
+    storage = create_storage_backend(flight_config["backend"], storage_config, gcs_config,
+                                     local_root=flight_config["local_storage_dir"])
+    return SingleFlight(storage, flight_config["lease_seconds"], flight_config["reuse_seconds"],
+                        flight_config["poll_seconds"])
@@ -0,0 +1,327 @@
+"""
+台北街頭藝人申請系統 - 網站結構快取模組
+
+每次執行都靠「依序嘗試選擇器」重新找登入按鈕、日曆的「個人登記」、表演項目欄位與送出按鈕，
+猜錯一個選擇器就要等 wait_for_selector 逾時（10 秒）。
+分析模式（python site_structure.py --analyze）登入後走過各場地，把下列資料寫入 WEBSITE_STRUCTURE_FILE：
+- 每個頁面實際可用的選擇器
+- 表單結構（action、欄位、隱藏欄位名稱）
+- 各場地的日曆網址（apply.aspx / applys3.aspx 的 pl、loc）與申請表單網址
+一般執行載入這份計畫，直接使用記錄的選擇器（其他候選只在失敗時才嘗試），
+並以頁面指紋（表單 action 與欄位名稱的雜湊）檢查標記是否改版，不符時作廢該頁的計畫。
+一般執行成功使用的選擇器也會寫回計畫，沒有跑過分析模式時下一次執行同樣受益。
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+from typing import List, Optional
+
+from config import SITE_STRUCTURE_CONFIG, TPBUSKER_BASE_URL, VENUE_URLS
+from calendar_parser import PERSONAL_REGISTER_SELECTORS
+
+logger = logging.getLogger(__name__)
+
+# 計畫格式版本（格式改變時遞增，舊檔案直接忽略）
+STRUCTURE_VERSION = 1
+
+# 各角色的候選選擇器（依優先順序）
+SELECTOR_CANDIDATES = {
+    "login_confirm": [
+        'input[value="確定登入"]',
+        '#ct100_ContentPlaceHolder1_Button1',
+        'input[class="button9"]'
+    ],
+    "login_taipeipass": [
+        'text="點我登入"',
+        'a:has-text("點我登入")'
+    ],
+    "username": [
+        'input[placeholder*="帳號"]',
+        'input[type="text"]',
+        'input[name*="user"]'
+    ],
+    "password": ['input[type="password"]'],
+    "login_submit": [
+        'a.green_btn.login_btn',
+        '.green_btn.login_btn',
+        'a[class="green_btn login_btn"]'
+    ],
+    "register_button": PERSONAL_REGISTER_SELECTORS,
+    "performance_items": [
+        'textarea',
+        'textarea[name*="項目"]',
+        'input[name*="項目"]'
+    ],
+    "submit": [
+        'button:has-text("確定送出")',
+        'input[value="確定送出"]',
+        'button:has-text("送出")',
+        'input[type="submit"]'
+    ],
+}
+
+# 角色所在的頁面（頁面指紋不符時，該頁的選擇器一起作廢）
+ROLE_PAGES = {
+    "login_confirm": "signin",
+    "login_taipeipass": "signin_choice",
+    "username": "taipeipass",
+    "password": "taipeipass",
+    "login_submit": "taipeipass",
+    "register_button": "calendar",
+    "performance_items": "apply_form",
+    "submit": "apply_form",
+}
+
+# 頁面指紋：只取結構（表單 action、欄位標籤/型別/名稱），不含 __VIEWSTATE 之類每次都變的值；
+# 去除重複，日曆上可申請的按鈕數量變動不影響指紋
+_FINGERPRINT_JS = """
+() => {
+    const parts = new Set();
+    for (const form of document.forms) {
+        parts.add('form ' + (form.getAttribute('action') || '').split('?')[0]);
+    }
+    for (const el of document.querySelectorAll('input, select, textarea, button')) {
+        parts.add([el.tagName.toLowerCase(), el.getAttribute('type') || '', el.getAttribute('name') || el.id || ''].join(' '));
+    }
+    return Array.from(parts);
+}
+"""
+
+# 表單結構（分析模式）
+_FORMS_JS = """
+() => Array.from(document.forms).map(form => ({
+    action: form.getAttribute('action') || '',
+    method: (form.getAttribute('method') || 'get').toLowerCase(),
+    hidden_fields: Array.from(form.querySelectorAll('input[type=hidden]')).map(el => el.name).filter(Boolean),
+    fields: Array.from(form.querySelectorAll('input:not([type=hidden]), select, textarea, button')).map(el => ({
+        tag: el.tagName.toLowerCase(),
+        type: el.getAttribute('type') || '',
+        name: el.getAttribute('name') || '',
+        id: el.id || '',
+        value: el.tagName === 'BUTTON' || ['submit', 'button'].includes(el.type) ? (el.value || el.innerText || '') : '',
+    })),
+}))
+"""
+
+
+async def page_fingerprint(page) -> str:
+    """頁面結構指紋（一次 evaluate）"""
+    parts = await page.evaluate(_FINGERPRINT_JS)
+    return hashlib.sha1("\n".join(sorted(parts)).encode("utf-8")).hexdigest()[:16]
+
+
+def venue_location(url: str) -> dict:
+    """場地網址的頁面與 pl / loc 參數"""
+    parsed = urlparse(url)
+    query = parse_qs(parsed.query)
+    return {
+        "page": parsed.path.lstrip("/"),
+        "pl": query.get("pl", [""])[0],
+        "loc": query.get("loc", [""])[0],
+    }
+
+
+class SiteStructure:
+    """網站結構計畫（選擇器、表單、場地網址）"""
+
+    def __init__(self, path, site_url: str, enabled: bool = True):
+        self.path = Path(path)
+        self.site_url = site_url
+        self.enabled = enabled
+        self.analyzing = False  # 分析模式：額外記錄表單結構
+        self.dirty = False
+        self.stats = {"hits": 0, "misses": 0, "invalidated": 0}
+        self.data = self._load() if enabled else self._empty()
+
+    def _empty(self) -> dict:
+        return {"version": STRUCTURE_VERSION, "site": self.site_url, "generated_at": None,
+                "pages": {}, "venues": {}}
+
+    def _load(self) -> dict:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            logger.debug(f"尚無網站結構計畫 {self.path}，本次執行會自行探索")
+            return self._empty()
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️  網站結構計畫無法讀取，本次重新探索: {e}")
+            return self._empty()
+        if data.get("version") != STRUCTURE_VERSION or data.get("site") != self.site_url:
+            logger.info(f"🗺️  網站結構計畫版本或網站不同（{data.get('version')}, {data.get('site')}），本次重新探索")
+            return self._empty()
+        logger.info(f"🗺️  載入網站結構計畫（{len(data.get('pages', {}))} 個頁面，產生於 {data.get('generated_at')}）")
+        return data
+
+    def _page(self, page_key: str) -> dict:
+        return self.data["pages"].setdefault(page_key, {"url": None, "fingerprint": None, "selectors": {}})
+
+    # ---- 選擇器 ----
+    def selectors(self, role: str) -> List[str]:
+        """角色的選擇器（計畫中記錄的優先，其餘候選依原順序）"""
+        candidates = SELECTOR_CANDIDATES[role]
+        known = self.data["pages"].get(ROLE_PAGES[role], {}).get("selectors", {}).get(role)
+        if not known:
+            return list(candidates)
+        return [known] + [selector for selector in candidates if selector != known]
+
+    def learn(self, role: str, selector: str):
+        """記錄實際可用的選擇器"""
+        if not self.enabled:
+            return
+        selectors = self._page(ROLE_PAGES[role])["selectors"]
+        if selectors.get(role) == selector:
+            self.stats["hits"] += 1
+            return
+        self.stats["misses"] += 1
+        if selectors.get(role):
+            logger.info(f"🗺️  {role} 的選擇器改為 '{selector}'（原為 '{selectors[role]}'）")
+        selectors[role] = selector
+        self.dirty = True
+
+    # ---- 頁面指紋 ----
+    async def verify(self, page, page_key: str) -> bool:
+        """
+        檢查頁面結構是否與計畫相符（不符時作廢該頁的選擇器）
+
+        Returns:
+            計畫是否仍有效（沒有記錄時為 False）
+        """
+        if not self.enabled:
+            return False
+        try:
+            fingerprint = await page_fingerprint(page)
+        except Exception as e:
+            logger.debug(f"無法計算頁面指紋 ({page_key}): {e}")
+            return False
+        entry = self._page(page_key)
+        valid = entry["fingerprint"] == fingerprint
+        if entry["fingerprint"] and not valid:
+            self.stats["invalidated"] += 1
+            logger.warning(f"⚠️  頁面 {page_key} 的結構已改變，作廢其選擇器計畫")
+            entry["selectors"] = {}
+            entry.pop("forms", None)
+        if not valid:
+            entry["fingerprint"] = fingerprint
+            entry["url"] = page.url.split("?")[0]
+            self.dirty = True
+        if self.analyzing:
+            entry["forms"] = await page.evaluate(_FORMS_JS)
+            self.dirty = True
+        return valid
+
+    def record_venue(self, name: str, calendar_url: str, apply_form_url: str = None):
+        """記錄場地的日曆與申請表單網址"""
+        venue = {"calendar_url": calendar_url, **venue_location(calendar_url)}
+        if apply_form_url:
+            venue["apply_form_url"] = apply_form_url
+            venue["apply_form"] = venue_location(apply_form_url)
+        self.data["venues"][name] = venue
+        self.dirty = True
+
+    # ---- 儲存 ----
+    def save(self):
+        if not self.enabled or not self.dirty:
+            return
+        self.data["generated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            tmp.write_text(json.dumps(self.data, ensure_ascii=False, indent=2), encoding="utf-8")
+            os.replace(tmp, self.path)
+            self.dirty = False
+            logger.debug(f"🗺️  網站結構計畫已更新: {self.path}")
+        except OSError as e:
+            logger.warning(f"⚠️  無法寫入網站結構計畫: {e}")
+
+    def summary(self) -> dict:
+        return {**self.stats, "pages": sorted(self.data["pages"])}
+
+
+_structure = None
+
+
+def get_site_structure() -> SiteStructure:
+    """取得本 process 共用的網站結構計畫"""
+    global _structure
+    if _structure is None:
+        _structure = SiteStructure(SITE_STRUCTURE_CONFIG["file"], TPBUSKER_BASE_URL,
+                                   SITE_STRUCTURE_CONFIG["enabled"])
+    return _structure
+
+
+async def analyze_site(venue_names: List[str]) -> Optional[dict]:
+    """
+    分析模式：登入後走過各場地日曆與申請表單（不送出），寫入網站結構計畫
+
+    Returns:
+        寫入的計畫，登入失敗時為 None
+    """
+    from main import StreetArtistApplication
+    from rate_limiter import get_rate_limiter
+
+    structure = get_site_structure()
+    structure.analyzing = True
+    app = StreetArtistApplication()
+    try:
+        await app.initialize_browser()
+        if not await app.perform_login():
+            logger.error("❌ 登入失敗，無法分析網站結構")
+            return None
+        for name in venue_names:
+            url = VENUE_URLS[name]
+            logger.info(f"🗺️  分析場地 {name}: {url}")
+            await get_rate_limiter().acquire("navigate", url, clock=app.clock)
+            await app.page.goto(url, wait_until="networkidle")
+            await structure.verify(app.page, "calendar")
+            buttons = await app.find_register_buttons()
+            if not buttons:
+                logger.warning(f"⚠️  {name} 目前沒有可申請時段，只記錄日曆頁面")
+                structure.record_venue(name, url)
+                continue
+            # 打開第一個時段的申請表單記錄結構，不送出
+            await get_rate_limiter().acquire("open_form", clock=app.clock)
+            await buttons[0].click()
+            await app.page.wait_for_load_state("networkidle")
+            await structure.verify(app.page, "apply_form")
+            for role in ("performance_items", "submit"):
+                for selector in structure.selectors(role):
+                    if await app.page.query_selector(selector):
+                        structure.learn(role, selector)
+                        break
+            structure.record_venue(name, url, app.page.url)
+        structure.save()
+        return structure.data
+    finally:
+        await app.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="網站結構計畫")
+    parser.add_argument("--analyze", action="store_true", help="登入並分析各場地頁面（不送出申請）")
+    parser.add_argument("--venues", default=",".join(VENUE_URLS), help="逗號分隔的場地名稱")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.analyze:
+        venues = [name for name in args.venues.split(",") if name]
+        unknown = [name for name in venues if name not in VENUE_URLS]
+        if unknown:
+            parser.error(f"未知的場地: {', '.join(unknown)}")
+        data = asyncio.run(analyze_site(venues))
+        if data is None:
+            sys.exit(1)
+        print(f"✅ 網站結構計畫已寫入 {SITE_STRUCTURE_CONFIG['file']}")
+    else:
+        # 沒有參數時顯示目前的計畫
+        print(json.dumps(get_site_structure().data, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
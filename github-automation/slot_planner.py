@@ -0,0 +1,168 @@
+"""
+台北街頭藝人申請系統 - 時段申請規劃模組
+
+PRD 要申請「所有可申請的週末與國定假日時段」，原本的流程卻是點到哪個「個人登記」就申請哪個。
+規劃器依解析後的日曆：
+- 以星期規則與本機假日表過濾（補行上班的週六可排除）
+- 依偏好（時段、日期早晚、假日、場地）排序，最有價值的先送出
+- 送出次數與申請截止時間（每梯次最後一天 17:00）共同構成預算，
+  時間不夠時先放掉價值最低的時段
+
+申請期間、17:00 截止與「今天」都以台北時間計算：Cloud Run 與 GitHub Actions 的容器是 UTC，
+直接用本機時間在台北 00:00-08:00 會差一天。
+"""
+
+import time
+import logging
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+WEEKDAY_NAMES = "一二三四五六日"
+TAIPEI = ZoneInfo("Asia/Taipei")
+
+
+def taipei_now() -> datetime:
+    """目前的台北時間（帶時區）"""
+    return datetime.now(TAIPEI)
+
+
+def taipei_today() -> date:
+    return taipei_now().date()
+
+
+class SlotPlanner:
+    """篩選並排序可申請時段"""
+
+    def __init__(self, plan_config: dict, holidays: dict, makeup_workdays: List[str] = None):
+        self.config = plan_config
+        self.holidays = {date.fromisoformat(day): name for day, name in holidays.items()}
+        self.makeup_workdays = {date.fromisoformat(day) for day in makeup_workdays or []}
+
+    def is_holiday(self, day: date) -> bool:
+        return day in self.holidays
+
+    def is_wanted(self, slot: dict) -> Tuple[bool, str]:
+        """
+        時段是否在申請條件內
+
+        Returns:
+            (是否申請, 原因)
+        """
+        day, period = slot.get("date"), slot.get("period")
+        if day is None:
+            # 解析不到日期時無法判斷，依設定決定是否仍然申請
+            return self.config["include_unparsed"], "無法解析日期"
+        if period and period not in self.config["period_weights"]:
+            return False, f"不申請{period}時段"
+        if day in self.makeup_workdays and self.config["exclude_makeup_workdays"]:
+            return False, "補行上班日"
+        if self.config["include_holidays"] and self.is_holiday(day):
+            return True, self.holidays[day]
+        if day.weekday() in self.config["weekdays"]:
+            return True, f"星期{WEEKDAY_NAMES[day.weekday()]}"
+        return False, f"星期{WEEKDAY_NAMES[day.weekday()]}不申請"
+
+    def score(self, slot: dict, venue_name: str = None) -> float:
+        """時段價值（越高越先申請）"""
+        cfg = self.config
+        score = cfg["period_weights"].get(slot.get("period"), 0)
+        score += cfg["venue_weights"].get(venue_name, 0)
+        day = slot.get("date")
+        if day is not None:
+            if self.is_holiday(day):
+                score += cfg["holiday_bonus"]
+            # 日期越早越優先（同分時），每天扣一點點
+            score -= cfg["date_decay_per_day"] * (day - taipei_today()).days
+        return score
+
+    def plan(self, slots: List[dict], venue_name: str = None) -> List[dict]:
+        """
+        篩選並依價值排序
+
+        Returns:
+            要申請的時段（價值高的在前，同分時維持頁面順序）
+        """
+        wanted, skipped = [], {}
+        for slot in slots:
+            ok, reason = self.is_wanted(slot)
+            if ok:
+                wanted.append(slot)
+            else:
+                skipped[reason] = skipped.get(reason, 0) + 1
+        if skipped:
+            logger.debug("⏭️  略過時段: " + "、".join(f"{reason} {count} 個" for reason, count in skipped.items()))
+        return sorted(wanted, key=lambda s: -self.score(s, venue_name))
+
+
+def window_deadline(now: datetime, windows: List[Tuple[int, int]], close_time: str) -> Optional[datetime]:
+    """
+    目前申請梯次的截止時間
+
+    Args:
+        now: 目前時間（taipei_now()，截止時間沿用它的時區）
+        windows: 每月的申請日區間，例如 [(1, 3), (21, 22)]
+        close_time: 最後一天的截止時間（台北時間），例如 "17:00"
+
+    Returns:
+        截止時間；不在申請期間時為 None
+    """
+    hour, minute = (int(part) for part in close_time.split(":"))
+    for first, last in windows:
+        if first <= now.day <= last:
+            return now.replace(day=last, hour=hour, minute=minute, second=0, microsecond=0)
+    return None
+
+
+class SubmissionBudget:
+    """申請預算：送出次數上限與截止時間"""
+
+    def __init__(self, max_attempts: int, deadline: Optional[datetime], seconds_per_submission: float,
+                 now: Callable[[], datetime] = taipei_now):
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.estimate = seconds_per_submission
+        self.now = now
+        self.attempts = 0
+        self._started = None
+
+    def seconds_left(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return (self.deadline - self.now()).total_seconds()
+
+    def allows_next(self) -> Tuple[bool, str]:
+        if self.attempts >= self.max_attempts:
+            return False, f"達到最大嘗試次數 ({self.max_attempts})"
+        left = self.seconds_left()
+        if left is not None and left < self.estimate:
+            return False, f"距離截止只剩 {max(left, 0):.0f} 秒，不足一次送出（約 {self.estimate:.0f} 秒）"
+        return True, ""
+
+    def start(self):
+        self.attempts += 1
+        self._started = time.monotonic()
+
+    def finish(self):
+        """以實際耗時修正每次送出的估計（指數移動平均）"""
+        if self._started is not None:
+            elapsed = time.monotonic() - self._started
+            self.estimate = 0.7 * self.estimate + 0.3 * elapsed
+            self._started = None
+
+    def remaining_attempts(self) -> int:
+        """依次數與剩餘時間估計還能送出幾次"""
+        by_count = self.max_attempts - self.attempts
+        left = self.seconds_left()
+        if left is None:
+            return by_count
+        return max(0, min(by_count, int(left // max(self.estimate, 1))))
+
+
+def create_slot_planner(plan_config: dict, holidays: dict, makeup_workdays: List[str]) -> Optional[SlotPlanner]:
+    """依設定建立規劃器（停用時回傳 None，沿用頁面順序）"""
+    if not plan_config["enabled"]:
+        return None
+    return SlotPlanner(plan_config, holidays, makeup_workdays)
@@ -3,13 +3,16 @@
 負責處理不同環境下的截圖儲存邏輯
 """
 
-import os
 import sys
 import logging
 from pathlib import Path
-from datetime import datetime
 from typing import List, Optional
 
+from artifact_registry import get_artifact_registry, MANIFEST_NAME
+from object_storage import get_storage_backend
+from contact_sheet import create_run_summary
+from config import RUN_SUMMARY_CONFIG
+
 logger = logging.getLogger(__name__)
 
 # 確保日誌輸出
@@ -20,75 +23,45 @@ sys.stdout.flush()
 class ScreenshotStorageHandler:
     """截圖儲存處理器"""
     
-    def __init__(self, phase: int, gcs_config: dict = None):
+    def __init__(self, phase: int, gcs_config: dict = None, storage=None, screenshots_dir: str = "screenshots",
+                 registry=None):
         """
         初始化截圖儲存處理器
         
         Args:
             phase: 當前執行的 Phase (1-4)
             gcs_config: GCS 配置（Phase 4 需要）
+            storage: 直接指定儲存後端（效能測試使用記憶體替身，不建立 GCS 客戶端）
+            screenshots_dir: 截圖目錄
+            registry: 產出檔案登記表（預設使用本 process 共用的登記表）
         """
         self.phase = phase
         self.gcs_config = gcs_config
-        self.screenshots_dir = Path("screenshots")
+        self.screenshots_dir = Path(screenshots_dir)
+        self.registry = registry or get_artifact_registry()
+        self.manifest_url = None
         
-        # Phase 4 需要 GCS 客戶端
-        if self.phase == 4:
+        # Phase 4 需要物件儲存（與即時上傳共用同一個後端與客戶端）
+        self.storage = storage
+        if self.storage is None and self.phase == 4:
             if not gcs_config:
                 raise ValueError("Phase 4 需要提供 gcs_config")
-            self._init_gcs_client()
-    
-    def _init_gcs_client(self):
-        """初始化 Google Cloud Storage 客戶端"""
-        try:
-            print(f"📦 載入 google.cloud.storage 模組...", flush=True)
-            from google.cloud import storage
-            print(f"✅ google.cloud.storage 模組載入成功", flush=True)
-            
-            # Cloud Run 環境會自動使用 Service Account 認證
-            print(f"🔐 初始化 GCS 客戶端 (專案: {self.gcs_config['project_id']})...", flush=True)
-            self.gcs_client = storage.Client(project=self.gcs_config["project_id"])
-            self.bucket = self.gcs_client.bucket(self.gcs_config["bucket_name"])
-            
-            logger.info(f"✅ GCS 客戶端初始化成功")
-            logger.info(f"   專案: {self.gcs_config['project_id']}")
-            logger.info(f"   Bucket: {self.gcs_config['bucket_name']}")
-            print(f"✅ GCS 客戶端初始化成功 (Bucket: {self.gcs_config['bucket_name']})", flush=True)
-            
-        except Exception as e:
-            error_msg = f"❌ GCS 客戶端初始化失敗: {e}"
-            logger.error(error_msg)
-            print(error_msg, flush=True)
-            import traceback
-            traceback.print_exc()
-            raise
+            self.storage = get_storage_backend()
     
     def get_screenshot_files(self) -> List[Path]:
         """
-        取得所有截圖檔案
+        取得本次執行登記的所有產出檔案（依產生順序，不掃描目錄）
         
         Returns:
             截圖檔案路徑列表
         """
-        if not self.screenshots_dir.exists():
-            logger.warning(f"⚠️  截圖目錄不存在: {self.screenshots_dir}")
-            return []
-        
-        # 支援常見圖片格式
-        extensions = ['*.png', '*.jpg', '*.jpeg']
-        screenshot_files = []
-        
-        for ext in extensions:
-            screenshot_files.extend(self.screenshots_dir.glob(ext))
-        
-        screenshot_files.sort(key=lambda x: x.stat().st_mtime)
-        
-        logger.info(f"📸 找到 {len(screenshot_files)} 個截圖檔案")
+        screenshot_files = self.registry.local_files()
+        logger.info(f"📸 登記了 {len(screenshot_files)} 個截圖檔案")
         return screenshot_files
     
     def upload_to_gcs(self) -> Optional[List[str]]:
         """
-        上傳截圖到 Google Cloud Storage
+        上傳截圖到物件儲存（Phase 4 為 Google Cloud Storage）
         
         Returns:
             上傳成功的 GCS URLs，失敗返回 None
@@ -97,40 +70,52 @@ class ScreenshotStorageHandler:
             logger.debug("非 Phase 4，跳過 GCS 上傳")
             return None
         
-        screenshot_files = self.get_screenshot_files()
+        # 先等背景即時上傳完成，避免同一個檔案上傳兩次
+        self.storage.wait_pending()
+        records = [r for r in self.registry.records() if r["local"]]
         
-        if not screenshot_files:
+        if not records:
             logger.warning("⚠️  沒有截圖需要上傳")
             return []
         
-        logger.info(f"🚀 開始上傳 {len(screenshot_files)} 個截圖到 GCS...")
-        
-        uploaded_urls = []
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        pending = [r for r in records if not r["remote_url"]]
+        logger.info(f"🚀 開始上傳 {len(pending)} 個截圖 (並行 {self.storage.concurrency})"
+                    f"，{len(records) - len(pending)} 個已即時上傳...")
         
         try:
-            for screenshot_file in screenshot_files:
-                # GCS 路徑：screenshots/YYYYMMDD_HHMMSS/filename.png
-                blob_name = f"screenshots/{timestamp}/{screenshot_file.name}"
-                blob = self.bucket.blob(blob_name)
-                
-                # 上傳檔案
-                blob.upload_from_filename(str(screenshot_file))
-                
-                # 取得公開 URL（如果 bucket 是公開的）
-                # 或使用 gs:// 格式的 URL
-                gcs_url = f"gs://{self.gcs_config['bucket_name']}/{blob_name}"
-                uploaded_urls.append(gcs_url)
-                
-                logger.info(f"   ✅ {screenshot_file.name} → {gcs_url}")
+            # 路徑：screenshots/<執行編號>/filename.png（與即時上傳同一個資料夾）
+            results = self.storage.upload_many(
+                [(r["path"], self.registry.remote_key(r["name"])) for r in pending]
+            )
+            failed = []
+            for record in pending:
+                url = results.get(self.registry.remote_key(record["name"]))
+                if url:
+                    self.registry.set_remote(record["name"], url)
+                    logger.info(f"   ✅ {record['name']} → {url}")
+                else:
+                    failed.append(record["name"])
+            
+            # 每次執行一份 manifest，後續只需讀這個物件
+            self.manifest_url = self.storage.upload_bytes(
+                self.registry.manifest_json(), self.registry.remote_key(MANIFEST_NAME),
+                content_type="application/json"
+            )
+            logger.info(f"   Manifest: {self.manifest_url}")
+            
+            if failed:
+                logger.error(f"❌ {len(failed)} 個截圖上傳失敗（保留本機檔案）: {', '.join(failed)}")
+                return None
             
             logger.info(f"🎉 所有截圖上傳完成！")
-            logger.info(f"   查看截圖：https://console.cloud.google.com/storage/browser/{self.gcs_config['bucket_name']}/screenshots/{timestamp}")
+            if self.storage.name == "gcs":
+                prefix = self.registry.remote_key("").rstrip("/")
+                logger.info(f"   查看截圖：https://console.cloud.google.com/storage/browser/{self.gcs_config['bucket_name']}/{prefix}")
             
-            return uploaded_urls
+            return [r["remote_url"] for r in records]
             
         except Exception as e:
-            logger.error(f"❌ 上傳截圖到 GCS 失敗: {e}")
+            logger.error(f"❌ 上傳截圖失敗: {e}")
             return None
     
     def cleanup_local_screenshots(self, keep_files: bool = False):
@@ -146,7 +131,9 @@ class ScreenshotStorageHandler:
         
         # Phase 4 且上傳成功後，刪除本機檔案以節省容器空間
         if self.phase == 4:
-            screenshot_files = self.get_screenshot_files()
+            # 只刪除已上傳的檔案
+            screenshot_files = [Path(r["path"]) for r in self.registry.records()
+                                if r["local"] and r["remote_url"]]
             
             if not screenshot_files:
                 return
@@ -156,6 +143,7 @@ class ScreenshotStorageHandler:
             for screenshot_file in screenshot_files:
                 try:
                     screenshot_file.unlink()
+                    self.registry.mark_deleted(screenshot_file.name)
                     logger.debug(f"   刪除: {screenshot_file.name}")
                 except Exception as e:
                     logger.warning(f"   無法刪除 {screenshot_file.name}: {e}")
@@ -174,6 +162,8 @@ class ScreenshotStorageHandler:
             "screenshot_count": 0,
             "storage_location": "",
             "gcs_urls": [],
+            "manifest": None,
+            "contact_sheet": None,
             "success": False
         }
         
@@ -184,6 +174,14 @@ class ScreenshotStorageHandler:
             logger.warning("⚠️  沒有找到任何截圖")
             return result
         
+        # 關鍵畫面摘要圖與縮圖（登記後與截圖、manifest 一起上傳）
+        summary = create_run_summary(self.registry, self.screenshots_dir, RUN_SUMMARY_CONFIG)
+        result["contact_sheet"] = summary["contact_sheet"]
+        
+        # Phase 1-3: manifest 與截圖放在同一個資料夾
+        if self.phase in [1, 2, 3]:
+            result["manifest"] = str(self.registry.write_manifest(self.screenshots_dir))
+        
         # Phase 1, 2: 本機資料夾
         if self.phase in [1, 2]:
             result["storage_location"] = f"本機資料夾: {self.screenshots_dir.absolute()}"
@@ -202,7 +200,11 @@ class ScreenshotStorageHandler:
             
             if gcs_urls:
                 result["gcs_urls"] = gcs_urls
-                result["storage_location"] = f"Google Cloud Storage: {self.gcs_config['bucket_name']}"
+                result["manifest"] = self.manifest_url
+                sheet = self.registry.summary_record()
+                result["contact_sheet"] = sheet["remote_url"] if sheet else None
+                result["storage_location"] = (f"Google Cloud Storage: {self.gcs_config['bucket_name']}"
+                                              if self.storage.name == "gcs" else f"物件儲存: {self.storage.name}")
                 result["success"] = True
                 
                 # 上傳成功後清理本機檔案
@@ -0,0 +1,6 @@
+"""測試共用設定：讓測試可以直接 import github-automation 底下的模組"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
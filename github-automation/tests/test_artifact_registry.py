@@ -0,0 +1,19 @@
+"""artifact_registry：共用登記表，各工作單元的步驟與時段分開"""
+
+from artifact_registry import ArtifactRegistry, ArtifactTags
+
+
+def test_concurrent_units_tag_their_own_step_and_slot(tmp_path):
+    registry = ArtifactRegistry("run")
+    first, second = ArtifactTags(), ArtifactTags()
+    first.set_step("apply")
+    first.set_slot("2025-01-04 上午")
+    second.set_step("login")
+
+    a = registry.add(tmp_path / "u1_slot.png", "screenshot", b"a", tags=first)
+    b = registry.add(tmp_path / "u2_login.png", "screenshot", b"b", tags=second)
+    second.set_step("navigate")
+
+    assert (a["step"], a["slot"]) == ("apply", "2025-01-04 上午")
+    assert (b["step"], b["slot"]) == ("login", None)
+    assert [r["name"] for r in registry.records()] == ["u1_slot.png", "u2_login.png"]
@@ -0,0 +1,37 @@
+"""browser_profiler.TraceSampler：重建瀏覽器時沿用抽樣決定"""
+
+import asyncio
+
+from browser_profiler import TraceSampler
+
+
+class FakeTracing:
+    def __init__(self):
+        self.started = 0
+        self.saved = []
+
+    async def start(self, **kwargs):
+        self.started += 1
+
+    async def stop(self, path=None):
+        self.saved.append(path)
+
+
+class FakeContext:
+    def __init__(self):
+        self.tracing = FakeTracing()
+
+
+def test_sampled_trace_restarts_on_rebuilt_context(tmp_path):
+    sampler = TraceSampler("sample", sample_rate=1.0)
+    first, second = FakeContext(), FakeContext()
+
+    async def run():
+        await sampler.start(first)
+        await sampler.stop(tmp_path / "trace_0.zip")
+        await sampler.start(second)
+
+    asyncio.run(run())
+    assert sampler.sampled
+    assert first.tracing.saved == [str(tmp_path / "trace_0.zip")]
+    assert second.tracing.started == 1 and sampler.active
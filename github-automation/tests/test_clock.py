@@ -0,0 +1,28 @@
+import asyncio
+
+from clock import VirtualClock
+from deadline import RunDeadline
+
+
+def test_parallel_units_do_not_add_up_waits():
+    clock = VirtualClock()
+    deadline = RunDeadline(100, 0, {}, now=clock.now)
+
+    async def unit(ms):
+        unit_clock = clock.fork()
+        unit_deadline = deadline.fork(unit_clock.now)
+        for _ in range(3):
+            await unit_clock.sleep(ms)
+        return unit_deadline.remaining()
+
+    async def run():
+        return await asyncio.gather(unit(10_000), unit(20_000))
+
+    short, long = asyncio.run(run())
+    # 各工作單元只看到自己的等待
+    assert 69 < short <= 70
+    assert 39 < long <= 40
+    # 整體時間軸取最長的一條，不是加總
+    assert 59 < clock.report()["simulated_wait_seconds"] <= 60
+    assert 39 < deadline.remaining() <= 40
+    assert clock.report()["waits"]["delay"]["count"] == 6
@@ -0,0 +1,77 @@
+"""concurrency.SiblingPages：同帳號的分頁共用第一個頁面的登入狀態"""
+
+import asyncio
+
+from concurrency import SiblingPages
+
+
+class FakePage:
+    def __init__(self):
+        self.closed = False
+
+    def is_closed(self):
+        return self.closed
+
+
+class FakeManager:
+    """只有 context、page 與 parent 的 AntiDetectionManager 替身"""
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.context = object()
+        self.page = FakePage()
+        self.context_closed = False
+
+    async def open_sibling(self):
+        return FakeManager(parent=self)
+
+    async def close_browser(self):
+        if self.parent is None:
+            self.context_closed = True
+        self.page.closed = True
+        self.page = None
+        self.context = None
+
+
+def test_leader_browser_failure_keeps_running_sibling():
+    async def run():
+        siblings = SiblingPages()
+        first = FakeManager()
+        siblings.session_ready(first)
+        sibling = await siblings.open_page()
+        sibling_page = sibling.page
+
+        # 第一個頁面在 browser 步驟失敗，重建瀏覽器
+        assert await siblings.release(first) is False
+        assert not first.context_closed
+        assert not sibling_page.is_closed()
+
+        # 重建中開的分頁等待重新登入，拿到新的登入狀態
+        waiting = asyncio.ensure_future(siblings.open_page())
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        second = FakeManager()
+        siblings.session_ready(second)
+        late = await waiting
+        assert late.parent is second
+
+        # 分頁都關閉後才關閉舊的 context
+        await sibling.close_browser()
+        await late.close_browser()
+        await siblings.close_retired()
+        assert first.context_closed
+        assert not second.context_closed
+
+    asyncio.run(run())
+
+
+def test_release_without_siblings_closes_immediately():
+    async def run():
+        siblings = SiblingPages()
+        first = FakeManager()
+        siblings.session_ready(first)
+        assert await siblings.release(first) is True
+        assert first.context_closed
+        assert siblings.retired == []
+
+    asyncio.run(run())
@@ -0,0 +1,32 @@
+"""network_replay.Redactor：只遮蔽帳號密碼欄位與 OAuth 參數"""
+
+from urllib.parse import parse_qs, urlsplit
+
+from config import NETWORK_REPLAY_CONFIG
+from network_replay import REDACTED, Redactor
+
+
+def _redactor():
+    return Redactor(NETWORK_REPLAY_CONFIG["redact_headers"], NETWORK_REPLAY_CONFIG["redact_fields"],
+                    ["s3cret"], NETWORK_REPLAY_CONFIG["redact_params"])
+
+
+def test_credential_fields_match_by_substring():
+    data = parse_qs(_redactor().post_data("ctl00$txtPassword=s3cret&LoginUsername=alice&note=s3cret"))
+    assert data["ctl00$txtPassword"] == [REDACTED]
+    assert data["LoginUsername"] == [REDACTED]
+    assert data["note"] == [REDACTED]
+
+
+def test_asp_net_and_unrelated_fields_are_kept():
+    body = "__VIEWSTATE=abc&__VIEWSTATEGENERATOR=CA0B&zipcode=100&userAgentHint=x"
+    assert _redactor().post_data(body) == body
+
+
+def test_oauth_params_match_by_exact_name():
+    url = "https://tpbusker.gov.taipei/callback?Code=abc&STATE=xyz&token=t&barcode=1"
+    query = parse_qs(urlsplit(_redactor().url(url)).query)
+    assert query["Code"] == [REDACTED]
+    assert query["STATE"] == [REDACTED]
+    assert query["token"] == [REDACTED]
+    assert query["barcode"] == ["1"]
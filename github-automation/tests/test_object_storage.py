@@ -0,0 +1,115 @@
+"""object_storage 的儲存介面、上傳重試與失敗處理（使用記憶體物件儲存，不需要網路）"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from object_storage import LocalStorageBackend, MemoryStorageBackend, StorageBackend
+
+
+class FlakyBackend(MemoryStorageBackend):
+    """前幾次上傳失敗的記憶體物件儲存"""
+
+    def __init__(self, failures: int, **kwargs):
+        super().__init__(**kwargs)
+        self.failures = failures
+
+    def _put_bytes(self, data, key, content_type=None):
+        with self._lock:
+            fail = self.failures > 0
+            self.failures -= 1
+        if fail:
+            raise ConnectionError("暫時性錯誤")
+        super()._put_bytes(data, key, content_type)
+
+
+def _files(tmp_path, count, size):
+    items = []
+    for i in range(count):
+        path = tmp_path / f"shot_{i}.png"
+        path.write_bytes(b"x" * size)
+        items.append((str(path), f"run/shot_{i}.png"))
+    return items
+
+
+def test_backends_implement_the_interface(tmp_path):
+    LocalStorageBackend(str(tmp_path))
+    MemoryStorageBackend()
+
+
+def test_incomplete_backend_fails_at_construction():
+    class NoList(StorageBackend):
+        def url(self, key):
+            return key
+
+        def _put_file(self, local_path, key, content_type=None):
+            pass
+
+        def _put_bytes(self, data, key, content_type=None):
+            pass
+
+        def create_if_absent(self, key, data):
+            return True
+
+        def read_text(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        NoList()
+
+
+def test_upload_many_returns_urls_and_stats(tmp_path):
+    storage = MemoryStorageBackend(concurrency=3)
+    items = _files(tmp_path, 5, 100)
+    results = storage.upload_many(items)
+
+    assert results == {key: f"memory://{key}" for _, key in items}
+    assert storage.objects["run/shot_0.png"] == b"x" * 100
+    assert storage.stats == {"uploads": 5, "bytes": 500, "retries": 0, "failures": 0}
+    storage.close()
+
+
+def test_transient_error_is_retried(tmp_path):
+    storage = FlakyBackend(failures=2, max_retries=3, retry_base_seconds=0)
+    assert storage.upload_bytes(b"data", "run/manifest.json") == "memory://run/manifest.json"
+    assert storage.stats["retries"] == 2
+    assert storage.stats["failures"] == 0
+    assert storage.read_text("run/manifest.json") == "data"
+
+
+def test_failure_rate_is_counted_and_reported_as_none(tmp_path):
+    storage = MemoryStorageBackend(failure_rate=1.0, max_retries=1, retry_base_seconds=0, seed=1)
+    items = _files(tmp_path, 3, 10)
+    results = storage.upload_many(items)
+
+    assert results == {key: None for _, key in items}
+    assert storage.attempts == 6
+    assert storage.stats == {"uploads": 0, "bytes": 0, "retries": 3, "failures": 3}
+    assert storage.objects == {}
+    storage.close()
+
+
+def test_concurrent_uploads_overlap_simulated_bandwidth(tmp_path):
+    # 每個檔案 0.1 MB、頻寬 1 MB/s：循序約 0.4 秒，4 個並行約 0.1 秒
+    storage = MemoryStorageBackend(bandwidth_mbps=1, concurrency=4)
+    items = _files(tmp_path, 4, 100 * 1024)
+    started = time.perf_counter()
+    storage.upload_many(items)
+    elapsed = time.perf_counter() - started
+
+    assert 0.09 <= elapsed < 0.3
+    assert storage.stats["bytes"] == 4 * 100 * 1024
+    storage.close()
+
+
+@pytest.mark.parametrize("backend", ["memory", "local"])
+def test_create_if_absent_is_exclusive(tmp_path, backend):
+    storage = MemoryStorageBackend() if backend == "memory" else LocalStorageBackend(str(tmp_path))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        created = list(pool.map(lambda i: storage.create_if_absent("claims/slot", f"task-{i}"), range(8)))
+
+    assert created.count(True) == 1
+    owner = f"task-{created.index(True)}"
+    assert storage.read_text("claims/slot") == owner
+    assert storage.list("claims") == ["claims/slot"]
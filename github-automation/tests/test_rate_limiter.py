@@ -0,0 +1,38 @@
+"""rate_limiter：限流等待透過呼叫端的時鐘"""
+
+import asyncio
+import time
+
+from clock import VirtualClock
+from rate_limiter import RateLimiter, TokenBucket
+
+
+def test_throttling_waits_on_the_virtual_clock():
+    clock = VirtualClock()
+    limiter = RateLimiter(TokenBucket(0.5, 1, now=clock.now), "tpbusker.gov.taipei")
+
+    async def run():
+        return [await limiter.acquire("submit", clock=clock) for _ in range(3)]
+
+    started = time.perf_counter()
+    waits = asyncio.run(run())
+
+    assert time.perf_counter() - started < 1
+    assert waits[0] == 0
+    assert 1.9 < waits[1] <= 2
+    assert clock.waits["rate_limit"]["count"] == 2
+    assert 3.8 < clock.simulated_ms / 1000 <= 4
+    assert limiter.stats["throttled"] == 2
+
+
+def test_other_hosts_are_not_throttled():
+    clock = VirtualClock()
+    limiter = RateLimiter(TokenBucket(0.5, 1, now=clock.now), "tpbusker.gov.taipei")
+
+    async def run():
+        for _ in range(3):
+            await limiter.acquire("trajectory", "https://www.google.com/", clock=clock)
+
+    asyncio.run(run())
+    assert clock.simulated_ms == 0
+    assert limiter.stats["acquired"] == 0
@@ -0,0 +1,14 @@
+"""screenshot_policy：同帳號的分頁各自一個環狀緩衝區"""
+
+from screenshot_policy import ScreenshotPolicy
+
+
+def test_forked_policy_has_its_own_buffer():
+    leader = ScreenshotPolicy("errors", 3, ["final_*"], ["error_*"])
+    sibling = leader.fork()
+    leader.buffer_frame("u1_calendar", b"a", "png")
+    sibling.buffer_frame("u2_calendar", b"b", "png")
+
+    assert [f["name"] for f in sibling.drain()] == ["u2_calendar"]
+    assert [f["name"] for f in leader.drain()] == ["u1_calendar"]
+    assert sibling.buffer.maxlen == 3 and sibling.mode == "errors"
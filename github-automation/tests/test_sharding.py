@@ -0,0 +1,32 @@
+"""分片搶位：同一個時段只會被一個工作單元取得"""
+
+from object_storage import MemoryStorageBackend
+from sharding import ClaimStore, SlotClaimer
+
+
+def test_units_sharing_a_claimer_do_not_claim_the_same_slot():
+    claimer = SlotClaimer(ClaimStore(MemoryStorageBackend(), "run"), task_index=0)
+    slot = "北投公園_1號點|2026-11-07|早上"
+
+    assert claimer.try_claim("acct", slot, "unit-a")
+    assert not claimer.try_claim("acct", slot, "unit-b")
+    # 同一個工作單元重試時仍視為已取得
+    assert claimer.try_claim("acct", slot, "unit-a")
+
+
+def test_claims_are_exclusive_across_tasks_and_survive_restart():
+    store = ClaimStore(MemoryStorageBackend(), "run")
+    slot = "北投公園_1號點|2026-11-07|早上"
+
+    assert SlotClaimer(store, 0).try_claim("acct", slot, "unit-a")
+    assert not SlotClaimer(store, 1).try_claim("acct", slot, "unit-b")
+    # task 0 重新啟動（新的搶位器）後，自己的工作單元仍擁有該時段
+    assert SlotClaimer(store, 0).try_claim("acct", slot, "unit-a")
+
+
+def test_other_account_can_claim_same_slot():
+    claimer = SlotClaimer(ClaimStore(MemoryStorageBackend(), "run"), task_index=0)
+    slot = "北投公園_1號點|2026-11-07|早上"
+
+    assert claimer.try_claim("acct-1", slot, "unit-a")
+    assert claimer.try_claim("acct-2", slot, "unit-b")
@@ -0,0 +1,42 @@
+"""single_flight 的世代鎖定與結果沿用（使用記憶體物件儲存，不需要網路）"""
+
+import asyncio
+
+from object_storage import MemoryStorageBackend
+from single_flight import SingleFlight, flight_key
+
+
+def _run(flight, key, fn, timeout=5):
+    return asyncio.run(asyncio.wait_for(flight.run(key, fn), timeout))
+
+
+def test_second_run_for_same_key_starts_next_generation():
+    storage = MemoryStorageBackend()
+    flight = SingleFlight(storage, lease_seconds=60, reuse_seconds=0, poll_seconds=0.01)
+    key = flight_key("artist", ["北投公園_1號點"], "2026-11 上半月")
+    calls = []
+
+    async def apply():
+        calls.append(len(calls) + 1)
+        return {"success": True, "applied_slots": [f"run {len(calls)}"]}
+
+    assert _run(flight, key, apply)["applied_slots"] == ["run 1"]
+    assert _run(flight, key, apply)["applied_slots"] == ["run 2"]
+    assert calls == [1, 2]
+    assert sorted(k.rsplit("/", 1)[-1] for k in storage.objects) == [
+        "000001.lock", "000001.result.json", "000002.lock", "000002.result.json"]
+
+
+def test_recent_success_is_reused_but_failure_is_not():
+    flight = SingleFlight(MemoryStorageBackend(), lease_seconds=60, reuse_seconds=300, poll_seconds=0.01)
+    key = flight_key("artist", ["北投公園_1號點"], "2026-11 上半月")
+    results = iter([{"success": False}, {"success": True}, {"success": False}])
+
+    async def apply():
+        return next(results)
+
+    assert _run(flight, key, apply)["success"] is False
+    second = _run(flight, key, apply)
+    assert second["success"] is True and not second.get("coalesced")
+    third = _run(flight, key, apply)
+    assert third["success"] is True and third["coalesced"] is True
@@ -0,0 +1,184 @@
+"""
+台北街頭藝人申請系統 - 虛擬顯示器管理模組
+
+原本 cloud-run/entrypoint.sh 在背景啟動 Xvfb :99 後固定 sleep 2 秒，沒有確認顯示器真的可用；
+GitHub Actions 則用 xvfb-run 包住整個執行。改由 Python 入口管理：
+- 只有需要畫面的 Phase（headless=False）才啟動 Xvfb
+- 已有可連線的顯示器（DISPLAY 或同一個編號已有 Xvfb）時直接沿用
+- 輪詢 X socket 直到可以連線，記錄花了多久；Xvfb 提早結束或逾時都直接報錯
+- 結束時確實關閉自己啟動的 Xvfb（先 SIGTERM，逾時再 SIGKILL）
+"""
+
+import os
+import time
+import socket
+import atexit
+import logging
+import tempfile
+import subprocess
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_X11_SOCKET_DIR = Path("/tmp/.X11-unix")
+
+
+def display_number(display: str) -> Optional[int]:
+    """":99" 或 ":99.0" → 99（遠端顯示器如 "host:0" 回傳 None）"""
+    if not display or not display.startswith(":"):
+        return None
+    try:
+        return int(display[1:].split(".")[0])
+    except ValueError:
+        return None
+
+
+def accepts_connections(display: str) -> bool:
+    """顯示器的 X socket 是否可以連線"""
+    number = display_number(display)
+    if number is None:
+        return False
+    path = _X11_SOCKET_DIR / f"X{number}"
+    if not path.exists():
+        return False
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(0.5)
+        try:
+            sock.connect(str(path))
+            return True
+        except OSError:
+            return False
+
+
+class VirtualDisplay:
+    """Xvfb 虛擬顯示器"""
+
+    def __init__(self, display: str = ":99", screen: str = "1366x768x24", command: str = "Xvfb",
+                 ready_timeout: float = 10, poll_interval: float = 0.05, max_display_tries: int = 5):
+        self.display = display
+        self.screen = screen
+        self.command = command
+        self.ready_timeout = ready_timeout
+        self.poll_interval = poll_interval
+        self.max_display_tries = max_display_tries
+        self.process = None
+        self.reused = False
+        self.ready_seconds = None
+        self._env_changed = False
+        self._previous_display = None
+
+    def start(self) -> str:
+        """
+        啟動或沿用顯示器，並設定 DISPLAY
+
+        Returns:
+            使用的顯示器（例如 ":99"）
+        """
+        current = os.environ.get("DISPLAY")
+        if current and accepts_connections(current):
+            self.display, self.reused = current, True
+            logger.info(f"🖥️  沿用現有顯示器 DISPLAY={current}")
+            return current
+
+        number = display_number(self.display)
+        if number is None:
+            raise ValueError(f"虛擬顯示器編號格式錯誤: {self.display}")
+        for candidate in range(number, number + self.max_display_tries):
+            display = f":{candidate}"
+            if accepts_connections(display):
+                self.reused = True
+                self._use(display)
+                logger.info(f"🖥️  沿用已在執行的虛擬顯示器 {display}")
+                return display
+            if self._launch(display):
+                self._use(display)
+                logger.info(f"🖥️  Xvfb 已就緒 (DISPLAY={display}, PID={self.process.pid})，"
+                            f"等待 {self.ready_seconds * 1000:.0f} ms")
+                return display
+        raise RuntimeError(f"無法啟動 Xvfb（嘗試了 :{number} 到 :{number + self.max_display_tries - 1}）")
+
+    def _launch(self, display: str) -> bool:
+        """啟動 Xvfb 並等待可以連線（顯示器編號被占用而結束時回傳 False）"""
+        started = time.monotonic()
+        # stderr 寫到暫存檔：用 PIPE 而長時間不讀，緩衝區滿了會卡住 Xvfb
+        with tempfile.TemporaryFile() as stderr:
+            self.process = subprocess.Popen(
+                [self.command, display, "-screen", "0", self.screen, "-nolisten", "tcp"],
+                stdout=subprocess.DEVNULL, stderr=stderr
+            )
+            return self._wait_ready(display, started, stderr)
+
+    def _wait_ready(self, display: str, started: float, stderr) -> bool:
+        while time.monotonic() - started < self.ready_timeout:
+            if accepts_connections(display):
+                self.ready_seconds = time.monotonic() - started
+                return True
+            if self.process.poll() is not None:
+                stderr.seek(0)
+                error = stderr.read().decode(errors="ignore").strip().splitlines()
+                logger.warning(f"⚠️  Xvfb {display} 啟動失敗 (exit {self.process.returncode})"
+                               + (f": {error[-1]}" if error else ""))
+                self.process = None
+                return False
+            time.sleep(self.poll_interval)
+        self.stop()
+        raise TimeoutError(f"Xvfb {display} 在 {self.ready_timeout} 秒內沒有就緒")
+
+    def _use(self, display: str):
+        self.display = display
+        self._previous_display = os.environ.get("DISPLAY")
+        self._env_changed = True
+        os.environ["DISPLAY"] = display
+
+    def stop(self):
+        """關閉自己啟動的 Xvfb（沿用的顯示器不動）"""
+        process, self.process = self.process, None
+        if process is not None and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+            logger.info(f"🛑 Xvfb {self.display} 已關閉")
+        if self._env_changed:
+            if self._previous_display is None:
+                os.environ.pop("DISPLAY", None)
+            else:
+                os.environ["DISPLAY"] = self._previous_display
+            self._env_changed = False
+
+    def summary(self) -> dict:
+        return {"display": self.display, "reused": self.reused,
+                "ready_seconds": round(self.ready_seconds, 3) if self.ready_seconds is not None else None}
+
+
+def needs_display(display_config: dict, headless: bool) -> bool:
+    """auto：只有有畫面模式需要；1：一律啟動；0：從不啟動"""
+    mode = display_config["mode"]
+    if mode == "auto":
+        return not headless
+    return mode == "1"
+
+
+@contextmanager
+def virtual_display(display_config: dict, headless: bool):
+    """在需要時提供虛擬顯示器，離開時關閉（不需要時 yield None）"""
+    if not needs_display(display_config, headless):
+        logger.debug("無畫面模式，不啟動虛擬顯示器")
+        yield None
+        return
+    display = VirtualDisplay(
+        display_config["display"], display_config["screen"], display_config["command"],
+        display_config["ready_timeout_seconds"], display_config["poll_interval_seconds"]
+    )
+    display.start()
+    # 被 SIGKILL 以外的方式結束時也關閉 Xvfb
+    atexit.register(display.stop)
+    try:
+        yield display
+    finally:
+        display.stop()
+        atexit.unregister(display.stop)